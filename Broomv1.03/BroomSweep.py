@@ -1,20 +1,5 @@
 import BroomInit
-import json
-import os
-import sys
-import time
-import requests
 import logging
-import logging.handlers
-import traceback
-import subprocess
-import re
-import shutil
-import datetime
-import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.ticker import MaxNLocator
 
 
 class PulseIVSweep:
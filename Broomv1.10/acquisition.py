@@ -0,0 +1,90 @@
+# acquisition.py
+#
+# 2182A acquisition through its own trace buffer. The buffer is sized from
+# the sweep plan and filled by trigger-link triggers from the 6221, so the
+# reading rate is set by the measurement instead of one :READ? round trip per
+# reading. The buffer is read back in a single :TRAC:DATA? pass at the end
+# (or re-read in chunks while streaming) and paired with the currents the
+# 6221 was actually programmed with.
+
+import time
+import numpy as np
+from config import *
+
+
+class TraceAcquisition:
+    def __init__(self, test, currents, timestamps=False, trigger='EXT'):
+        # trigger: EXT for the 6221 trigger link, IMM for free-running bursts
+        self.test = test
+        self.currents = np.asarray(currents, dtype=float)
+        self.timestamps = timestamps
+        self.trigger = trigger
+        self.elements = 2 if timestamps else 1
+        if len(self.currents) > MAX_2182A_READINGS:
+            raise ValueError(f"Sweep plan has {len(self.currents)} points, "
+                             f"the 2182A buffer holds at most {MAX_2182A_READINGS}")
+
+    def __len__(self):
+        return len(self.currents)
+
+    def configure(self):
+        # One trigger per planned point, stored in the buffer
+        self.test.meter.write_batch([':TRAC:CLE', ':TRAC:FEED SENS', f':TRAC:POIN {len(self)}',
+                                     f':TRIG:SOUR {self.trigger}', f':TRIG:COUN {len(self)}',
+                                     'FORM:ELEM READ,TST' if self.timestamps else 'FORM:ELEM READ'])
+
+    def arm(self):
+        # Call after SOUR:SWE:ARM and before INIT:IMM on the 6221
+        self.test.meter.write_batch([':TRAC:CLE', ':TRAC:FEED:CONT NEXT', ':INIT'])
+
+    def count(self):
+        return int(float(self.test.meter.query(':TRAC:POIN:ACT?')))
+
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        while self.count() < len(self):
+            if time.time() > deadline:
+                raise TimeoutError(f"2182A buffer not filled within {timeout:.1f} seconds")
+            time.sleep(POLL_INTERVAL)
+
+    def read(self, timeout=TIMEOUT / 1000):
+        # Raw buffer contents
+        return self.test.meter.fetch_trace(len(self) * self.elements, timeout)
+
+    def pair(self, data):
+        readings = np.asarray(data)[:len(data) // self.elements * self.elements].reshape(-1, self.elements)
+        result = {'voltage': readings[:, 0], 'current': self.currents[:len(readings)]}
+        if self.timestamps:
+            result['timestamp'] = readings[:, 1]
+        return result
+
+    def fetch(self, timeout=TIMEOUT / 1000):
+        data = self.read(timeout)
+        self.test.journal_chunk('trace', data)
+        result = self.pair(data)
+        self.test.publish(result['voltage'], result['current'], result.get('timestamp', np.nan))
+        if len(result['voltage']) < len(self):
+            self.test.log_message(f"2182A returned {len(result['voltage'])} of {len(self)} readings.")
+        return result
+
+    def stream(self, timeout, chunk=TRACE_STREAM_CHUNK):
+        # Yields the readings added since the previous chunk. The 2182A has no
+        # partial trace readback, so each chunk re-reads the buffer; polling
+        # the fill count between chunks keeps that to one read per chunk.
+        seen = 0
+        deadline = time.time() + timeout
+        while seen < len(self) and time.time() < deadline:
+            available = self.count()
+            if available - seen < min(chunk, len(self) - seen):
+                time.sleep(POLL_INTERVAL)
+                continue
+            data = self.read()
+            result = self.pair(data)
+            if len(result['voltage']) > seen:
+                self.test.journal_chunk('trace', data[seen * self.elements:len(result['voltage']) * self.elements])
+                new = {name: values[seen:] for name, values in result.items()}
+                self.test.publish(new['voltage'], new['current'], new.get('timestamp', np.nan))
+                yield new
+                seen = len(result['voltage'])
+        if seen < len(self):
+            self.test.log_message(f"Streaming stopped with {seen} of {len(self)} readings.")
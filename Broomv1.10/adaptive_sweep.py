@@ -0,0 +1,96 @@
+# adaptive_sweep.py
+#
+# Adaptive point placement for IV sweeps. A coarse uniform pass is measured
+# first; each point's deviation from the straight line through its two
+# neighbours (a curvature estimate in volts) marks the intervals where linear
+# interpolation is worse than the tolerance. Those intervals are bisected and
+# only the new midpoints are measured in the next SOUR:LIST pass, until every
+# interval meets the tolerance or the point/pass budget runs out. Ohmic
+# stretches keep their coarse spacing, so transitions are resolved with far
+# fewer pulses than a uniform sweep of the same resolution.
+
+import numpy as np
+from config import *
+
+
+def interpolation_error(currents, voltages):
+    # |V_j - line through (I_{j-1}, V_{j-1}) and (I_{j+1}, V_{j+1}) at I_j|;
+    # the end points have no estimate (0)
+    currents = np.asarray(currents, dtype=float)
+    voltages = np.asarray(voltages, dtype=float)
+    error = np.zeros(len(currents))
+    if len(currents) < 3:
+        return error
+    span = currents[2:] - currents[:-2]
+    weight = np.divide(currents[1:-1] - currents[:-2], span, out=np.full(len(span), 0.5), where=span != 0)
+    predicted = voltages[:-2] + weight * (voltages[2:] - voltages[:-2])
+    error[1:-1] = np.abs(voltages[1:-1] - predicted)
+    return np.nan_to_num(error, nan=np.inf)
+
+
+def interval_error(currents, voltages):
+    # An interval is as bad as the worse of its two end points
+    error = interpolation_error(currents, voltages)
+    return np.maximum(error[:-1], error[1:])
+
+
+def refine_points(currents, voltages, tolerance, min_step, budget):
+    """Midpoints of the intervals that fail the tolerance, worst first.
+
+    Intervals narrower than 2 * min_step are not split; at most budget new
+    points are returned, sorted by current.
+    """
+    currents = np.asarray(currents, dtype=float)
+    error = interval_error(currents, voltages)
+    width = np.diff(currents)
+    split = np.flatnonzero((error > tolerance) & (np.abs(width) >= 2 * min_step))
+    split = split[np.argsort(-error[split], kind='stable')][:max(budget, 0)]
+    return np.sort(currents[split] + width[split] / 2)
+
+
+def merge_points(currents, voltages, new_currents, new_voltages):
+    # Measured points of all passes, ordered by current
+    currents = np.concatenate([currents, new_currents])
+    voltages = np.concatenate([voltages, new_voltages])
+    order = np.argsort(currents, kind='stable')
+    return currents[order], voltages[order]
+
+
+class AdaptivePlan:
+    def __init__(self, start, stop, coarse_points, tolerance, max_points=MAX_2182A_READINGS,
+                 max_passes=ADAPTIVE_MAX_PASSES, min_step=None):
+        self.tolerance = tolerance
+        self.max_points = max_points
+        self.max_passes = max_passes
+        self.min_step = min_step if min_step is not None else abs(stop - start) * ADAPTIVE_MIN_STEP_FRACTION
+        self.pending = np.linspace(min(start, stop), max(start, stop), coarse_points)
+        self.currents = np.empty(0)
+        self.voltages = np.empty(0)
+        self.passes = 0
+
+    @property
+    def done(self):
+        return not len(self.pending)
+
+    def next_pass(self):
+        # Currents to measure in the coming pass (empty once finished)
+        return self.pending
+
+    def add(self, voltages):
+        # Merges the readings of the pending currents and plans the next pass
+        measured = self.pending[:len(voltages)]
+        self.currents, self.voltages = merge_points(self.currents, self.voltages, measured,
+                                                    np.asarray(voltages, dtype=float)[:len(measured)])
+        self.passes += 1
+        if self.passes >= self.max_passes:
+            self.pending = np.empty(0)
+        else:
+            self.pending = refine_points(self.currents, self.voltages, self.tolerance, self.min_step,
+                                         self.max_points - len(self.currents))
+        return self.pending
+
+    def summary(self):
+        error = interval_error(self.currents, self.voltages) if len(self.currents) > 1 else np.empty(0)
+        return {'points': len(self.currents), 'passes': self.passes,
+                'max_interpolation_error': float(np.max(error[np.isfinite(error)], initial=0.0)),
+                'converged': bool(len(error) == 0 or np.all(error <= self.tolerance))}
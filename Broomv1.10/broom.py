@@ -0,0 +1,444 @@
+# broom.py
+#
+# Non-interactive command-line runner for the Broom sweeps.
+#
+#   python broom.py [--yes] ACTION [ARGS] [ACTION [ARGS] ...]
+#
+# Several actions can be chained in one invocation; they share a single
+# instrument session, so only the first sweep pays the connect/reset cost:
+#
+#   python broom.py --yes pulsed pulsed.json export run1.npz scan scan.json
+#
+# Instrument log messages go to stderr (and LOG_FILE, see broom_logging.py)
+# and a JSON status document is printed on stdout, so the runner can be
+# driven from batch schedulers.
+#
+# NumPy, PyVISA and the sweep modules are imported inside the actions that
+# need them; --help and status start without touching any of them (see
+# import_benchmark.py).
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from config import *
+
+ACTIONS = ('pulsed', 'dc', 'planned', 'stream', 'delta', 'dcon', 'loop', 'adaptive', 'scan', 'optimize', 'monitor', 'export', 'recover', 'runs', 'status')
+CATALOG_ACTIONS = ('pulsed', 'dc', 'planned', 'stream', 'delta', 'dcon', 'loop', 'adaptive')
+INSTRUMENT_ACTIONS = ('pulsed', 'dc', 'planned', 'stream', 'delta', 'dcon', 'loop', 'adaptive', 'scan', 'optimize', 'monitor')
+
+
+def load_spec(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def json_safe(value):
+    # NaN and inf (statistics over fewer than two loops, empty timing
+    # reports) become null, so the printed results stay valid JSON
+    if isinstance(value, dict):
+        return {name: json_safe(item) for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def load_sweep_spec(path):
+    # DC-style sweeps may leave out the delay; the test derives it from the
+    # 2182A speed setting (parameters.derive_sweep_delay)
+    spec = load_spec(path)
+    spec.setdefault('delay', None)
+    return spec
+
+
+def build_action_parser():
+    parser = argparse.ArgumentParser(prog='broom', add_help=False)
+    actions = parser.add_subparsers(dest='action', required=True)
+    for name, help_text in (('pulsed', 'pulsed IV sweep'), ('dc', 'DC staircase sweep'),
+                            ('delta', 'delta mode measurement'), ('dcon', 'differential conductance sweep')):
+        action = actions.add_parser(name, help=help_text)
+        action.add_argument('spec', help='JSON file with the sweep parameters')
+        action.add_argument('--output', help='CSV file for the data (default: timestamped)')
+    planned = actions.add_parser('planned', help='DC sweep on fixed 2182A ranges predicted per segment')
+    planned.add_argument('spec', help='JSON file with the sweep parameters (no voltage_range)')
+    planned.add_argument('--output', help='CSV file for the data (default: timestamped)')
+    stream = actions.add_parser('stream', help='DC sweep that stops early when a stop condition is met')
+    stream.add_argument('spec', help='JSON file with the DC sweep parameters and a "stop" block')
+    stream.add_argument('--output', help='CSV file for the data (default: timestamped)')
+    loop = actions.add_parser('loop', help='repeated hysteresis loops, one summary row per loop')
+    loop.add_argument('spec', help='JSON file with the loop sweep parameters')
+    loop.add_argument('--output', help='CSV file for the per-loop summaries (default: timestamped)')
+    adaptive = actions.add_parser('adaptive', help='IV sweep with points concentrated where the curve bends')
+    adaptive.add_argument('spec', help='JSON file with the adaptive sweep parameters')
+    adaptive.add_argument('--output', help='CSV file for the data (default: timestamped)')
+    scan = actions.add_parser('scan', help='parameter scan over pulsed sweeps')
+    scan.add_argument('spec', help='JSON file with "base" parameters and a "grid" or "random" design')
+    scan.add_argument('--output', help='scan dataset CSV; an existing one is resumed')
+    optimize = actions.add_parser('optimize', help='find the fastest 2182A setting meeting a noise target')
+    optimize.add_argument('voltage_range', help='2182A range, e.g. "100 mV"')
+    optimize.add_argument('target_noise', type=float, help='noise target (V rms)')
+    actions.add_parser('monitor', help='report instrument identity and error queue')
+    actions.add_parser('status', help='report whether the session daemon is running (no instrument I/O)')
+    recover = actions.add_parser('recover', help='rebuild the runs in an acquisition journal (no instrument I/O)')
+    recover.add_argument('journal', help='journal file written with --journal or by a scan')
+    recover.add_argument('--output', help='prefix for the per-run .npz files (default: the journal name)')
+    runs = actions.add_parser('runs', help='list catalogued runs (no instrument I/O)')
+    runs.add_argument('--mode', help='only runs of this action, e.g. pulsed')
+    runs.add_argument('--status', help='complete or failed')
+    runs.add_argument('--since', type=float, help='only runs started after this Unix time')
+    runs.add_argument('--where', action='append', default=[], metavar='NAME=VALUE|NAME=LOW:HIGH',
+                      help='spec parameter filter; repeatable')
+    runs.add_argument('--limit', type=int, default=50)
+    export = actions.add_parser('export', help='write the previous action\'s data (.csv, .json or .npz)')
+    export.add_argument('path')
+    return parser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='broom',
+        description='Run Broom sweeps without prompts. Actions: ' + ', '.join(ACTIONS) + '. '
+                    'Chain actions by listing them one after another.')
+    parser.add_argument('--yes', '-y', action='store_true', help='do not ask for confirmation')
+    parser.add_argument('--address', default=INSTRUMENT_ADDRESS, help='VISA resource string of the 6221')
+    parser.add_argument('--quiet', '-q', action='store_true', help='suppress instrument log messages')
+    parser.add_argument('--journal', help='append raw readings to this write-ahead journal as they arrive')
+    parser.add_argument('--record', help='record all instrument traffic of this run to a session file')
+    parser.add_argument('--replay', help='serve instrument traffic from a recorded session file instead of the bench')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help='replay instrument time this many times faster (0: no delays)')
+    parser.add_argument('--ring', help='publish readings to a shared-memory ring of this name for other processes')
+    parser.add_argument('--catalog', default=RUN_CATALOG_FILE, help='run catalog database ("" to disable)')
+    parser.add_argument('actions', nargs=argparse.REMAINDER, help='ACTION [ARGS] ...')
+    return parser
+
+
+def split_actions(argv):
+    # Every token naming an action starts a new group, unless it is the value
+    # of the option before it (runs --mode dc)
+    groups = []
+    for token in argv:
+        if not groups or (token in ACTIONS and not groups[-1][-1].startswith('--')):
+            groups.append([token])
+        else:
+            groups[-1].append(token)
+    return groups
+
+
+def timestamped(prefix):
+    return f"{prefix}{time.strftime('%Y-%m-%d %H-%M-%S')}{DEFAULT_FILE_EXTENSION}"
+
+
+def write_columns(path, columns):
+    import numpy as np
+    names = list(columns)
+    if path.endswith('.npz'):
+        np.savez(path, **columns)
+    elif path.endswith('.json'):
+        with open(path, 'w', encoding="utf-8") as f:
+            json.dump({name: np.asarray(columns[name]).tolist() for name in names}, f)
+    else:
+        np.savetxt(path, np.column_stack([columns[name] for name in names]), delimiter=',',
+                   header=','.join(names), comments='')
+    return path
+
+
+class BroomRunner:
+    def __init__(self, address=INSTRUMENT_ADDRESS, quiet=False, journal=None, catalog=RUN_CATALOG_FILE, ring=None):
+        self.address = address
+        self.quiet = quiet
+        self.transport = None  # SessionRecorder or SessionPlayer
+        self.ring = None
+        if ring:
+            from shared_ring import SharedRing
+            self.ring = SharedRing(ring)
+        self.catalog_path = catalog
+        self.catalog = None  # opened on first use
+        self.journal = None
+        if journal:
+            from journal import AcquisitionJournal
+            self.journal = AcquisitionJournal(journal)
+        self.test = None
+        self.logging = None  # log listener, started with the instrument session
+        self.last = None  # data of the previous action, for export
+        self.warm = False
+
+    def session(self):
+        if self.test is None:
+            from broom_logging import setup_logging
+            from sweep_functions import PulsedIVTest
+            self.logging = setup_logging(console=not self.quiet)
+            self.test = PulsedIVTest()
+            self.test.journal = self.journal
+            self.test.ring = self.ring
+            if self.transport is not None:
+                self.test.source.opener = self.transport.open
+            if not self.test.connect(self.address):
+                raise ConnectionError(CONNECTION_ERROR)
+        return self.test
+
+    def close(self):
+        if self.test is not None and self.test.instrument:
+            self.test.disconnect()
+        if self.journal is not None:
+            self.journal.close()
+        if hasattr(self.transport, 'close'):
+            self.transport.close()
+        if self.catalog is not None:
+            self.catalog.close()
+        if self.ring is not None:
+            self.ring.finish()
+            self.ring.close()
+            self.ring.unlink()
+        if self.logging is not None:
+            self.logging.stop()
+
+    def open_catalog(self):
+        if self.catalog is None and self.catalog_path:
+            from run_catalog import RunCatalog
+            self.catalog = RunCatalog(self.catalog_path)
+        return self.catalog
+
+    def catalog_run(self, args, spec, started, result, error=None):
+        # One catalog row per finished or failed sweep
+        if args.action not in CATALOG_ACTIONS or self.open_catalog() is None:
+            return None
+        timing = {'phases': self.test.last_phases if args.action == 'pulsed' else None,
+                  'trigger': self.test.timing_report if args.action in ('pulsed', 'delta', 'dcon') else None}
+        return self.catalog.record_test(self.test, args.action, spec, status='failed' if error else 'complete',
+                                        started=started, elapsed=time.time() - started,
+                                        points=result.get('points'), data_path=result.get('output'),
+                                        timing=timing)
+
+    def check_readings(self, voltage, name):
+        # A failed sweep returns None (or nothing at all); report that, not the
+        # TypeError the summary would raise on it
+        if voltage is None or not len(voltage):
+            self.warm = False
+            raise RuntimeError(f"{name} failed or was aborted.")
+
+    def do_pulsed(self, args):
+        test = self.session()
+        voltage, current = test.run_pulsed_sweep(**load_spec(args.spec), reset=not self.warm)
+        self.check_readings(voltage, "Pulsed sweep")
+        self.warm = True
+        self.last = {'voltage': voltage, 'current': current}
+        if test.pulse_delta is not None:
+            self.last.update(uncertainty=test.pulse_delta['uncertainty'], count=test.pulse_delta['count'])
+        return {'points': len(voltage), 'timing': test.timing_report,
+                'output': write_columns(args.output or timestamped('Sweep_'), self.last)}
+
+    def do_dc(self, args):
+        voltage, current = self.session().run_dc_sweep(**load_sweep_spec(args.spec))
+        self.check_readings(voltage, "DC sweep")
+        self.warm = False
+        self.last = {'voltage': voltage, 'current': current}
+        return {'points': len(voltage), 'output': write_columns(args.output or timestamped('DCSweep_'), self.last)}
+
+    def do_planned(self, args):
+        voltage, current, plan = self.session().run_planned_sweep(**load_sweep_spec(args.spec))
+        self.check_readings(voltage, "Range-planned sweep")
+        self.warm = False
+        self.last = {'voltage': voltage, 'current': current}
+        return {'points': len(voltage), 'ranges': [{'first': first, 'stop': stop, 'range': name}
+                                                   for first, stop, name in plan],
+                'output': write_columns(args.output or timestamped('Planned_'), self.last)}
+
+    def do_stream(self, args):
+        from stop_conditions import build_conditions
+        test = self.session()
+        spec = load_sweep_spec(args.spec)
+        conditions = build_conditions(test, spec.pop('stop', {}))
+        voltage, current, stopped = test.run_streaming_sweep(**spec, stop_conditions=conditions)
+        self.check_readings(voltage, "Streaming sweep")
+        self.warm = False
+        self.last = {'voltage': voltage, 'current': current}
+        return {'points': len(voltage), 'stopped': stopped,
+                'output': write_columns(args.output or timestamped('Stream_'), self.last)}
+
+    def do_delta(self, args):
+        test = self.session()
+        self.last = test.run_delta(**load_spec(args.spec))
+        self.warm = False
+        output = write_columns(args.output or timestamped('Delta_'), self.last)
+        # Allan deviation and PSD are stored next to the data they describe
+        from noise_analysis import save_report
+        noise = save_report(test.noise_report, os.path.splitext(output)[0] + '_noise.json')
+        return {'points': len(self.last['voltage']), 'timing': test.timing_report,
+                'min_adev_tau': test.noise_report['min_adev_tau'], 'output': output, 'noise': noise}
+
+    def do_dcon(self, args):
+        test = self.session()
+        self.last = test.run_differential_conductance(**load_spec(args.spec))
+        self.warm = False
+        return {'points': len(self.last['conductance']), 'timing': test.timing_report,
+                'output': write_columns(args.output or timestamped('DiffCond_'), self.last)}
+
+    def do_loop(self, args):
+        spec = load_sweep_spec(args.spec)
+        spec.setdefault('reset', False)  # the test only reconfigures when the loop settings changed
+        analyzer = self.session().run_loop_sweep(**spec)
+        self.warm = False
+        self.last = analyzer.columns()
+        return {'loops': len(analyzer.summaries), 'statistics': analyzer.statistics(),
+                'output': write_columns(args.output or timestamped('Loops_'), self.last)}
+
+    def do_adaptive(self, args):
+        voltage, current, summary = self.session().run_adaptive_sweep(**load_sweep_spec(args.spec))
+        self.check_readings(voltage, "Adaptive sweep")
+        self.warm = False
+        self.last = {'voltage': voltage, 'current': current}
+        return dict(summary, output=write_columns(args.output or timestamped('Adaptive_'), self.last))
+
+    def do_scan(self, args):
+        from scan_runner import ScanRunner, grid_design, random_design
+        spec = load_spec(args.spec)
+        if 'grid' in spec:
+            design = grid_design(**spec['grid'])
+        else:
+            random_spec = spec['random']
+            design = random_design(random_spec['points'], random_spec.get('seed'), random_spec.get('log_axes', ()),
+                                   **random_spec['ranges'])
+        runner = ScanRunner(self.session(), spec['base'], design, args.output or spec.get('output'),
+                            catalog=self.open_catalog())
+        estimated = runner.schedule().makespan()
+        complete = runner.run()
+        self.warm = complete
+        self.last = runner.load()
+        return {'points': len(runner.points), 'completed': len(runner.completed), 'output': runner.path,
+                'estimated_time': estimated}
+
+    def do_optimize(self, args):
+        from nplc_optimizer import NPLCOptimizer, load_profile
+        test = self.session()
+        setting = NPLCOptimizer(test).optimize(args.voltage_range, args.target_noise)
+        test.nplc_profile = load_profile()
+        self.warm = False
+        return {'voltage_range': args.voltage_range, 'setting': setting}
+
+    def do_monitor(self, args):
+        test = self.session()
+        return {'6221': test.query_6221(), '2182A': test.query_2182a(), 'errors': test.read_errors()}
+
+    def do_status(self, args):
+        from session_daemon import SessionClient
+        client = SessionClient()
+        if not client.is_available():
+            return {'daemon': False}
+        with client:
+            return dict(daemon=True, **client.ping())
+
+    def do_recover(self, args):
+        import numpy as np
+        from journal import replay
+        prefix = args.output or os.path.splitext(args.journal)[0]
+        runs = []
+        for name, run in replay(args.journal).items():
+            columns = dict(run['chunks'], **run['result'])
+            output = None
+            if columns:
+                output = f"{prefix}_{name}.npz"
+                np.savez(output, **columns)
+            runs.append({'run': name, 'mode': run['mode'], 'status': run['status'] or 'interrupted',
+                         'checkpoint': run['checkpoint'], 'output': output})
+        return {'runs': runs}
+
+    def do_runs(self, args):
+        filters = {}
+        for condition in args.where:
+            name, _, value = condition.partition('=')
+            if ':' in value:
+                low, high = value.split(':', 1)
+                filters[name] = (float(low) if low else None, float(high) if high else None)
+            else:
+                try:
+                    filters[name] = float(value)
+                except ValueError:
+                    filters[name] = value
+        if self.open_catalog() is None:
+            raise RuntimeError("No run catalog: --catalog is disabled.")
+        runs = self.catalog.find(args.mode, args.status, args.since, limit=args.limit, **filters)
+        return {'runs': [{name: run[name] for name in ('id', 'started', 'mode', 'status', 'points', 'data_path',
+                                                       'spec')} for run in runs]}
+
+    def do_export(self, args):
+        if self.last is None:
+            raise RuntimeError("Nothing to export: no earlier action in this invocation produced data.")
+        return {'output': write_columns(args.path, self.last)}
+
+    def run(self, parsed_actions):
+        results = []
+        for args in parsed_actions:
+            started = time.time()
+            spec = None
+            try:
+                action = getattr(self, f'do_{args.action}')
+                spec = load_spec(args.spec) if 'spec' in args else {}
+                # Scans keep their own journal next to the dataset
+                if self.journal is not None and args.action in INSTRUMENT_ACTIONS and args.action != 'scan':
+                    with self.journal.recording(args.action, {'spec': spec} if 'spec' in args else {}):
+                        result = action(args)
+                else:
+                    result = action(args)
+                run_id = self.catalog_run(args, spec, started, result)
+                if run_id is not None:
+                    result['run_id'] = run_id
+                results.append(dict(action=args.action, ok=True, elapsed=time.time() - started, **result))
+            except Exception as e:
+                failure = {'action': args.action, 'ok': False, 'elapsed': time.time() - started, 'error': str(e)}
+                if spec is not None and self.test is not None and self.test.instrument:
+                    # The failure itself is what gets reported, even if it cannot be cataloged
+                    try:
+                        self.catalog_run(args, spec, started, {}, e)
+                    except Exception as catalog_error:
+                        failure['catalog_error'] = str(catalog_error)
+                results.append(failure)
+                break  # later actions usually depend on this one
+        return results
+
+
+def confirm(actions):
+    if not any(args.action in INSTRUMENT_ACTIONS for args in actions):
+        return True
+    if not sys.stdin.isatty():
+        return False
+    answer = input(f"Run {', '.join(args.action for args in actions)} on the instrument? [y/N] ")
+    return answer.strip().lower() in ('y', 'yes')
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    action_parser = build_action_parser()
+    groups = split_actions(args.actions)
+    if not groups:
+        action_parser.print_help()
+        return 2
+    parsed = [action_parser.parse_args(group) for group in groups]
+
+    if args.replay:
+        args.yes = True  # nothing reaches a bench
+        args.catalog = ''  # replays are not new runs
+    if not args.yes and not confirm(parsed):
+        print(json.dumps({'ok': False, 'error': 'Not confirmed; pass --yes to run non-interactively.'}))
+        return 1
+
+    runner = BroomRunner(args.address, args.quiet, args.journal, args.catalog, args.ring)
+    if args.record or args.replay:
+        from visa_recording import SessionPlayer, SessionRecorder
+        runner.transport = (SessionPlayer(args.replay, args.replay_speed or None) if args.replay
+                            else SessionRecorder(args.record))
+    try:
+        results = runner.run(parsed)
+    finally:
+        runner.close()
+    ok = len(results) == len(parsed) and all(result['ok'] for result in results)
+    print(json.dumps(json_safe({'ok': ok, 'actions': results}), indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# broom_logging.py
+#
+# Logging for the Broom stack. Code logs to the 'broom.*' loggers; records
+# go through a QueueHandler into an in-process queue, and a background
+# QueueListener does the formatting and the file I/O, so a log call on the
+# measurement path costs one enqueue (and a disabled debug call one level
+# check). The listener writes rotating JSON-lines files, optionally echoes to
+# stderr, and hands records to subscribers such as the GUI terminal. Bulk
+# payloads (trace readbacks, list uploads) are cut to LOG_PAYLOAD_LIMIT
+# characters when formatted. Per-module levels come from config.LOG_LEVELS
+# and can be changed while running with set_level('io', 'DEBUG').
+#
+#   service = setup_logging()
+#   service.subscribe(gui_queue.put)   # called on the listener thread
+#   ...
+#   service.stop()
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from config import *
+from timing import anchored
+
+ROOT = 'broom'
+
+
+def get_logger(name):
+    return logging.getLogger(f'{ROOT}.{name}')
+
+
+def level_number(level):
+    # 'DEBUG' or logging.DEBUG
+    return level if isinstance(level, int) else logging.getLevelName(level.upper())
+
+
+def set_level(name, level):
+    # name below 'broom' ('io', 'sweep', ...) or 'broom' for everything
+    logger = logging.getLogger(ROOT if name == ROOT else f'{ROOT}.{name}')
+    logger.setLevel(level_number(level))
+
+
+def truncate(text, limit=LOG_PAYLOAD_LIMIT):
+    if limit and len(text) > limit:
+        return f"{text[:limit]}... ({len(text) - limit} more chars)"
+    return text
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() formats the message in the logging thread; the
+    # queue never leaves this process, so the record is passed as it is and
+    # formatted by the listener
+    def prepare(self, record):
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'time': record.created, 'level': record.levelname, 'logger': record.name,
+                 'thread': record.threadName, 'message': truncate(record.getMessage())}
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        record.message = truncate(record.getMessage())
+        return f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} {record.name}: {record.message}"
+
+
+class SubscriberHandler(logging.Handler):
+    # Fans messages out to (callback, level) subscribers, on the listener thread
+    def __init__(self):
+        super().__init__()
+        self.subscribers = []
+
+    def emit(self, record):
+        message = None
+        for callback, level in list(self.subscribers):
+            if record.levelno < level:
+                continue
+            if message is None:
+                message = truncate(record.getMessage())
+            try:
+                callback(message)
+            except Exception:
+                self.handleError(record)
+
+
+class LogService:
+    def __init__(self, listener, queue_handler, subscribers):
+        self.listener = listener
+        self.queue_handler = queue_handler
+        self.subscribers = subscribers
+
+    def subscribe(self, callback, level=logging.INFO):
+        # callback(message) runs on the listener thread: GUI code should only
+        # put the message on its own queue and drain that from the Tk loop
+        self.subscribers.subscribers.append((callback, level_number(level)))
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.subscribers = [(subscriber, level) for subscriber, level in self.subscribers.subscribers
+                                        if subscriber != callback]
+
+    def stop(self):
+        # Flushes what is queued, then detaches from the 'broom' logger
+        global _service
+        self.listener.stop()
+        logging.getLogger(ROOT).removeHandler(self.queue_handler)
+        for handler in self.listener.handlers:
+            handler.close()
+        _service = None
+
+
+_service = None
+
+
+def logging_active():
+    # True while setup_logging's listener runs in this process. hasHandlers()
+    # is no substitute: a root handler (pytest, a notebook) would count, and
+    # INFO records would then be filtered at the root's WARNING level.
+    return _service is not None
+
+
+def setup_logging(path=LOG_FILE, levels=None, console=False, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+    """Start the background log listener (once per process) and return it.
+
+    levels maps logger names below 'broom' (e.g. 'io') or 'broom' itself to
+    level names, on top of config.LOG_LEVELS. A relative path is taken next
+    to the Broom modules.
+    """
+    global _service
+    if _service is not None:
+        return _service
+    handlers = []
+    if path:
+        file_handler = logging.handlers.RotatingFileHandler(anchored(path), maxBytes=max_bytes, backupCount=backups,
+                                                            encoding="utf-8", delay=True)
+        file_handler.setFormatter(JSONFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(TextFormatter())
+        console_handler.setLevel(logging.INFO)
+        handlers.append(console_handler)
+    subscribers = SubscriberHandler()
+    handlers.append(subscribers)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    root = logging.getLogger(ROOT)
+    root.addHandler(queue_handler)
+    root.propagate = False
+    for name, level in dict(LOG_LEVELS, **(levels or {})).items():
+        set_level(name, level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _service = LogService(listener, queue_handler, subscribers)
+    return _service
@@ -7,6 +7,60 @@ SETUP_DELAY = 0.350  # 350 ms delay after setup commands
 QUERY_DELAY = 0.150  # 150 ms delay after query commands
 LONG_COMMAND_DELAY = 3  # 3 seconds delay for long commands like RST
 
+# I/O resilience settings
+TIMEOUT_BUDGETS = {  # per operation class, in milliseconds
+    'setup': 2000,
+    'query': 5000,
+    'bulk': 30000,
+}
+IO_RETRIES = 4
+BACKOFF_BASE = 0.01  # first retry waits up to 10 ms
+BACKOFF_MAX = 1.0  # cap on the backoff between retries
+BREAKER_FAILURE_THRESHOLD = 6  # consecutive failures before failing fast
+BREAKER_RESET_TIME = 30  # seconds before a tripped breaker lets a probe through
+
+# Session daemon settings
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 50621
+DAEMON_CONNECT_TIMEOUT = 0.5  # seconds to wait when probing for a running daemon
+STARTUP_BUDGET = 0.2  # seconds allowed for broom --help / status (import_benchmark.py)
+
+# Timing model settings
+RUN_TRACE_FILE = "run_trace.jsonl"  # measured phase durations of past runs (relative: next to timing.py)
+TIMING_HISTORY = 200  # most recent runs used for calibration
+DEFAULT_NPLC = 1  # 2182A integration time set by configure_2182a
+SETUP_RESET_TIME = LONG_COMMAND_DELAY + 8 * SETUP_DELAY  # 2182A *RST and batched config (6221 *RST waits on *OPC?)
+SETUP_COMMANDS = 4  # 2182A passthrough writes paced by SETUP_DELAY in setup_pulsed_sweep
+READBACK_TIME_PER_READING = 2e-4  # ASCII transfer time per buffered reading
+SWEEP_WAIT_FRACTION = 0.9  # portion of the predicted sweep slept before polling
+SWEEP_WAIT_MARGIN = 5  # seconds allowed past the prediction before giving up
+POLL_INTERVAL = 0.05  # seconds between buffer fill polls
+
+# List sweep settings
+LIST_CHUNK_POINTS = 100  # values per SOUR:LIST write
+LIST_CHUNK_BYTES = 1000  # keep each write well inside the 6221 input buffer
+MAX_LIST_POINTS = 65535
+
+# 2182A trace buffer and loop (hysteresis) sweep settings
+MAX_2182A_READINGS = 1024  # 2182A trace buffer size, i.e. points per loop
+TRACE_STREAM_CHUNK = 100  # new 2182A readings that trigger a streaming readback
+SWITCH_THRESHOLD_FACTOR = 10  # a jump this many times the median step counts as switching
+
+# Parameter scan settings: most expensive to reconfigure first
+SCAN_PARAMETER_COST = [
+    'voltage_range',  # 2182A function/range change through the serial passthrough
+    'voltage_compliance',
+    'sweep_type',
+    'num_off_measurements',
+    'num_pulses',
+    'start',
+    'stop',
+    'pulse_off_level',
+    'pulse_interval',
+    'pulse_delay',
+    'pulse_width',
+]
+
 # Default sweep parameters
 DEFAULT_START_LEVEL = 0  # Amps
 DEFAULT_STOP_LEVEL = 10e-3  # 10 mA
@@ -15,6 +69,7 @@ DEFAULT_SWEEP_TYPE = 'Linear'  # 'Linear' or 'Logarithmic'
 
 # Voltage measure range options
 VOLTAGE_RANGES = ['100 mV', '1 V', '10 V', '100 V']
+VOLTAGE_RANGE_VALUES = {'100 mV': 0.1, '1 V': 1, '10 V': 10, '100 V': 100}  # full scale, V
 DEFAULT_VOLTAGE_RANGE = '100 mV'
 
 # Default pulse settings
@@ -52,4 +107,51 @@ MEASUREMENT_COMPLETE = "Pulsed IV sweep completed successfully."
 
 # Other constants
 PLC_60HZ = 1/60  # Duration of one Power Line Cycle for 60 Hz
-PLC_50HZ = 1/50  # Duration of one Power Line Cycle for 50 Hz
\ No newline at end of file
+PLC_50HZ = 1/50  # Duration of one Power Line Cycle for 50 Hz
+POWER_LINE_FREQUENCY = 60  # Hz, mains frequency at the bench
+MEASUREMENT_SETTLE_TIME = 1e-3  # margin added to expected trigger intervals
+
+# Trigger timing validation (trigger_timing.py)
+TIMING_TOLERANCE = 0.1  # allowed deviation from the programmed interval, as a fraction of it
+MISSED_TRIGGER_FACTOR = 1.5  # an interval this many times the programmed one holds a missed trigger
+
+# 2182A speed/noise profile (nplc_optimizer.py)
+NPLC_PROFILE_FILE = "nplc_profile.json"  # chosen setting per 2182A range (relative: next to nplc_optimizer.py)
+NPLC_CANDIDATES = [0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5]  # calibration burst settings
+DIGITAL_FILTER_COUNTS = [1, 10]  # 2182A repeating filter counts tried (1 = filter off)
+NOISE_BURST_READINGS = 50  # readings per calibration burst
+AUTOZERO_TIME_FACTOR = 2  # autozero takes a reference conversion per reading
+
+# Noise statistics of long time series (noise_analysis.py)
+PSD_SEGMENT = 256  # readings per Welch segment in noise_analysis
+ALLAN_MIN_PAIRS = 8  # fewest differences for an Allan deviation octave to be reported
+
+# Adaptive point placement (adaptive_sweep.py)
+ADAPTIVE_MAX_PASSES = 6  # refinement passes after the coarse one, at most
+ADAPTIVE_MIN_STEP_FRACTION = 1 / 1024  # narrowest point spacing, as a fraction of the sweep span
+
+# Streaming sweeps with stop conditions (stop_conditions.py)
+SLOPE_BASELINE_POINTS = 5  # readings needed before a dV/dI jump can be judged
+COMPLIANCE_BIT = 1 << 3  # 6221 measurement event register: source in compliance
+
+# Predictive 2182A range selection (range_planner.py)
+RANGE_HEADROOM = 1.5  # predicted |V| times this must fit the chosen range
+RANGE_MIN_SEGMENT = 10  # fewest points worth a range change in a split sweep
+
+# Write-ahead acquisition journal (journal.py)
+JOURNAL_FSYNC = True  # fsync after every record; off trades crash safety for speed on slow disks
+
+# Run catalog (run_catalog.py)
+RUN_CATALOG_FILE = "runs.sqlite"  # one row per finished run (relative: next to run_catalog.py)
+
+# Shared-memory reading ring (shared_ring.py)
+RING_CAPACITY = 1 << 16  # readings held for consumers in other processes
+
+# Logging (broom_logging.py)
+LOG_FILE = "broom.log"  # JSON-lines log, rotated at LOG_MAX_BYTES (relative: next to broom_logging.py)
+LOG_MAX_BYTES = 5 * 1024 * 1024  # size at which the log file is rotated
+LOG_BACKUPS = 5  # rotated log files kept (broom.log.1 ... broom.log.5)
+LOG_PAYLOAD_LIMIT = 500  # longest message kept; trace readbacks and list uploads are cut here
+LOG_LEVELS = {'broom': 'INFO', 'io': 'WARNING'}  # per-module levels below the 'broom' logger
+LOG_GUI_POLL_MS = 100  # how often the GUI terminal drains queued log messages
+LOG_GUI_BATCH = 200  # most messages added to the terminal per poll
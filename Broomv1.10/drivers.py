@@ -0,0 +1,266 @@
+# drivers.py
+#
+# The one transport layer for the 6221/2182A stack. K6221 owns the VISA
+# session and the resilient I/O policy; K2182A talks to the nanovoltmeter
+# through the 6221 serial passthrough. Sweep code builds on these instead of
+# carrying its own connect/query/passthrough copies, so fixes to timing,
+# batching or readback are made once. Fast paths:
+#   - write_batch: setup commands joined with ';' into a few writes
+#   - fetch_trace: binary (SREAL) buffer transfer in TRAC:DATA:SEL? blocks
+#   - wait_for_sweep_done: service request where the interface has one,
+#     operation-event polling otherwise; *OPC? instead of fixed sleeps
+
+import time
+from contextlib import contextmanager
+import numpy as np
+import pyvisa
+from config import *
+from visa_io import InstrumentIOError, ResilientIO
+from trace_buffer import TraceAccumulator
+from broom_logging import get_logger
+
+# Per-command traffic at debug level; %-style arguments so a disabled level costs one check
+log = get_logger('io')
+
+SWEEP_DONE_BIT = 1 << 1  # operation event register: sweep finished
+TRACE_BLOCK = 1000  # readings per TRAC:DATA:SEL? block
+
+
+def rooted(command):
+    # After ';' a header is parsed relative to the previous one's path; a
+    # leading ':' starts it again from the root (common commands need none)
+    return command if command.startswith((':', '*')) else ':' + command
+
+
+def command_batches(commands, max_bytes=LIST_CHUNK_BYTES):
+    # Joins commands with ';' into writes that fit the instrument input buffer
+    batch = []
+    for command in map(rooted, commands):
+        if batch and len(';'.join(batch + [command])) > max_bytes:
+            yield ';'.join(batch)
+            batch = []
+        batch.append(command)
+    if batch:
+        yield ';'.join(batch)
+
+
+class K6221:
+    def __init__(self, address=INSTRUMENT_ADDRESS, log_message=print):
+        self.address = address
+        self.log_message = log_message
+        self.rm = None  # created on first open
+        self.instrument = None
+        self.io = ResilientIO(lambda message: self.log_message(message))
+        self.pending = None  # commands collected inside batch()
+        self.opener = None  # address -> resource, replacing pyvisa (see visa_recording.py)
+
+    @property
+    def is_open(self):
+        return self.instrument is not None
+
+    def open_resource(self):
+        if self.opener is not None:
+            self.instrument = self.opener(self.address)
+        else:
+            if self.rm is None:
+                self.rm = pyvisa.ResourceManager()
+            self.instrument = self.rm.open_resource(self.address)
+        self.instrument.timeout = TIMEOUT
+        self.instrument.write_termination = '\n'
+        self.instrument.read_termination = '\n'
+
+    def open(self, address=None):
+        if address is not None:
+            self.address = address
+        self.open_resource()
+        self.io.breaker.reset()
+        return self
+
+    def close(self):
+        if self.instrument is not None:
+            self.instrument.close()
+            self.instrument = None
+        if self.rm is not None:
+            self.rm.close()
+            self.rm = None
+
+    def reopen(self):
+        self.instrument.close()
+        time.sleep(1)
+        self.open_resource()
+
+    def write(self, command):
+        if self.pending is not None:
+            self.pending.append(command)
+        else:
+            log.debug("6221 write %s", command)
+            self.io.write(self.instrument, command)
+
+    def write_batch(self, commands):
+        for batch in command_batches(commands):
+            log.debug("6221 write %s", batch)
+            self.io.write(self.instrument, batch)
+
+    def pace(self):
+        # Setup spacing between single writes; nothing to wait for inside a batch
+        if self.pending is None:
+            time.sleep(SETUP_DELAY)
+
+    @contextmanager
+    def batch(self):
+        # Collects write() calls and sends them as a few ';'-joined writes.
+        # Queries inside the block go out immediately, so keep them outside.
+        if self.pending is not None:
+            yield self
+            return
+        self.pending = []
+        try:
+            yield self
+            commands, self.pending = self.pending, None
+            self.write_batch(commands)
+        finally:
+            self.pending = None
+
+    def query(self, command, operation='query'):
+        response = self.io.query(self.instrument, command, operation)
+        log.debug("6221 query %s -> %s", command, response)
+        return response
+
+    def query_values(self, command, operation='bulk'):
+        return self.io.query_ascii_values(self.instrument, command, operation)
+
+    def identify(self):
+        return self.query('*IDN?')
+
+    def wait_complete(self, operation='bulk'):
+        # *OPC? returns once all pending operations are done: no guessed sleeps
+        return self.query('*OPC?', operation)
+
+    def clear(self):
+        self.instrument.write('*CLS')
+
+    def reset(self):
+        self.instrument.write('*RST;*CLS')
+        self.wait_complete()
+
+    def errors(self):
+        errors = []
+        while True:
+            error = self.query(':SYST:ERR?')
+            if error.startswith('0,'):
+                break
+            errors.append(error)
+        return errors
+
+    def abort(self):
+        self.instrument.write('SOUR:SWE:ABOR')
+
+    def output_off(self):
+        self.instrument.write('SOUR:SWE:ABOR;:OUTP OFF')
+
+    def has_srq(self):
+        # Service requests need a GPIB or USBTMC session; raw sockets have none
+        interface = getattr(self.instrument, 'interface_type', None)
+        return interface in (pyvisa.constants.InterfaceType.gpib, pyvisa.constants.InterfaceType.usb)
+
+    def wait_for_sweep_done(self, timeout):
+        if self.has_srq():
+            self.instrument.write(f'STAT:OPER:ENAB {SWEEP_DONE_BIT};*SRE 128;*CLS')
+            try:
+                self.instrument.wait_for_srq(int(timeout * 1000))
+                return True
+            except pyvisa.errors.VisaIOError:
+                raise TimeoutError(f"Sweep did not finish within {timeout:.1f} seconds")
+            finally:
+                self.instrument.write('*SRE 0')
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if int(self.query('STAT:OPER:EVEN?')) & SWEEP_DONE_BIT:
+                return True
+            time.sleep(POLL_INTERVAL)
+        raise TimeoutError(f"Sweep did not finish within {timeout:.1f} seconds")
+
+    def fetch_trace(self, num_readings, elements, binary=True, on_block=None):
+        # Reads num_readings records of the given number of elements from the
+        # buffer. Binary transfer avoids formatting and parsing ASCII on both
+        # ends; the ASCII path is kept for debugging with a terminal.
+        # on_block, if given, is called with each block's records as it arrives.
+        trace = TraceAccumulator(num_readings * elements)
+        if binary:
+            self.instrument.write('FORM:DATA SRE;:FORM:BORD SWAP')
+        try:
+            for first in range(0, num_readings, TRACE_BLOCK):
+                count = min(TRACE_BLOCK, num_readings - first)
+                command = f'TRAC:DATA:SEL? {first},{count}'
+                if binary:
+                    log.debug("6221 binary block %s", command)
+                    trace.extend(self.io.call(self.instrument, 'bulk', command, self.instrument.query_binary_values,
+                                              command, 'f', False, np.array))
+                else:
+                    trace.add_response(self.query(command, 'bulk'))
+                if on_block is not None:
+                    on_block(trace.data[first * elements:].reshape(-1, elements))
+        finally:
+            if binary:
+                self.instrument.write('FORM:DATA ASC')
+        return trace.data.reshape(-1, elements)
+
+
+class K2182A:
+    # The 2182A behind the 6221 RS-232 passthrough
+    def __init__(self, source):
+        self.source = source
+
+    def write(self, command):
+        # Double quotes would end the passthrough string; the 2182A takes single ones
+        command = command.replace('"', "'")
+        log.debug("2182A write %s", command)
+        # Straight to the 6221, never batched: the passthrough needs the pacing below
+        self.source.io.write(self.source.instrument, f':SYST:COMM:SER:SEND "{command}"')
+        time.sleep(SETUP_DELAY)
+
+    def write_batch(self, commands):
+        for batch in command_batches(commands):
+            self.write(batch)
+
+    def read(self, timeout=TIMEOUT / 1000):
+        # The reply reaches the 6221 some time after the command; poll ENT?
+        # until it is there instead of sleeping a fixed time
+        instrument = self.source.instrument
+        deadline = time.time() + timeout
+        while True:
+            response = self.source.io.call(instrument, 'query', 'ENT?', instrument.query,
+                                           ':SYST:COMM:SER:ENT?').strip()
+            if response or time.time() > deadline:
+                break
+            time.sleep(POLL_INTERVAL)
+        if not response:
+            raise InstrumentIOError("No response from the 2182A")
+        log.debug("2182A read %s", response)
+        return response
+
+    def query(self, command, timeout=TIMEOUT / 1000):
+        self.write(command)
+        return self.read(timeout)
+
+    def identify(self):
+        return self.query('*IDN?')
+
+    def wait_complete(self):
+        return self.query('*OPC?')
+
+    def clear(self):
+        self.write('*CLS')
+        self.wait_complete()
+
+    def reset(self):
+        self.write('*RST')
+        time.sleep(LONG_COMMAND_DELAY)
+        self.wait_complete()
+        self.clear()
+
+    def fetch_trace(self, num_readings, timeout=TIMEOUT / 1000):
+        # The whole buffer in one :TRAC:DATA?, arriving over several ENT? reads
+        trace = TraceAccumulator(num_readings)
+        self.write(':TRAC:DATA?')
+        return trace.poll(lambda: self.source.instrument.query(':SYST:COMM:SER:ENT?'), timeout)
@@ -1,5 +1,6 @@
 # gui.py
 
+import queue
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import matplotlib.pyplot as plt
@@ -182,6 +183,19 @@ class BroomGUI(tk.Tk):
         self.terminal.insert(tk.END, message + "\n")
         self.terminal.see(tk.END)
 
+    def follow_log(self, messages):
+        # Drains a queue.Queue filled by the log listener thread; Tk widgets
+        # are only touched here, on the Tk thread
+        lines = []
+        while len(lines) < LOG_GUI_BATCH:
+            try:
+                lines.append(messages.get_nowait())
+            except queue.Empty:
+                break
+        if lines:
+            self.log_to_terminal("\n".join(lines))
+        self.after(LOG_GUI_POLL_MS, self.follow_log, messages)
+
     def set_connect_callback(self, callback):
         self.connect_callback = callback
 
@@ -215,18 +229,25 @@ class BroomGUI(tk.Tk):
         return messagebox.askyesno("Confirmation", message)
 
     def get_measurement_parameters(self):
+        # Raw entry text is passed through; parameters.validate does the checking
+        def number(entry, kind=float):
+            try:
+                return kind(entry.get())
+            except ValueError:
+                return entry.get()
+
         return {
-            "start": float(self.start_level.get()),
-            "stop": float(self.stop_level.get()),
-            "num_pulses": int(self.num_pulses.get()),
+            "start": number(self.start_level),
+            "stop": number(self.stop_level),
+            "num_pulses": number(self.num_pulses, int),
             "sweep_type": self.sweep_type.get(),
             "voltage_range": self.voltage_range.get(),
-            "pulse_width": float(self.pulse_width.get()),
-            "pulse_delay": float(self.pulse_delay.get()),
-            "pulse_interval": float(self.pulse_interval.get()),
-            "voltage_compliance": float(self.voltage_compliance.get()),
-            "pulse_off_level": float(self.pulse_off_level.get()),
-            "num_off_measurements": int(self.num_off_measurements.get()),
+            "pulse_width": number(self.pulse_width),
+            "pulse_delay": number(self.pulse_delay),
+            "pulse_interval": number(self.pulse_interval),
+            "voltage_compliance": number(self.voltage_compliance),
+            "pulse_off_level": number(self.pulse_off_level),
+            "num_off_measurements": number(self.num_off_measurements, int),
             "enable_compliance_abort": self.compliance_abort.get()
         }
 
@@ -0,0 +1,121 @@
+# hysteresis.py
+#
+# Loop-sweep analysis. Each point of the programmed current list is tagged
+# with its branch (ramping up or down, positive or negative current), and the
+# loop area, switching currents and hysteresis width are updated as readings
+# arrive. One analyzer is reused for any number of consecutive loops, keeping
+# a per-loop summary for switching statistics.
+
+import numpy as np
+from config import *
+from trace_buffer import TraceAccumulator
+
+UP, DOWN = 1, -1
+BRANCHES = ('up+', 'down+', 'up-', 'down-')
+
+
+def fill_zeros(signs, default):
+    # Replaces zeros by the last non-zero value before them (leading zeros
+    # take the first non-zero value, or default if there is none)
+    nonzero = np.flatnonzero(signs)
+    if not len(nonzero):
+        return np.full(len(signs), default)
+    index = np.where(signs != 0, np.arange(len(signs)), nonzero[0])
+    return signs[np.maximum.accumulate(index)]
+
+
+def branch_labels(currents):
+    # Direction is the one the point was reached with (the first point takes
+    # the direction of the next), so a turning point belongs to the branch it
+    # ends. Repeated levels and zero current inherit from the previous point.
+    currents = np.asarray(currents, dtype=float)
+    step = np.sign(np.diff(currents)).astype(int)
+    direction = fill_zeros(np.concatenate([step[:1], step]), UP)
+    polarity = fill_zeros(np.sign(currents).astype(int), 1)
+    names = np.array(BRANCHES)
+    return names[np.where(direction == UP, 0, 1) + np.where(polarity > 0, 0, 2)]
+
+
+def loop_area(currents, voltages):
+    # Trapezoid integral of V dI along the loop (W for a closed loop)
+    return float(np.sum(0.5 * (voltages[1:] + voltages[:-1]) * np.diff(currents)))
+
+
+def switching_currents(currents, voltages, branches, threshold=None):
+    # Largest voltage jump inside each branch; reported as the current midway
+    # between the two points, or nan if no jump exceeds the threshold.
+    jumps = np.abs(np.diff(voltages))
+    same = branches[1:] == branches[:-1]
+    if threshold is None:
+        typical = np.median(jumps[same]) if same.any() else 0.0
+        threshold = SWITCH_THRESHOLD_FACTOR * typical
+    midpoints = 0.5 * (currents[1:] + currents[:-1])
+    result = {}
+    for name in BRANCHES:
+        candidates = np.where(same & (branches[1:] == name), jumps, -1.0)
+        best = int(np.argmax(candidates)) if len(candidates) else 0
+        found = len(candidates) and candidates[best] > threshold and candidates[best] > 0
+        result[name] = float(midpoints[best]) if found else np.nan
+    return result
+
+
+class LoopAnalyzer:
+    def __init__(self, currents, switch_threshold=None):
+        self.currents = np.asarray(currents, dtype=float)
+        self.branches = branch_labels(self.currents)
+        self.switch_threshold = switch_threshold
+        self.loop = TraceAccumulator(len(self.currents))
+        self.area = 0.0  # running area of the loop in progress
+        self.summaries = []
+
+    def add(self, voltages):
+        # Accepts readings in chunks of any size, also spanning loop
+        # boundaries. Returns the branch label of every reading added.
+        voltages = np.asarray(voltages, dtype=float).ravel()
+        labels = []
+        while len(voltages):
+            first = len(self.loop)
+            taken = voltages[:len(self.currents) - first]
+            voltages = voltages[len(taken):]
+            self.loop.extend(taken)
+            end = len(self.loop)
+            # Integrate the new segment, joined to the last point already seen
+            start = max(first - 1, 0)
+            self.area += loop_area(self.currents[start:end], self.loop.data[start:end])
+            labels.append(self.branches[first:end])
+            if self.loop.full:
+                self.finish_loop()
+        return np.concatenate(labels) if labels else self.branches[:0]
+
+    def finish_loop(self):
+        voltages = self.loop.data
+        switching = switching_currents(self.currents, voltages, self.branches, self.switch_threshold)
+        summary = {'loop': len(self.summaries), 'area': abs(self.area)}
+        summary.update(switching)
+        for sign in ('+', '-'):
+            summary['width' + sign] = abs(switching['up' + sign] - switching['down' + sign])
+        self.summaries.append(summary)
+        self.loop.clear()
+        self.area = 0.0
+        return summary
+
+    @property
+    def last(self):
+        return self.summaries[-1] if self.summaries else None
+
+    def columns(self):
+        # Per-loop summaries as NumPy columns
+        names = ['loop', 'area'] + list(BRANCHES) + ['width+', 'width-']
+        return {name: np.array([s[name] for s in self.summaries], dtype=float) for name in names}
+
+    def statistics(self):
+        # Mean and spread of each figure over the finished loops (nan-aware)
+        stats = {}
+        for name, values in self.columns().items():
+            if name == 'loop':
+                continue
+            counted = int(np.count_nonzero(~np.isnan(values)))
+            stats[name] = {'mean': float(np.nanmean(values)) if counted else np.nan,
+                           'std': float(np.nanstd(values)) if counted else np.nan,
+                           'count': counted}
+        return stats
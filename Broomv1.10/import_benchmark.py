@@ -0,0 +1,87 @@
+# import_benchmark.py
+#
+# Measures import and startup time of the Broom entry points. Each case runs
+# in a fresh interpreter so module caches do not hide the cost; the lightweight
+# entry points are checked against STARTUP_BUDGET.
+#
+#   python import_benchmark.py [--repeat N] [--detail MODULE]
+#
+# --detail prints the slowest imports of one module from python -X importtime.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from config import STARTUP_BUDGET
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (name, interpreter arguments, must fit STARTUP_BUDGET)
+CASES = [
+    ('python (baseline)', ['-c', 'pass'], False),
+    ('broom --help', ['broom.py', '--help'], True),
+    ('broom status', ['broom.py', 'status'], True),
+    ('import session_daemon', ['-c', 'import session_daemon'], True),
+    ('import sweep_functions', ['-c', 'import sweep_functions'], False),
+    ('import scan_runner', ['-c', 'import scan_runner'], False),
+    ('import gui', ['-c', 'import gui'], False),
+]
+
+
+def time_case(args, repeat):
+    # Returns (median seconds, None) or (None, error) when the case exits non-zero;
+    # a case that fails early would otherwise look fast
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=HERE, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True)
+        times.append(time.perf_counter() - start)
+        if result.returncode:
+            lines = result.stderr.strip().splitlines()
+            return None, f"exit {result.returncode}: {lines[-1] if lines else 'no output'}"
+    return statistics.median(times), None
+
+
+def import_detail(module, top=15):
+    # -X importtime writes "import time: self [us] | cumulative | name" to stderr
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=HERE, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    rows.sort(reverse=True)
+    for cumulative, name in rows[:top]:
+        print(f"{cumulative / 1e3:10.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time benchmark for the Broom entry points.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--detail', metavar='MODULE')
+    args = parser.parse_args()
+    if args.detail:
+        import_detail(args.detail)
+        return 0
+
+    over, failed = [], []
+    for name, case_args, budgeted in CASES:
+        elapsed, error = time_case(case_args, args.repeat)
+        if error:
+            failed.append(name)
+            print(f"{name:<26}{'':>8}     FAILED ({error})")
+            continue
+        flag = ''
+        if budgeted:
+            flag = 'ok' if elapsed < STARTUP_BUDGET else 'OVER BUDGET'
+            if elapsed >= STARTUP_BUDGET:
+                over.append(name)
+        print(f"{name:<26}{elapsed * 1e3:8.1f} ms  {flag}")
+    return 1 if over or failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
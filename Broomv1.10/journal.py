@@ -0,0 +1,155 @@
+# journal.py
+#
+# Write-ahead acquisition journal. Every chunk of raw readings is appended to
+# a JSON-lines file (and fsynced) as soon as it has been read from the
+# instruments, together with run begin/end records and checkpoints of the
+# sweep state. Nothing waits for the end of a run, so a crash, a dropped
+# socket or a closed GUI loses at most the chunk in flight: replay() rebuilds
+# every run from the file, complete or not, and scans resume from the last
+# point the journal saw finished.
+#
+# Records: {"seq", "time", "type": begin|chunk|checkpoint|end, "run", ...}
+
+import json
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+from config import *
+
+
+def encode(values):
+    values = np.asarray(values, dtype=float)
+    data = values.ravel().tolist()
+    if not np.isfinite(values).all():
+        # nan/inf are not JSON; None round-trips them as nan
+        data = [v if np.isfinite(v) else None for v in data]
+    return {'shape': list(values.shape), 'data': data}
+
+
+def decode(payload):
+    return np.array([np.nan if v is None else v for v in payload['data']], dtype=float).reshape(payload['shape'])
+
+
+class AcquisitionJournal:
+    def __init__(self, path, fsync=JOURNAL_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        self.file = None
+        self.run = None
+        self.seq = 0
+        self.counts = {}  # readings journaled so far per chunk name, in this run
+
+    def open(self):
+        if self.file is None:
+            # Runs already in the file keep their ids; new ones continue after them
+            records = read_journal(self.path)
+            self.seq = records[-1]['seq'] + 1 if records else 0
+            self.file = open(self.path, 'a', encoding="utf-8")
+            if self.file.tell() and not ends_with_newline(self.path):
+                self.file.write("\n")  # keep a torn record from swallowing the next one
+        return self
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def append(self, record_type, **fields):
+        self.open()
+        record = dict(seq=self.seq, time=time.time(), type=record_type, run=self.run, **fields)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.seq += 1
+        return record
+
+    def begin(self, mode, params=None, run=None):
+        self.run = run if run is not None else f"run{self.open().seq}"
+        self.counts = {}
+        self.append('begin', mode=mode, params=params or {})
+        return self.run
+
+    def chunk(self, name, values):
+        values = np.asarray(values, dtype=float)
+        offset = self.counts.get(name, 0)
+        self.counts[name] = offset + len(values)
+        return self.append('chunk', name=name, offset=offset, values=encode(values))
+
+    def checkpoint(self, **state):
+        return self.append('checkpoint', state=state)
+
+    def end(self, status='complete', result=None):
+        record = self.append('end', status=status,
+                             result={name: encode(values) for name, values in (result or {}).items()})
+        self.run = None
+        return record
+
+    @contextmanager
+    def recording(self, mode, params=None, run=None):
+        # begin/end around a block; an exception ends the run as failed
+        self.begin(mode, params, run)
+        try:
+            yield self
+        except BaseException:
+            self.end('failed')
+            raise
+        self.end()
+
+
+def ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def read_journal(path):
+    # All intact records; a torn last line (crash mid-write) is skipped
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def replay(path):
+    """Rebuild the runs in a journal.
+
+    Returns {run: {'mode', 'params', 'status', 'chunks': {name: array},
+    'checkpoint': last checkpoint state, 'result': {name: array}}}; status
+    is None for runs that never ended (interrupted).
+    """
+    runs = {}
+    for record in read_journal(path):
+        if record['type'] == 'begin':
+            runs[record['run']] = {'mode': record['mode'], 'params': record['params'], 'status': None,
+                                   'parts': {}, 'checkpoint': None, 'result': {}}
+            continue
+        run = runs.get(record['run'])
+        if run is None:
+            continue
+        if record['type'] == 'chunk':
+            run['parts'].setdefault(record['name'], []).append((record['offset'], decode(record['values'])))
+        elif record['type'] == 'checkpoint':
+            run['checkpoint'] = record['state']
+        elif record['type'] == 'end':
+            run['status'] = record['status']
+            run['result'] = {name: decode(payload) for name, payload in record['result'].items()}
+    for run in runs.values():
+        parts = run.pop('parts')
+        run['chunks'] = {name: np.concatenate([values for _, values in sorted(chunks, key=lambda c: c[0])])
+                         for name, chunks in parts.items()}
+    return runs
@@ -0,0 +1,80 @@
+# list_sweep.py
+#
+# Custom (SOUR:LIST) sweeps for the 6221. Current and delay lists are sent as
+# comma-joined blocks sized to the instrument's input buffer instead of one
+# SOUR:LIST:*:APP write per point, checked with a single POIN? readback, and
+# skipped entirely when the same list is already loaded.
+
+import hashlib
+import numpy as np
+from config import *
+
+
+def build_sweep_list(start, stop, points, shape='linear'):
+    # Same shapes as K6221.IVSweep: a plain ramp, a start->stop->start loop,
+    # or a bidirectional 0->+stop->0->-stop->0 hysteresis loop.
+    if shape == 'linear':
+        return np.linspace(start, stop, points)
+    if shape == 'loop':
+        return np.concatenate([np.linspace(start, stop, points), np.linspace(stop, start, points)])
+    if shape == 'loop_bidir':
+        return np.concatenate([np.linspace(0, stop, points), np.linspace(stop, 0, points),
+                               np.linspace(0, -stop, points), np.linspace(-stop, 0, points)])
+    raise ValueError(f"Unknown sweep list shape: {shape}")
+
+
+def list_blocks(values, max_points=LIST_CHUNK_POINTS, max_bytes=LIST_CHUNK_BYTES):
+    # Yields comma-joined value blocks that fit one instrument write
+    block, size = [], 0
+    for text in (f'{v:.6e}' for v in values):
+        if block and (len(block) >= max_points or size + len(text) + 1 > max_bytes):
+            yield ','.join(block)
+            block, size = [], 0
+        block.append(text)
+        size += len(text) + 1
+    if block:
+        yield ','.join(block)
+
+
+def list_hash(currents, delays):
+    digest = hashlib.sha1()
+    digest.update(np.asarray(currents, dtype=float).tobytes())
+    digest.update(np.asarray(delays, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class ListSweepUploader:
+    def __init__(self, test):
+        self.test = test
+        self.loaded_hash = None
+        self.loaded_points = 0
+
+    def invalidate(self):
+        # Call whenever the 6221 may have lost its list (reset, reconnect)
+        self.loaded_hash = None
+        self.loaded_points = 0
+
+    def upload(self, currents, delays):
+        currents = np.asarray(currents, dtype=float)
+        delays = np.broadcast_to(np.asarray(delays, dtype=float), currents.shape)
+        if len(currents) > MAX_LIST_POINTS:
+            raise ValueError(f"Sweep list has {len(currents)} points, the 6221 holds at most {MAX_LIST_POINTS}")
+        digest = list_hash(currents, delays)
+        if digest == self.loaded_hash:
+            self.test.log_message(f"Sweep list of {len(currents)} points already loaded, skipping upload.")
+            return False
+
+        instrument = self.test.instrument
+        for command, values in (('SOUR:LIST:CURR', currents), ('SOUR:LIST:DEL', delays)):
+            for i, block in enumerate(list_blocks(values)):
+                # The plain command replaces the list, :APP extends it
+                instrument.write(f'{command} {block}' if i == 0 else f'{command}:APP {block}')
+
+        loaded = int(float(self.test.robust_query('SOUR:LIST:CURR:POIN?')))
+        if loaded != len(currents):
+            self.invalidate()
+            raise RuntimeError(f"Sweep list upload failed: expected {len(currents)} points, instrument has {loaded}")
+        self.loaded_hash = digest
+        self.loaded_points = loaded
+        self.test.log_message(f"Uploaded sweep list of {loaded} points.")
+        return True
@@ -2,6 +2,10 @@
 
 from gui import BroomGUI
 from sweep_functions import PulsedIVTest
+from session_daemon import SessionClient
+from parameters import ParameterError, validate
+from broom_logging import setup_logging
+import queue
 import tkinter as tk
 from tkinter import messagebox, ttk
 from config import *
@@ -10,6 +14,8 @@ class BroomController:
     def __init__(self):
         self.gui = BroomGUI()
         self.pulsed_iv = PulsedIVTest()
+        self.session = SessionClient()
+        self.use_session = False
         
         self.gui.set_connect_callback(self.connect_instrument)
         self.gui.set_disconnect_callback(self.disconnect_instrument)
@@ -24,35 +30,83 @@ class BroomController:
         self.gui.abort_button = ttk.Button(self.gui, text="Abort", command=self.abort_measurement)
         self.gui.abort_button.pack(pady=5)
         
-        self.pulsed_iv.log_message = self.gui.log_to_terminal
+        # Instrument messages reach the terminal through the log listener, so
+        # a sweep never waits on the Tk widget
+        self.logging = setup_logging()
+        self.log_queue = queue.Queue()
+        self.logging.subscribe(self.log_queue.put)
+        self.gui.follow_log(self.log_queue)
         
     def run(self):
-        self.gui.mainloop()
+        try:
+            self.gui.mainloop()
+        finally:
+            self.logging.stop()
         
     def connect_instrument(self):
-        if self.pulsed_iv.connect():
+        # A running session daemon already owns the instrument socket
+        if self.session.is_available():
+            self.use_session = True
+            self.gui.log_to_terminal("Using warm instrument session from the Broom daemon.")
+            self.gui.enable_controls()
+        elif self.pulsed_iv.connect():
             self.gui.enable_controls()
         else:
             messagebox.showerror("Connection Error", "Failed to connect to the instrument.")
 
     def disconnect_instrument(self):
-        self.pulsed_iv.disconnect()
+        if self.use_session:
+            self.session.close()
+            self.use_session = False
+        else:
+            self.pulsed_iv.disconnect()
         self.gui.disable_controls()
 
+    def submit(self, action, **params):
+        # The daemon owns the instruments in session mode; pulsed_iv is not connected then
+        try:
+            return self.session.submit(action, **params)
+        except (OSError, RuntimeError) as e:
+            self.gui.log_to_terminal(f"Session daemon request failed: {str(e)}")
+            return None
+
     def reset_6221(self):
-        self.pulsed_iv.reset_6221()
+        if self.use_session:
+            if self.submit("reset", instrument="6221"):
+                self.gui.log_to_terminal("6221 has been reset.")
+        else:
+            self.pulsed_iv.reset_6221()
 
     def query_6221(self):
-        self.pulsed_iv.query_6221()
+        if self.use_session:
+            identity = self.submit("idn")
+            if identity:
+                self.gui.log_to_terminal(f"6221 query response: {identity['6221']}")
+        else:
+            self.pulsed_iv.query_6221()
 
     def reset_2182a(self):
-        self.pulsed_iv.reset_2182a()
+        if self.use_session:
+            if self.submit("reset", instrument="2182A"):
+                self.gui.log_to_terminal("2182A has been reset.")
+        else:
+            self.pulsed_iv.reset_2182a()
 
     def query_2182a(self):
-        self.pulsed_iv.query_2182a()
+        if self.use_session:
+            identity = self.submit("idn")
+            if identity:
+                self.gui.log_to_terminal(f"2182A query response: {identity['2182A']}")
+        else:
+            self.pulsed_iv.query_2182a()
 
     def read_errors(self):
-        errors = self.pulsed_iv.read_errors()
+        if self.use_session:
+            errors = self.submit("read_errors")
+            if errors is None:
+                return
+        else:
+            errors = self.pulsed_iv.read_errors()
         if errors:
             error_message = "\n".join(errors)
             messagebox.showinfo("Instrument Errors", error_message)
@@ -62,12 +116,23 @@ class BroomController:
     def run_measurement(self):
         try:
             params = self.gui.get_measurement_parameters()
-            
+            try:
+                validate(params)
+            except ParameterError as e:
+                messagebox.showerror("Invalid Parameters", "\n".join(e.errors))
+                return
+            eta = self.pulsed_iv.timing.predict(**params, reset=not self.use_session)
+            self.gui.log_to_terminal(f"Estimated run time: {eta['total']:.2f} seconds "
+                                     f"(setup {eta['setup']:.1f} s, sweep {eta['sweep']:.1f} s)")
+
             if not self.gui.user_confirmation("Are you sure you want to start the measurement?"):
                 self.gui.log_to_terminal("Measurement cancelled by user.")
                 return
 
-            voltage, current = self.pulsed_iv.run_pulsed_sweep(**params)
+            if self.use_session:
+                voltage, current = self.session.run_pulsed_sweep(**params)
+            else:
+                voltage, current = self.pulsed_iv.run_pulsed_sweep(**params)
 
             if voltage is not None and current is not None:
                 x_label = self.gui.x_axis.get()
@@ -83,7 +148,12 @@ class BroomController:
             self.gui.log_to_terminal(f"An error occurred: {str(e)}")
 
     def abort_measurement(self):
-        self.pulsed_iv.abort()
+        if self.use_session:
+            # Separate connection: the sweep request may still be waiting on its reply
+            with SessionClient() as client:
+                client.submit("abort")
+        else:
+            self.pulsed_iv.abort()
         self.gui.log_to_terminal("Measurement aborted.")
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+# noise_analysis.py
+#
+# Streaming noise statistics for long voltage time series (delta mode runs).
+# Chunks are fed as they are read from the instrument; nothing keeps the
+# whole series:
+#   - Allan deviation at octave averaging times tau0 * 2^k, from one small
+#     accumulator per octave (O(log n) memory)
+#   - Welch power spectral density from Hann-windowed, half-overlapping
+#     segments folded into a running sum
+# The report decides the integration time and filter count a sweep can use.
+
+import json
+import numpy as np
+from config import *
+
+
+class OctaveLevel:
+    # Averages of 2^k consecutive readings: successive differences for the
+    # Allan variance, and pairwise means passed up to the next octave
+    def __init__(self):
+        self.last = None
+        self.held = None
+        self.sum_squares = 0.0
+        self.count = 0
+
+
+class AllanAccumulator:
+    def __init__(self, tau0):
+        self.tau0 = tau0
+        self.levels = []
+
+    def add(self, values):
+        # Pairwise means cascade upwards; each chunk is handled one octave at
+        # a time so the work stays vectorized
+        values = np.asarray(values, dtype=float).ravel()
+        k = 0
+        while len(values):
+            if k == len(self.levels):
+                self.levels.append(OctaveLevel())
+            level = self.levels[k]
+            joined = values if level.last is None else np.concatenate([[level.last], values])
+            level.sum_squares += float(np.sum(np.diff(joined) ** 2))
+            level.count += len(joined) - 1
+            level.last = values[-1]
+            if level.held is not None:
+                values = np.concatenate([[level.held], values])
+            pairs = len(values) // 2
+            level.held = values[-1] if len(values) % 2 else None
+            values = 0.5 * (values[:2 * pairs:2] + values[1:2 * pairs:2])
+            k += 1
+
+    def result(self, min_count=ALLAN_MIN_PAIRS):
+        # Octaves with too few differences for a meaningful estimate are left out
+        taus, deviations, counts = [], [], []
+        for k, level in enumerate(self.levels):
+            if level.count >= min_count:
+                taus.append(self.tau0 * 2 ** k)
+                deviations.append(np.sqrt(level.sum_squares / (2 * level.count)))
+                counts.append(level.count)
+        return {'tau': np.array(taus), 'adev': np.array(deviations), 'count': np.array(counts, dtype=int)}
+
+
+class WelchAccumulator:
+    def __init__(self, sample_rate, segment=PSD_SEGMENT):
+        self.sample_rate = sample_rate
+        self.segment = segment
+        self.step = segment // 2
+        self.window = np.hanning(segment)
+        self.scale = 1 / (sample_rate * np.sum(self.window ** 2))
+        self.pending = np.empty(0)
+        self.power = np.zeros(segment // 2 + 1)
+        self.segments = 0
+
+    def add(self, values):
+        self.pending = np.concatenate([self.pending, np.asarray(values, dtype=float).ravel()])
+        available = (len(self.pending) - self.segment) // self.step + 1
+        if available <= 0:
+            return
+        starts = np.arange(available) * self.step
+        segments = self.pending[starts[:, None] + np.arange(self.segment)]
+        segments = segments - segments.mean(axis=1, keepdims=True)
+        self.power += np.sum(np.abs(np.fft.rfft(segments * self.window, axis=1)) ** 2, axis=0)
+        self.segments += available
+        self.pending = self.pending[available * self.step:]
+
+    def result(self):
+        if not self.segments:
+            return {'frequency': np.empty(0), 'psd': np.empty(0), 'segments': 0}
+        psd = self.power * self.scale / self.segments
+        # One-sided: fold the negative frequencies in, except DC and Nyquist
+        psd[1:-1 if self.segment % 2 == 0 else None] *= 2
+        return {'frequency': np.fft.rfftfreq(self.segment, 1 / self.sample_rate), 'psd': psd,
+                'segments': self.segments}
+
+
+class NoiseAnalyzer:
+    def __init__(self, interval, segment=PSD_SEGMENT):
+        self.interval = interval
+        self.allan = AllanAccumulator(interval)
+        self.welch = WelchAccumulator(1 / interval, segment)
+        self.count = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.allan.add(values)
+        self.welch.add(values)
+        self.count += len(values)
+
+    def report(self):
+        allan = self.allan.result()
+        welch = self.welch.result()
+        # White-noise level from the flat part of the spectrum (upper half)
+        upper = welch['psd'][len(welch['psd']) // 2:]
+        return {
+            'interval': self.interval,
+            'readings': self.count,
+            'tau': allan['tau'].tolist(),
+            'adev': allan['adev'].tolist(),
+            'allan_count': allan['count'].tolist(),
+            'frequency': welch['frequency'].tolist(),
+            'psd': welch['psd'].tolist(),
+            'psd_segments': welch['segments'],
+            'white_noise_density': float(np.sqrt(np.median(upper))) if len(upper) else None,
+            'min_adev_tau': allan['tau'][np.argmin(allan['adev'])].item() if len(allan['tau']) else None,
+        }
+
+
+def save_report(report, path):
+    with open(path, 'w', encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return path
@@ -0,0 +1,165 @@
+# nplc_optimizer.py
+#
+# Chooses the fastest 2182A setting (NPLC, repeating filter, autozero) that
+# meets a noise target. Short free-running bursts are taken at a few candidate
+# settings, the measured noise is fitted as noise^2 = a / t + b over the
+# effective integration time t (white noise averaging down onto a floor), and
+# the fit is solved for the shortest reading time that still meets the
+# target. The result is stored per range in the profile that PulsedIVTest
+# loads for sweeps that do not pass an explicit NPLC.
+
+import json
+import os
+import time
+import numpy as np
+from config import *
+from acquisition import TraceAcquisition
+from timing import anchored
+
+MIN_NPLC = 0.01
+MAX_NPLC = 60 if POWER_LINE_FREQUENCY == 60 else 50
+
+
+def integration_time(nplc, filter_count=1, line_frequency=POWER_LINE_FREQUENCY):
+    return np.asarray(nplc, dtype=float) / line_frequency * np.maximum(filter_count, 1)
+
+
+def reading_time(nplc, filter_count=1, autozero=False, line_frequency=POWER_LINE_FREQUENCY):
+    return integration_time(nplc, filter_count, line_frequency) * (AUTOZERO_TIME_FACTOR if autozero else 1)
+
+
+def fit_noise(times, noise):
+    # Least-squares fit of noise^2 = a / t + b, both terms kept non-negative
+    times = np.asarray(times, dtype=float)
+    variance = np.asarray(noise, dtype=float) ** 2
+    design = np.column_stack([1 / times, np.ones_like(times)])
+    (a, b), *_ = np.linalg.lstsq(design, variance, rcond=None)
+    if b < 0:
+        a, b = float(np.sum(variance / times) / np.sum(1 / times ** 2)), 0.0
+    elif a < 0:
+        a, b = 0.0, float(np.mean(variance))
+    return float(a), float(b)
+
+
+def required_time(a, b, target):
+    # Shortest integration time with predicted noise <= target (inf if the floor is above it)
+    if b >= target ** 2:
+        return np.inf
+    return a / (target ** 2 - b) if a > 0 else 0.0
+
+
+def choose_setting(measurements, target, line_frequency=POWER_LINE_FREQUENCY):
+    """Pick the fastest setting predicted to meet target (V rms).
+
+    measurements is a list of dicts with nplc, filter_count, autozero and
+    noise. Each filter/autozero family is fitted on its own and solved for
+    the smallest NPLC; returns None when no family can reach the target.
+    """
+    best = None
+    families = sorted({(m['filter_count'], m['autozero']) for m in measurements})
+    for filter_count, autozero in families:
+        rows = [m for m in measurements if (m['filter_count'], m['autozero']) == (filter_count, autozero)]
+        times = integration_time([m['nplc'] for m in rows], filter_count, line_frequency)
+        if len(rows) >= 2:
+            a, b = fit_noise(times, [m['noise'] for m in rows])
+            needed = required_time(a, b, target)
+        else:
+            a = b = None
+            needed = times[0] if rows[0]['noise'] <= target else np.inf
+        nplc = max(needed * line_frequency / filter_count, MIN_NPLC)
+        if nplc > MAX_NPLC:
+            continue
+        # Round up to a settable step so the noise target still holds
+        step = 0.01 if nplc < 1 else 0.1
+        nplc = float(np.round(np.ceil(nplc / step - 1e-9) * step, 2))
+        candidate = {
+            'nplc': nplc,
+            'filter_count': filter_count,
+            'autozero': autozero,
+            'reading_time': float(reading_time(nplc, filter_count, autozero, line_frequency)),
+            'predicted_noise': float(np.sqrt(a / integration_time(nplc, filter_count, line_frequency) + b))
+                               if a is not None else rows[0]['noise'],
+            'fit': {'a': a, 'b': b},
+        }
+        if best is None or candidate['reading_time'] < best['reading_time']:
+            best = candidate
+    return best
+
+
+def apply_setting(test, nplc, filter_count=None, autozero=None):
+    # filter_count/autozero of None leave the 2182A's current state alone
+    commands = [f':SENS:VOLT:NPLC {nplc}']
+    if filter_count is not None:
+        if filter_count > 1:
+            commands += [':SENS:VOLT:DFIL:TCON REP', f':SENS:VOLT:DFIL:COUN {filter_count}']
+        commands.append(f':SENS:VOLT:DFIL:STAT {"ON" if filter_count > 1 else "OFF"}')
+    if autozero is not None:
+        commands.append(f':SYST:AZER:STAT {"ON" if autozero else "OFF"}')
+    test.meter.write_batch(commands)
+
+
+def load_profile(path=NPLC_PROFILE_FILE):
+    path = anchored(path)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_profile(profile, path=NPLC_PROFILE_FILE):
+    path = anchored(path)
+    temp = path + '.tmp'
+    with open(temp, 'w', encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(temp, path)
+
+
+class NPLCOptimizer:
+    def __init__(self, test, candidates=NPLC_CANDIDATES, filter_counts=DIGITAL_FILTER_COUNTS,
+                 autozero=(False, True), burst_readings=NOISE_BURST_READINGS):
+        self.test = test
+        self.candidates = list(candidates)
+        self.filter_counts = list(filter_counts)
+        self.autozero = list(autozero)
+        self.burst_readings = burst_readings
+        self.measurements = []
+
+    def burst(self, nplc, filter_count, autozero):
+        # Free-running burst with the source off; returns the reading spread
+        apply_setting(self.test, nplc, filter_count, autozero)
+        acquisition = TraceAcquisition(self.test, np.zeros(self.burst_readings), trigger='IMM')
+        acquisition.configure()
+        started = time.perf_counter()
+        acquisition.arm()
+        expected = self.burst_readings * float(reading_time(nplc, filter_count, autozero))
+        acquisition.wait(expected + SWEEP_WAIT_MARGIN)
+        elapsed = time.perf_counter() - started
+        voltage = acquisition.fetch()['voltage']
+        return {'nplc': nplc, 'filter_count': filter_count, 'autozero': autozero,
+                'noise': float(np.std(voltage, ddof=1)), 'measured_time': elapsed / self.burst_readings}
+
+    def calibrate(self, voltage_range):
+        self.test.log_message(f"Calibrating 2182A noise on the {voltage_range} range...")
+        self.test.source.output_off()
+        self.test.set_2182a_voltage_range(voltage_range)
+        self.measurements = []
+        for autozero in self.autozero:
+            for filter_count in self.filter_counts:
+                for nplc in self.candidates:
+                    result = self.burst(nplc, filter_count, autozero)
+                    self.test.log_message(f"NPLC {nplc}, filter {filter_count}, autozero {autozero}: "
+                                          f"{result['noise']:.3g} V rms")
+                    self.measurements.append(result)
+        return self.measurements
+
+    def optimize(self, voltage_range, target_noise, path=NPLC_PROFILE_FILE):
+        setting = choose_setting(self.calibrate(voltage_range), target_noise)
+        if setting is None:
+            raise RuntimeError(f"No 2182A setting reaches {target_noise:g} V rms on the {voltage_range} range")
+        setting.update({'target_noise': target_noise, 'calibrated': time.time()})
+        profile = load_profile(path)
+        profile[voltage_range] = setting
+        save_profile(profile, path)
+        self.test.log_message(f"{voltage_range}: NPLC {setting['nplc']}, filter {setting['filter_count']}, "
+                              f"autozero {setting['autozero']} ({setting['reading_time'] * 1e3:.2f} ms/reading)")
+        return setting
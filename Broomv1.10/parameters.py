@@ -0,0 +1,269 @@
+# parameters.py
+#
+# Parameter schema engine shared by the sweep front ends. A schema is a dict of
+# Parameter limits plus cross-field rules; validation runs column-wise in NumPy
+# so a single GUI submission and a scan grid of thousands of parameter sets go
+# through exactly the same checks, before any instrument time is spent.
+
+import numpy as np
+from config import *
+from trigger_timing import min_interval
+
+
+class ParameterError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("Invalid parameters: " + "; ".join(errors))
+
+
+class Parameter:
+    def __init__(self, kind=float, minimum=None, maximum=None, choices=None, description='', normalize=None):
+        self.kind = kind
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = choices
+        self.description = description
+        self.normalize = normalize  # applied to text values before checks, e.g. str.capitalize
+
+    def column(self, values):
+        # Returns the typed column and a mask of entries that are not numbers
+        if self.choices is not None or self.kind in (str, bool):
+            if self.normalize is not None:
+                values = [self.normalize(v) if isinstance(v, str) else v for v in values]
+            return np.asarray(values, dtype=object), np.zeros(len(values), dtype=bool)
+        try:
+            return np.asarray(values, dtype=float), np.zeros(len(values), dtype=bool)
+        except (TypeError, ValueError):
+            # Slow path, only taken when the column holds junk
+            column = np.array([to_float(v) for v in values])
+            return column, np.isnan(column) & ~np.array([is_nan(v) for v in values])
+
+    def invalid(self, column):
+        # Returns a boolean mask of rows that violate this parameter
+        if self.choices is not None:
+            return ~np.isin(column, self.choices)
+        if self.kind in (str, bool):
+            return np.zeros(column.shape, dtype=bool)
+        bad = ~np.isfinite(column)
+        if self.kind is int:
+            bad |= column != np.round(column)
+        if self.minimum is not None:
+            bad |= column < self.minimum
+        if self.maximum is not None:
+            bad |= column > self.maximum
+        return bad
+
+    def message(self, name):
+        if self.choices is not None:
+            return f"{name} must be one of {list(self.choices)}"
+        return f"{name} must be in range [{self.minimum}, {self.maximum}]"
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def is_nan(value):
+    return isinstance(value, float) and np.isnan(value)
+
+
+def as_numbers(column):
+    # Choice columns are object arrays; rules that do arithmetic on them need floats
+    return np.array([to_float(v) for v in column])
+
+
+class Rule:
+    def __init__(self, check, message):
+        self.check = check  # columns -> boolean mask of invalid rows
+        self.message = message
+
+
+def derive_sweep_delay(nplc, filter_count=1, line_frequency=POWER_LINE_FREQUENCY):
+    # Shortest source delay that still lets the 2182A finish its (filtered)
+    # reading before the next step: one integration per filter sample
+    integration_time = np.asarray(nplc, dtype=float) / line_frequency
+    return integration_time * np.maximum(filter_count, 1) + MEASUREMENT_SETTLE_TIME
+
+
+MAX_CURRENT = 0.105  # 6221 output range, A
+
+PULSED_SWEEP_SCHEMA = {
+    'start': Parameter(float, -MAX_CURRENT, MAX_CURRENT, description='Start pulse level (A)'),
+    'stop': Parameter(float, -MAX_CURRENT, MAX_CURRENT, description='Stop pulse level (A)'),
+    'num_pulses': Parameter(int, 2, 65535, description='Sweep points'),
+    'sweep_type': Parameter(str, choices=['Linear', 'Logarithmic'], normalize=str.capitalize),
+    'voltage_range': Parameter(str, choices=VOLTAGE_RANGES),
+    'pulse_width': Parameter(float, 50e-6, 12e-3, description='Pulse width (s)'),
+    'pulse_delay': Parameter(float, 16e-6, 11.966e-3, description='Source delay (s)'),
+    'pulse_interval': Parameter(float, 1e-3, 999999, description='Pulse interval (s)'),
+    'voltage_compliance': Parameter(float, 0.1, 105, description='Voltage compliance (V)'),
+    'pulse_off_level': Parameter(float, -MAX_CURRENT, MAX_CURRENT, description='Pulse off level (A)'),
+    'num_off_measurements': Parameter(int, choices=[1, 2]),
+    'enable_compliance_abort': Parameter(bool),
+}
+
+PULSED_SWEEP_RULES = [
+    Rule(lambda c: c['start'] == c['stop'], "start and stop levels cannot be the same"),
+    Rule(lambda c: c['pulse_delay'] + c['pulse_width'] >= c['pulse_interval'],
+         "pulse_delay + pulse_width must be shorter than pulse_interval"),
+    # The 2182A runs at DEFAULT_NPLC and converts the high and every low of a pulse
+    Rule(lambda c: c['pulse_interval'] < min_interval(DEFAULT_NPLC, 1, c['pulse_width'], c['pulse_delay'],
+                                                      1 + as_numbers(c['num_off_measurements'])),
+         "pulse_interval must cover pulse_delay, pulse_width and the 2182A readings of one pulse (min_interval)"),
+    Rule(lambda c: (c['sweep_type'] == 'Logarithmic') & (c['start'] * c['stop'] <= 0),
+         "logarithmic sweeps need non-zero start and stop levels of the same sign"),
+]
+
+DC_SWEEP_SCHEMA = {
+    'start': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'stop': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'num_points': Parameter(int, 2, MAX_2182A_READINGS),  # one 2182A reading per step
+    'delay': Parameter(float, 1e-3, 9999.999),
+    'voltage_compliance': Parameter(float, 0.1, 105),
+    'voltage_range': Parameter(str, choices=VOLTAGE_RANGES),
+    'nplc': Parameter(float, 0.01, 60 if POWER_LINE_FREQUENCY == 60 else 50),
+}
+
+DC_SWEEP_RULES = [
+    Rule(lambda c: c['start'] == c['stop'], "start and stop current cannot be the same"),
+    Rule(lambda c: c['delay'] < derive_sweep_delay(c['nplc']),
+         "delay must cover one 2182A reading (nplc / line frequency) plus the settling margin"),
+]
+
+DELTA_SCHEMA = {
+    'high_current': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'low_current': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'num_readings': Parameter(int, 1, 65536),
+    'filter_type': Parameter(int, choices=[0, 1, 2]),
+    'filter_count': Parameter(int, 1, 300),
+    'voltage_range': Parameter(float, choices=[0.01, 0.1, 1, 10, 100]),
+    'delay': Parameter(float, 1e-3, 9999.999),
+    'integration_NPLCs': Parameter(float, 0.01, 60 if POWER_LINE_FREQUENCY == 60 else 50),
+    'volt_compliance': Parameter(float, 0.1, 105),
+}
+
+DELTA_RULES = [
+    Rule(lambda c: c['high_current'] == c['low_current'], "high and low current cannot be the same"),
+    Rule(lambda c: (c['filter_type'] != 0) & (c['filter_count'] < 2),
+         "filter_count must be in range [2, 300] when a filter is enabled"),
+]
+
+DIFFERENTIAL_CONDUCTANCE_SCHEMA = {
+    'start_current': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'stop_current': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'step': Parameter(float, 1e-13, MAX_CURRENT),
+    'delta': Parameter(float, 0, MAX_CURRENT),
+    'filter_on': Parameter(bool),
+    'filter_count': Parameter(int, 1, 300),
+    'voltage_range': Parameter(float, choices=[0.01, 0.1, 1, 10, 100]),
+    'delay': Parameter(float, 1e-3, 9999.999),
+    'integration_NPLCs': Parameter(float, 0.01, 60 if POWER_LINE_FREQUENCY == 60 else 50),
+    'volt_compliance': Parameter(float, 0.1, 105),
+}
+
+DIFFERENTIAL_CONDUCTANCE_RULES = [
+    Rule(lambda c: c['start_current'] == c['stop_current'], "start and stop current cannot be the same"),
+    Rule(lambda c: (c['filter_on'] == True) & (c['filter_count'] < 2),
+         "filter_count must be in range [2, 300] when the filter is enabled"),
+]
+
+LOOP_SHAPE_LENGTH = {'linear': 1, 'loop': 2, 'loop_bidir': 4}  # list length in multiples of points
+
+LOOP_SWEEP_SCHEMA = {
+    'start': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'stop': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'points': Parameter(int, 2, MAX_2182A_READINGS),
+    'num_loops': Parameter(int, 1, 100000),
+    'shape': Parameter(str, choices=list(LOOP_SHAPE_LENGTH)),
+    'delay': Parameter(float, 1e-3, 9999.999),
+    'voltage_compliance': Parameter(float, 0.1, 105),
+    'voltage_range': Parameter(str, choices=VOLTAGE_RANGES),
+    'nplc': Parameter(float, 0.01, 60 if POWER_LINE_FREQUENCY == 60 else 50),
+}
+
+LOOP_SWEEP_RULES = [
+    Rule(lambda c: (c['shape'] != 'loop_bidir') & (c['start'] == c['stop']),
+         "start and stop current cannot be the same"),
+    Rule(lambda c: (c['shape'] == 'loop_bidir') & (c['stop'] == 0), "stop current cannot be zero"),
+    Rule(lambda c: c['delay'] < derive_sweep_delay(c['nplc']),
+         "delay must cover one 2182A reading (nplc / line frequency) plus the settling margin"),
+    Rule(lambda c: np.array([LOOP_SHAPE_LENGTH.get(shape, 1) for shape in c['shape']]) * c['points']
+         > MAX_2182A_READINGS, f"one loop must fit the 2182A buffer ({MAX_2182A_READINGS} readings)"),
+]
+
+
+ADAPTIVE_SWEEP_SCHEMA = {
+    'start': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'stop': Parameter(float, -MAX_CURRENT, MAX_CURRENT),
+    'coarse_points': Parameter(int, 3, MAX_2182A_READINGS),
+    'tolerance': Parameter(float, 1e-9, 100),
+    'max_points': Parameter(int, 3, MAX_2182A_READINGS),
+    'delay': Parameter(float, 1e-3, 9999.999),
+    'voltage_compliance': Parameter(float, 0.1, 105),
+    'voltage_range': Parameter(str, choices=VOLTAGE_RANGES),
+    'nplc': Parameter(float, 0.01, 60 if POWER_LINE_FREQUENCY == 60 else 50),
+}
+
+ADAPTIVE_SWEEP_RULES = [
+    Rule(lambda c: c['start'] == c['stop'], "start and stop current cannot be the same"),
+    Rule(lambda c: c['coarse_points'] > c['max_points'], "coarse_points cannot exceed max_points"),
+    Rule(lambda c: c['delay'] < derive_sweep_delay(c['nplc']),
+         "delay must cover one 2182A reading (nplc / line frequency) plus the settling margin"),
+]
+
+
+def as_columns(parameter_sets):
+    # Accepts one dict, a list of dicts, or a dict of columns (scalars broadcast)
+    if not isinstance(parameter_sets, dict):
+        keys = parameter_sets[0].keys()
+        return {k: np.array([p[k] for p in parameter_sets], dtype=object) for k in keys}
+    columns = {k: np.atleast_1d(np.asarray(v, dtype=object)) for k, v in parameter_sets.items()}
+    rows = max(len(v) for v in columns.values())
+    return {k: np.broadcast_to(v, (rows,)) for k, v in columns.items()}
+
+
+def is_single(parameters):
+    return isinstance(parameters, dict) and all(np.ndim(v) == 0 for v in parameters.values())
+
+
+def validate_grid(parameter_sets, schema=PULSED_SWEEP_SCHEMA, rules=PULSED_SWEEP_RULES):
+    """Validate many parameter sets at once.
+
+    Returns (valid, errors) where valid is a boolean mask over the rows and
+    errors maps row index to the list of messages for that row.
+    """
+    raw = as_columns(parameter_sets)
+    missing = [name for name in schema if name not in raw]
+    if missing:
+        raise ParameterError([f"missing parameter: {name}" for name in missing])
+    rows = len(next(iter(raw.values())))
+    columns = {}
+    failures = []
+    for name, parameter in schema.items():
+        columns[name], not_number = parameter.column(raw[name])
+        if not_number.any():
+            failures.append((not_number, f"{name} must be a number"))
+        failures.append((parameter.invalid(columns[name]) & ~not_number, parameter.message(name)))
+    for rule in rules:
+        with np.errstate(invalid='ignore'):
+            failures.append((np.asarray(rule.check(columns), dtype=bool), rule.message))
+
+    valid = np.ones(rows, dtype=bool)
+    errors = {}
+    for mask, message in failures:
+        mask = np.broadcast_to(mask, (rows,))
+        valid &= ~mask
+        for row in np.flatnonzero(mask):
+            errors.setdefault(int(row), []).append(message)
+    return valid, errors
+
+
+def validate(parameters, schema=PULSED_SWEEP_SCHEMA, rules=PULSED_SWEEP_RULES):
+    valid, errors = validate_grid(parameters, schema, rules)
+    if not valid[0]:
+        raise ParameterError(errors[0])
+    return parameters
+
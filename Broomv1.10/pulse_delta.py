@@ -0,0 +1,107 @@
+# pulse_delta.py
+#
+# Pulse-delta reduction of raw 6221/2182A pulse readings. With SOUR:PDEL:LME
+# set, every pulse produces one high reading and num_low low readings; the
+# readings are placed by reading number (so gaps stay gaps), each high is
+# paired with the lows right before and after it, and the pulse-delta voltage
+# high - mean(adjacent lows) cancels thermal EMFs and their linear drift.
+# Deltas are then grouped into steps of pulses_per_step pulses, with the
+# reading noise propagated into each delta and the spread reported per step.
+
+import numpy as np
+
+
+def place_readings(values, reading_numbers):
+    # Array indexed by reading number, nan where a reading is missing
+    reading_numbers = np.asarray(reading_numbers, dtype=int)
+    reading_numbers = reading_numbers - reading_numbers.min()
+    placed = np.full(reading_numbers.max() + 1, np.nan)
+    placed[reading_numbers] = values
+    return placed
+
+
+def deinterleave(readings, reading_numbers=None, num_low=2, high_position=0):
+    """Split raw readings into highs and lows by reading number.
+
+    Each pulse cycle is 1 + num_low consecutive readings with the high at
+    high_position. Returns (placed, is_high) with placed indexed by reading
+    number; highs of missing readings are nan.
+    """
+    readings = np.asarray(readings, dtype=float)
+    if reading_numbers is None:
+        reading_numbers = np.arange(len(readings))
+    placed = place_readings(readings, reading_numbers)
+    is_high = np.arange(len(placed)) % (1 + num_low) == high_position
+    return placed, is_high
+
+
+def reading_noise(placed, is_high):
+    # RMS reading noise from successive lows; differencing removes slow drift
+    lows = placed[~is_high]
+    steps = np.diff(lows[~np.isnan(lows)])
+    return float(np.std(steps, ddof=1) / np.sqrt(2)) if len(steps) > 1 else np.nan
+
+
+def pulse_deltas(placed, is_high, noise=np.nan):
+    """High minus mean of the adjacent lows, with its propagated uncertainty.
+
+    The first and last pulse may have a low on one side only; a delta with no
+    low on either side is nan.
+    """
+    highs = np.flatnonzero(is_high)
+    before = np.where(highs > 0, highs - 1, highs)
+    after = np.where(highs < len(placed) - 1, highs + 1, highs)
+    neighbours = np.column_stack([np.where(before != highs, placed[before], np.nan),
+                                  np.where(after != highs, placed[after], np.nan)])
+    used = np.count_nonzero(~np.isnan(neighbours), axis=1)
+    low_mean = np.nansum(neighbours, axis=1) / np.maximum(used, 1)
+    delta = np.where(used > 0, placed[highs] - low_mean, np.nan)
+    # Var(H - mean of k lows) = noise^2 * (1 + 1/k)
+    sigma = noise * np.sqrt(1 + 1 / np.maximum(used, 1))
+    return delta, np.where(used > 0, sigma, np.nan)
+
+
+def step_statistics(delta, sigma, pulses_per_step=1):
+    # Per-step mean, spread and uncertainty of the pulse deltas (nan-aware);
+    # a trailing incomplete step is dropped
+    steps = len(delta) // pulses_per_step
+    delta = delta[:steps * pulses_per_step].reshape(steps, pulses_per_step)
+    sigma = sigma[:steps * pulses_per_step].reshape(steps, pulses_per_step)
+    valid = ~np.isnan(delta)
+    count = np.count_nonzero(valid, axis=1)
+    counted = np.maximum(count, 1)
+    mean = np.where(count > 0, np.nansum(delta, axis=1) / counted, np.nan)
+    spread = np.sqrt(np.nansum((delta - mean[:, None]) ** 2, axis=1) / np.maximum(count - 1, 1))
+    std = np.where(count > 1, spread, np.nan)
+    propagated = np.sqrt(np.nansum(np.where(valid, sigma, np.nan) ** 2, axis=1)) / counted
+    propagated = np.where(count > 0, propagated, np.nan)
+    # The observed scatter when there is one, otherwise the propagated noise
+    uncertainty = np.where(count > 1, std / np.sqrt(counted), propagated)
+    return {'voltage': mean, 'std': std, 'uncertainty': uncertainty, 'propagated': propagated,
+            'count': count}
+
+
+def reduce_pulse_delta(readings, reading_numbers=None, sources=None, num_low=2, pulses_per_step=1,
+                       high_position=0):
+    """Pulse-delta voltages per step from raw interleaved readings.
+
+    sources, if given, holds the programmed current of each reading; the
+    step current is the mean over its high readings. Returns per-step
+    columns (voltage, std, uncertainty, propagated, count, current) and the
+    estimated reading noise.
+    """
+    if num_low < 1:
+        raise ValueError("Pulse-delta reduction needs at least one low measurement per pulse")
+    placed, is_high = deinterleave(readings, reading_numbers, num_low, high_position)
+    noise = reading_noise(placed, is_high)
+    delta, sigma = pulse_deltas(placed, is_high, noise)
+    columns = step_statistics(delta, sigma, pulses_per_step)
+    if sources is not None:
+        if reading_numbers is None:
+            reading_numbers = np.arange(len(readings))
+        currents = place_readings(np.asarray(sources, dtype=float), reading_numbers)[is_high]
+        steps = len(columns['voltage'])
+        currents = currents[:steps * pulses_per_step].reshape(steps, pulses_per_step)
+        count = np.count_nonzero(~np.isnan(currents), axis=1)
+        columns['current'] = np.where(count > 0, np.nansum(currents, axis=1) / np.maximum(count, 1), np.nan)
+    return columns, noise
@@ -0,0 +1,102 @@
+# range_planner.py
+#
+# Fixed 2182A range selection ahead of a sweep. The voltage at each planned
+# current is predicted from the previous sweep (interpolated inside the
+# measured span, extrapolated with the fitted resistance outside it) or, with
+# no history, from one probe reading at the largest current. The sweep then
+# runs on the tightest range that holds the prediction with headroom, or is
+# split into contiguous segments that each get their own range. Autoranging
+# settles on every reading; a planned range costs one command per segment.
+
+import numpy as np
+from config import *
+
+
+def fit_resistance(currents, voltages):
+    # Least-squares V = R * I + V0; returns (R, V0)
+    currents = np.asarray(currents, dtype=float)
+    voltages = np.asarray(voltages, dtype=float)
+    valid = np.isfinite(currents) & np.isfinite(voltages)
+    if np.count_nonzero(valid) < 2 or np.ptp(currents[valid]) == 0:
+        return None
+    resistance, offset = np.polyfit(currents[valid], voltages[valid], 1)
+    return float(resistance), float(offset)
+
+
+def range_index(voltages, headroom=RANGE_HEADROOM):
+    # Index into VOLTAGE_RANGES of the tightest range holding each |V| * headroom
+    full_scale = np.array([VOLTAGE_RANGE_VALUES[name] for name in VOLTAGE_RANGES])
+    index = np.searchsorted(full_scale, np.abs(np.asarray(voltages, dtype=float)) * headroom)
+    return np.minimum(index, len(full_scale) - 1)
+
+
+def segments(indices, min_points=RANGE_MIN_SEGMENT):
+    """Contiguous (first, stop, range index) runs of one range.
+
+    Runs shorter than min_points are absorbed into the neighbour with the
+    larger range, so short excursions never put a reading over range.
+    """
+    indices = np.asarray(indices)
+    bounds = np.flatnonzero(np.diff(indices)) + 1
+    runs = [[first, stop, int(indices[first])]
+            for first, stop in zip(np.r_[0, bounds], np.r_[bounds, len(indices)])]
+    while len(runs) > 1:
+        short = [k for k, run in enumerate(runs) if run[1] - run[0] < min_points]
+        if not short:
+            break
+        k = min(short, key=lambda k: runs[k][1] - runs[k][0])
+        neighbours = [j for j in (k - 1, k + 1) if 0 <= j < len(runs)]
+        j = max(neighbours, key=lambda j: runs[j][2])
+        first, stop = min(runs[k][0], runs[j][0]), max(runs[k][1], runs[j][1])
+        runs[min(k, j)] = [first, stop, max(runs[k][2], runs[j][2])]
+        del runs[max(k, j)]
+        # Neighbours that now share a range become one segment
+        merged = [runs[0]]
+        for run in runs[1:]:
+            if run[2] == merged[-1][2]:
+                merged[-1][1] = run[1]
+            else:
+                merged.append(run)
+        runs = merged
+    return [(int(first), int(stop), VOLTAGE_RANGES[index]) for first, stop, index in runs]
+
+
+class RangePlanner:
+    def __init__(self, headroom=RANGE_HEADROOM, min_segment=RANGE_MIN_SEGMENT):
+        self.headroom = headroom
+        self.min_segment = min_segment
+        self.currents = None
+        self.voltages = None
+
+    def observe(self, currents, voltages):
+        # Keep the latest finished sweep as the model for the next one
+        currents = np.asarray(currents, dtype=float)
+        voltages = np.asarray(voltages, dtype=float)[:len(currents)]
+        if len(voltages) >= 2:
+            order = np.argsort(currents[:len(voltages)])
+            self.currents, self.voltages = currents[order], voltages[order]
+
+    @property
+    def has_history(self):
+        return self.currents is not None
+
+    def observe_probe(self, current, voltage):
+        # A single probe reading: ohmic through the origin
+        self.observe([0.0, current], [0.0, voltage])
+
+    def predict(self, currents):
+        currents = np.asarray(currents, dtype=float)
+        fit = fit_resistance(self.currents, self.voltages)
+        inside = np.interp(currents, self.currents, self.voltages)
+        if fit is None:
+            return inside
+        resistance, offset = fit
+        outside = (currents < self.currents[0]) | (currents > self.currents[-1])
+        return np.where(outside, resistance * currents + offset, inside)
+
+    def plan(self, currents, split=False):
+        # [(first, stop, range name)] covering currents; one segment unless split
+        indices = range_index(self.predict(currents), self.headroom)
+        if not split:
+            return [(0, len(indices), VOLTAGE_RANGES[int(np.max(indices))])]
+        return segments(indices, self.min_segment)
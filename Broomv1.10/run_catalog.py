@@ -0,0 +1,175 @@
+# run_catalog.py
+#
+# SQLite catalog of finished runs. Each row holds the compiled sweep spec,
+# the *IDN? of both instruments, a read-back snapshot of the instrument
+# settings, timing figures and the path of the stored data. Numeric and text
+# spec parameters are also written to an indexed name/value table, so
+# filtering thousands of runs on any parameter ("stop between 1 and 5 mA on
+# the 100 mV range") is an index lookup instead of opening data files.
+
+import json
+import numbers
+import os
+import sqlite3
+import time
+from config import *
+from timing import anchored
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    elapsed REAL,
+    mode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    points INTEGER,
+    data_path TEXT,
+    idn_6221 TEXT,
+    idn_2182a TEXT,
+    spec TEXT NOT NULL,
+    settings TEXT,
+    timing TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_mode_started ON runs (mode, started);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE TABLE IF NOT EXISTS run_params (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    text TEXT,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS run_params_value ON run_params (name, value);
+CREATE INDEX IF NOT EXISTS run_params_text ON run_params (name, text);
+"""
+
+
+def flatten(spec, prefix=''):
+    # Nested specs ({"stop": {"voltage": 0.05}}) become "stop.voltage"
+    for name, value in spec.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{name}.")
+        else:
+            yield prefix + name, value
+
+
+def plain(value):
+    # NumPy scalars and arrays (scan design points) become JSON numbers and lists
+    return value.tolist() if hasattr(value, 'tolist') else str(value)
+
+
+def param_row(run_id, name, value):
+    # numbers.Real also covers NumPy integer and float scalars
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        return run_id, name, None, value if isinstance(value, str) else json.dumps(value, default=plain)
+    return run_id, name, float(value), None
+
+
+def settings_snapshot(test):
+    # Read-back of the settings SafeState tracks, both instruments
+    from safe_state import SNAPSHOT_2182A, SNAPSHOT_6221, SafeState
+    state = SafeState(test)
+    return {'6221': state.query_6221(SNAPSHOT_6221), '2182A': state.query_2182a(SNAPSHOT_2182A)}
+
+
+class RunCatalog:
+    def __init__(self, path=RUN_CATALOG_FILE):
+        # ':memory:' is SQLite's in-memory database, not a file
+        self.path = path if path == ':memory:' else anchored(path)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def record(self, mode, spec, status='complete', started=None, elapsed=None, points=None, data_path=None,
+               identity=None, settings=None, timing=None):
+        identity = identity or {}
+        with self.db:
+            cursor = self.db.execute(
+                'INSERT INTO runs (started, elapsed, mode, status, points, data_path, idn_6221, idn_2182a, '
+                'spec, settings, timing) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (started if started is not None else time.time(), elapsed, mode, status, points,
+                 os.path.abspath(data_path) if data_path else None, identity.get('6221'), identity.get('2182A'),
+                 json.dumps(spec, default=plain), json.dumps(settings, default=plain) if settings else None,
+                 json.dumps(timing, default=plain) if timing else None))
+            run_id = cursor.lastrowid
+            self.db.executemany('INSERT INTO run_params (run_id, name, value, text) VALUES (?, ?, ?, ?)',
+                                [param_row(run_id, name, value) for name, value in flatten(spec)])
+        return run_id
+
+    def record_test(self, test, mode, spec, **fields):
+        # Pulls identity and a settings snapshot from a connected PulsedIVTest
+        try:
+            identity = test.instrument_identity()
+            settings = settings_snapshot(test)
+        except Exception as e:
+            test.log_message(f"Catalog snapshot failed: {str(e)}")
+            identity, settings = None, None
+        return self.record(mode, spec, identity=identity, settings=settings, **fields)
+
+    def find(self, mode=None, status=None, since=None, until=None, limit=None, **params):
+        """Runs matching every filter, newest first.
+
+        params filter on spec parameters: a value matches exactly, a
+        (low, high) pair matches a closed numeric range (either end None).
+        """
+        where, args = [], []
+        for column, operator, value in (('mode', '=', mode), ('status', '=', status),
+                                        ('started', '>=', since), ('started', '<=', until)):
+            if value is not None:
+                where.append(f'runs.{column} {operator} ?')
+                args.append(value)
+        for name, value in params.items():
+            clause = ['p.run_id = runs.id', 'p.name = ?']
+            args_for = [name]
+            if isinstance(value, (tuple, list)):
+                low, high = value
+                if low is not None:
+                    clause.append('p.value >= ?')
+                    args_for.append(low)
+                if high is not None:
+                    clause.append('p.value <= ?')
+                    args_for.append(high)
+            else:
+                clause.append('p.text = ?' if isinstance(value, str) else 'p.value = ?')
+                args_for.append(value)
+            where.append(f"EXISTS (SELECT 1 FROM run_params p WHERE {' AND '.join(clause)})")
+            args.extend(args_for)
+        query = 'SELECT * FROM runs'
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY started DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            args.append(limit)
+        return [self.as_dict(row) for row in self.db.execute(query, args)]
+
+    def get(self, run_id):
+        row = self.db.execute('SELECT * FROM runs WHERE id = ?', (run_id,)).fetchone()
+        return self.as_dict(row) if row else None
+
+    def compare(self, run_ids):
+        # Spec parameters that differ between the given runs: {name: [value per run]}
+        specs = [dict(flatten(self.get(run_id)['spec'])) for run_id in run_ids]
+        names = sorted(set().union(*specs))
+        return {name: [spec.get(name) for spec in specs] for name in names
+                if len({json.dumps(spec.get(name)) for spec in specs}) > 1}
+
+    @staticmethod
+    def as_dict(row):
+        run = dict(row)
+        for column in ('spec', 'settings', 'timing'):
+            if run[column] is not None:
+                run[column] = json.loads(run[column])
+        return run
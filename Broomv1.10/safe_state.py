@@ -0,0 +1,128 @@
+# safe_state.py
+#
+# Snapshot/restore of the 6221 and 2182A configuration around speed modes.
+# On entry the settings listed below are read back in one compound query per
+# instrument, the fast settings are sent as one batched write, and on exit
+# (normal, exception or Ctrl-C) any sweep is aborted, the output switched off
+# and the snapshot written back, so the next run starts from a known state
+# without a full *RST. Without fast settings there is nothing to put back:
+# the snapshot is skipped and only the output is switched off.
+
+import time
+from config import *
+from visa_io import InstrumentIOError
+
+# Read back and restored, in this order (a fixed range before its AUTO flag)
+SNAPSHOT_6221 = [
+    ':SOUR:CURR:COMP',
+    ':SOUR:CURR:RANG',
+    ':SOUR:CURR:RANG:AUTO',
+    ':SOUR:CURR:FILT',
+    ':OUTP:ISH',
+    ':OUTP:LTE',
+]
+SNAPSHOT_2182A = [
+    ':SENS:VOLT:NPLC',
+    ':SENS:VOLT:RANG',
+    ':SENS:VOLT:RANG:AUTO',
+    ':SENS:VOLT:DIG',
+    ':SENS:VOLT:LPAS:STAT',
+    ':SENS:VOLT:DFIL:TCON',
+    ':SENS:VOLT:DFIL:COUN',
+    ':SENS:VOLT:DFIL:STAT',
+    ':SYST:AZER:STAT',
+    ':TRIG:DEL',
+    ':TRIG:DEL:AUTO',
+    ':DISP:ENAB',
+]
+
+# Equivalent of the old tryfast(): autozero, filters and display off
+FAST_2182A = {
+    ':SYST:AZER:STAT': 'OFF',
+    ':SENS:VOLT:LPAS:STAT': 'OFF',
+    ':SENS:VOLT:DFIL:STAT': 'OFF',
+    ':TRIG:DEL:AUTO': 'OFF',
+    ':TRIG:DEL': '0',
+    ':SENS:VOLT:DIG': '4',
+    ':DISP:ENAB': 'OFF',
+}
+
+
+def settings_commands(settings):
+    return [f'{header} {value}' for header, value in settings.items()]
+
+
+def parse_snapshot(headers, response, instrument):
+    # One value per header; a short or long reply would pair values with the
+    # wrong settings and restore those
+    values = [value.strip() for value in response.split(';')]
+    if len(values) != len(headers):
+        raise InstrumentIOError(f"{instrument} snapshot returned {len(values)} values for {len(headers)} settings")
+    return dict(zip(headers, values))
+
+
+class SafeState:
+    def __init__(self, test, fast_2182a=None, fast_6221=None):
+        self.test = test
+        self.fast_2182a = fast_2182a or {}
+        self.fast_6221 = fast_6221 or {}
+        self.saved_6221 = None
+        self.saved_2182a = None
+
+    def write_6221(self, commands):
+        self.test.source.write_batch(commands)
+
+    def write_2182a(self, commands):
+        self.test.meter.write_batch(commands)
+
+    @property
+    def active(self):
+        return bool(self.fast_6221 or self.fast_2182a)
+
+    def query_6221(self, headers):
+        return parse_snapshot(headers, self.test.robust_query(';'.join(f'{header}?' for header in headers)), '6221')
+
+    def query_2182a(self, headers):
+        return parse_snapshot(headers, self.test.query_2182A(';'.join(f'{header}?' for header in headers)), '2182A')
+
+    def snapshot(self):
+        self.saved_6221 = self.query_6221(SNAPSHOT_6221)
+        self.saved_2182a = self.query_2182a(SNAPSHOT_2182A)
+        return self.saved_6221, self.saved_2182a
+
+    def apply(self):
+        if self.fast_6221:
+            self.write_6221(settings_commands(self.fast_6221))
+        if self.fast_2182a:
+            self.write_2182a(settings_commands(self.fast_2182a))
+        time.sleep(SETUP_DELAY)
+
+    def make_safe(self):
+        self.test.source.output_off()
+
+    def restore(self):
+        self.make_safe()
+        if not (self.saved_6221 or self.saved_2182a):
+            return
+        if self.saved_6221:
+            self.write_6221(settings_commands(self.saved_6221))
+        if self.saved_2182a:
+            self.write_2182a(settings_commands(self.saved_2182a))
+        time.sleep(SETUP_DELAY)
+        self.test.log_message("Instrument state restored.")
+
+    def __enter__(self):
+        if self.active:
+            self.snapshot()
+            self.apply()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.restore()
+        except Exception as e:
+            if exc_type is None:
+                raise
+            # Do not hide the error that got us here
+            self.test.log_message(f"Could not restore instrument state: {str(e)}")
+        return False
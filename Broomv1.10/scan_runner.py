@@ -0,0 +1,192 @@
+# scan_runner.py
+#
+# Multidimensional parameter scans on top of PulsedIVTest.run_pulsed_sweep.
+# The design (grid or random) is validated up front, then ordered so that the
+# parameters that are slow to change on the instruments vary least often and
+# neighbouring points differ only in fast parameters. Only the first point
+# pays a full reset; after that the warm setup path resends just the settings
+# that changed. Every point is appended to one indexed CSV dataset and a
+# progress file, so an interrupted scan resumes where it stopped. Raw readings
+# also go to a write-ahead journal as they are read; on resume, points the
+# journal saw finish are recovered from it even if the CSV or progress file
+# missed them.
+
+import csv
+import datetime
+import itertools
+import json
+import os
+import numpy as np
+from config import *
+from parameters import ParameterError, validate_grid
+from journal import AcquisitionJournal, replay
+from timing import SweepScheduler
+
+
+def grid_design(**axes):
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def random_design(num_points, seed=None, log_axes=(), **ranges):
+    # ranges: name=(low, high); log_axes are sampled uniformly in log space
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, (low, high) in ranges.items():
+        if name in log_axes:
+            columns[name] = np.exp(rng.uniform(np.log(low), np.log(high), num_points))
+        else:
+            columns[name] = rng.uniform(low, high, num_points)
+    return [{name: float(columns[name][i]) for name in ranges} for i in range(num_points)]
+
+
+def reconfiguration_order(design, cost=SCAN_PARAMETER_COST):
+    # Sort with the most expensive parameter as the outermost key. Within each
+    # block the next key runs alternately up and down (serpentine) so the
+    # boundary between blocks does not jump across the whole fast axis.
+    names = [name for name in cost if name in design[0]]
+    names += [name for name in design[0] if name not in names]
+
+    def serpentine(points, depth):
+        if depth == len(names) or len(points) <= 1:
+            return points
+        name = names[depth]
+        ordered = []
+        for i, (value, group) in enumerate(itertools.groupby(
+                sorted(points, key=lambda p: p[name]), key=lambda p: p[name])):
+            block = serpentine(list(group), depth + 1)
+            ordered.extend(block if i % 2 == 0 else block[::-1])
+        return ordered
+
+    return serpentine(list(design), 0)
+
+
+class ScanRunner:
+    def __init__(self, test, base_parameters, design, path=None, order=True, catalog=None):
+        self.test = test
+        self.catalog = catalog  # RunCatalog receiving one row per finished point, if set
+        self.base = dict(base_parameters)
+        self.path = path or f"Scan_{datetime.datetime.now().strftime('%Y-%m-%d %H-%M-%S')}.csv"
+        self.progress_path = self.path + '.progress.json'
+        self.journal_path = self.path + '.journal.jsonl'
+        self.axes = list(design[0])
+        if os.path.exists(self.progress_path):
+            # Resume: the stored order and completed indices win over the new design
+            with open(self.progress_path, encoding="utf-8") as f:
+                progress = json.load(f)
+            self.points = progress['points']
+            self.completed = set(progress['completed'])
+            self.axes = progress['axes']
+        else:
+            self.points = reconfiguration_order(design) if order else list(design)
+            self.completed = set()
+        self.check_design()
+        self.recover()
+
+    def check_design(self):
+        sets = [dict(self.base, **point) for point in self.points]
+        valid, errors = validate_grid(sets)
+        if not valid.all():
+            raise ParameterError([f"point {i}: {', '.join(messages)}" for i, messages in errors.items()])
+
+    def written_points(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, newline='', encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            return {int(row[0]) for row in reader if row}
+
+    def recover(self):
+        # Points whose run ended in the journal count as done; their data is
+        # written from the journal if the crash came before the CSV write
+        runs = replay(self.journal_path)
+        written = None
+        for index, point in enumerate(self.points):
+            run = runs.get(f'point{index}')
+            if index in self.completed or run is None or run['status'] != 'complete':
+                continue
+            if written is None:
+                written = self.written_points()
+            if index not in written:
+                self.write_point(index, point, run['result']['voltage'], run['result']['current'])
+            self.completed.add(index)
+            self.test.log_message(f"Scan point {index} recovered from the journal.")
+        return runs
+
+    def save_progress(self):
+        temp = self.progress_path + '.tmp'
+        with open(temp, 'w', encoding="utf-8") as f:
+            json.dump({'axes': self.axes, 'points': self.points, 'completed': sorted(self.completed)}, f)
+        os.replace(temp, self.progress_path)
+
+    def write_point(self, index, point, voltage, current):
+        new_file = not os.path.exists(self.path)
+        with open(self.path, 'a', newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(['Point'] + self.axes + ['Reading', 'Voltage (V)', 'Current (A)'])
+            values = [point[name] for name in self.axes]
+            for reading, (v, i) in enumerate(zip(voltage, current)):
+                writer.writerow([index] + values + [reading, v, i])
+
+    def schedule(self, benches=None):
+        # The points still to run, planned by the timing model; one bench
+        # (this test's instrument) unless several are given
+        scheduler = SweepScheduler(benches or [self.test.source.address], self.test.timing)
+        reset = True
+        for index, point in enumerate(self.points):
+            if index not in self.completed:
+                scheduler.submit(index, dict(self.base, **point, reset=reset))
+                reset = False
+        return scheduler
+
+    def run(self):
+        self.save_progress()
+        remaining = len(self.points) - len(self.completed)
+        self.test.log_message(f"Scan of {remaining} points, estimated {self.schedule().makespan():.1f} seconds.")
+        reset = True
+        journal = AcquisitionJournal(self.journal_path)
+        outer, self.test.journal = self.test.journal, journal
+        try:
+            for index, point in enumerate(self.points):
+                if index in self.completed:
+                    continue
+                self.test.log_message(f"Scan point {index + 1}/{len(self.points)}: {point}")
+                journal.begin('pulsed', dict(self.base, **point), run=f'point{index}')
+                voltage, current = self.test.run_pulsed_sweep(**dict(self.base, **point), reset=reset)
+                if voltage is None:
+                    # Leave the point open so a resume retries it, and start cold next time
+                    journal.end('failed')
+                    self.test.log_message(f"Scan point {index} failed; continuing.")
+                    reset = True
+                    continue
+                reset = False
+                # Journal first: a crash before the CSV write is recovered from it
+                journal.end('complete', {'voltage': voltage, 'current': current})
+                self.write_point(index, point, voltage, current)
+                self.completed.add(index)
+                self.save_progress()
+                if self.catalog is not None:
+                    self.catalog.record_test(self.test, 'pulsed', dict(self.base, **point, scan_point=index),
+                                             points=len(voltage), data_path=self.path,
+                                             timing={'phases': self.test.last_phases})
+        finally:
+            self.test.journal = outer
+            journal.close()
+        return len(self.completed) == len(self.points)
+
+    def load(self):
+        # Returns the dataset as a dict of NumPy columns
+        with open(self.path, newline='', encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = [row for row in reader]
+        columns = {}
+        for j, name in enumerate(header):
+            values = [row[j] for row in rows]
+            try:
+                columns[name] = np.array(values, dtype=float)
+            except ValueError:
+                columns[name] = np.array(values, dtype=object)
+        return columns
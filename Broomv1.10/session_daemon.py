@@ -0,0 +1,213 @@
+# session_daemon.py
+#
+# Long-lived local daemon that owns the VISA session to the 6221/2182A stack.
+# The instruments are connected, identified and reset once when the daemon
+# starts; scripts, notebooks and the GUI then submit sweeps over a local socket
+# and skip the connect/*IDN?/*RST cycle on every run.
+#
+# Protocol: one JSON object per line in each direction.
+#   request:  {"action": "run_pulsed_sweep", "params": {...}}
+#   response: {"ok": true, "result": ...} or {"ok": false, "error": "..."}
+
+import json
+import socket
+import socketserver
+import threading
+import time
+from config import *
+
+
+class SessionDaemon:
+    def __init__(self, host=DAEMON_HOST, port=DAEMON_PORT):
+        self.host = host
+        self.port = port
+        # Imported here so clients (SessionClient, broom status) stay light
+        from sweep_functions import PulsedIVTest
+        from broom_logging import get_logger
+        self.test = PulsedIVTest()
+        self.log = get_logger('daemon')
+        self.lock = threading.Lock()
+        self.server = None
+        self.warm = False
+        self.started = None
+        self.runs = 0
+
+    def log_message(self, message):
+        self.log.info(message)
+
+    def start(self):
+        if not self.test.connect():
+            raise ConnectionError(CONNECTION_ERROR)
+        self.started = time.time()
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    response = daemon.dispatch(line)
+                    self.wfile.write((json.dumps(response) + "\n").encode())
+                    self.wfile.flush()
+                    if response.get("shutdown"):
+                        threading.Thread(target=daemon.server.shutdown, daemon=True).start()
+                        return
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.log_message(f"Listening on {self.host}:{self.port}")
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self.server:
+            self.server.server_close()
+            self.server = None
+        if self.test.instrument:
+            self.test.disconnect()
+        self.warm = False
+
+    def dispatch(self, line):
+        try:
+            request = json.loads(line)
+            action = request.get("action")
+            params = request.get("params", {})
+            handler = getattr(self, f"do_{action}", None)
+            if handler is None:
+                return {"ok": False, "error": f"Unknown action: {action}"}
+            if action in ("ping", "abort"):
+                # Must get through while a sweep holds the lock
+                result = handler(**params)
+            else:
+                # Only one client may talk to the instruments at a time
+                with self.lock:
+                    result = handler(**params)
+            response = {"ok": True, "result": result}
+            if action == "shutdown":
+                response["shutdown"] = True
+            return response
+        except Exception as e:
+            self.log_message(f"Request failed: {str(e)}")
+            return {"ok": False, "error": str(e)}
+
+    def do_ping(self):
+        return {"warm": self.warm, "uptime": time.time() - self.started, "runs": self.runs}
+
+    def do_idn(self):
+        return {"6221": self.test.query_6221(), "2182A": self.test.query_2182a()}
+
+    def do_reset(self, instrument=None):
+        # instrument: "6221", "2182A" or None for both; returns the ones reset
+        reset = []
+        if instrument in (None, "6221"):
+            self.test.reset_6221()
+            reset.append("6221")
+        if instrument in (None, "2182A"):
+            self.test.reset_2182a()
+            reset.append("2182A")
+        self.warm = False
+        return reset
+
+    def do_read_errors(self):
+        return self.test.read_errors()
+
+    def do_abort(self):
+        self.test.abort()
+        return None
+
+    def do_run_pulsed_sweep(self, **params):
+        # The first sweep pays the full reset; later ones reuse the configured
+        # trigger link and 2182A state.
+        params.setdefault("reset", not self.warm)
+        voltage, current = self.test.run_pulsed_sweep(**params)
+        if voltage is None:
+            self.warm = False
+            raise RuntimeError("Measurement failed or was aborted.")
+        self.warm = True
+        self.runs += 1
+        return {"voltage": voltage.tolist(), "current": current.tolist()}
+
+    def do_shutdown(self):
+        return None
+
+
+class SessionClient:
+    def __init__(self, host=DAEMON_HOST, port=DAEMON_PORT, timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def is_available(self):
+        try:
+            with socket.create_connection((self.host, self.port), timeout=DAEMON_CONNECT_TIMEOUT):
+                return True
+        except OSError:
+            return False
+
+    def open(self):
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), timeout=DAEMON_CONNECT_TIMEOUT)
+            self.sock.settimeout(self.timeout)
+            self.reader = self.sock.makefile('r', encoding='utf-8')
+        return self
+
+    def close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+            self.sock = None
+            self.reader = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, action, **params):
+        self.open()
+        self.sock.sendall((json.dumps({"action": action, "params": params}) + "\n").encode())
+        line = self.reader.readline()
+        if not line:
+            self.close()
+            raise ConnectionError("Session daemon closed the connection.")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def ping(self):
+        return self.submit("ping")
+
+    def run_pulsed_sweep(self, **params):
+        import numpy as np
+        result = self.submit("run_pulsed_sweep", **params)
+        return np.array(result["voltage"]), np.array(result["current"])
+
+    def shutdown(self):
+        return self.submit("shutdown")
+
+
+def main():
+    from broom_logging import setup_logging
+    logging_service = setup_logging(console=True)
+    daemon = SessionDaemon()
+    try:
+        daemon.start()
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        daemon.log_message("Interrupted, closing instrument session.")
+    finally:
+        logging_service.stop()
+
+
+if __name__ == "__main__":
+    main()
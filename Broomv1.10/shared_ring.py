@@ -0,0 +1,153 @@
+# shared_ring.py
+#
+# Ring buffer of readings in multiprocessing.shared_memory, for handing
+# acquisition data to the plot, the file writer and live analysis running in
+# other processes without pickling. There is one writer (the acquisition)
+# and any number of readers; each reader keeps its own cursor and gets NumPy
+# views straight into the shared block, so nothing is copied.
+#
+# Layout: a header of int64 counters followed by `capacity` records of
+# READING_DTYPE. The writer fills records first and only then advances the
+# published count, so a reader never sees a half-written record. A reader
+# that falls more than `capacity` records behind has lost the overwritten
+# ones; read() skips past them and counts them in `lost`.
+
+import multiprocessing
+import sys
+import numpy as np
+from multiprocessing import shared_memory
+from config import *
+
+READING_DTYPE = np.dtype([('voltage', 'f8'), ('current', 'f8'), ('timestamp', 'f8'), ('reading', 'i8')])
+HEADER = 4  # int64 slots: written count, capacity, closed flag, reserved
+WRITTEN, CAPACITY, CLOSED = 0, 1, 2
+created = set()  # blocks this process owns; their tracker registration must stay
+
+
+def attach_untracked(name):
+    # Before 3.13 attaching registers the block with the resource tracker,
+    # which unlinks it when an unrelated reader process exits. Children
+    # started by multiprocessing share the writer's tracker, and a reader in
+    # the writer's own process shares its registration; both are left alone.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    memory = shared_memory.SharedMemory(name=name)
+    if multiprocessing.parent_process() is None and memory._name not in created:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
+
+
+class SharedRing:
+    def __init__(self, name=None, capacity=RING_CAPACITY, create=True):
+        self.owner = create
+        if create:
+            size = HEADER * 8 + capacity * READING_DTYPE.itemsize
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            created.add(self.memory._name)
+        else:
+            self.memory = attach_untracked(name)
+        self.header = np.ndarray((HEADER,), dtype=np.int64, buffer=self.memory.buf)
+        if create:
+            self.header[:] = 0
+            self.header[CAPACITY] = capacity
+        self.capacity = int(self.header[CAPACITY])
+        self.records = np.ndarray((self.capacity,), dtype=READING_DTYPE, buffer=self.memory.buf, offset=HEADER * 8)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(name, create=False)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @property
+    def written(self):
+        return int(self.header[WRITTEN])
+
+    @property
+    def closed(self):
+        return bool(self.header[CLOSED])
+
+    def write(self, voltage, current=np.nan, timestamp=np.nan, reading=None):
+        # Appends readings (scalars broadcast); reading numbers default to the
+        # running count. Writer side only.
+        voltage = np.atleast_1d(np.asarray(voltage, dtype=float))
+        count = len(voltage)
+        start = self.written
+        if reading is None:
+            reading = np.arange(start, start + count)
+        columns = {'voltage': voltage, 'current': current, 'timestamp': timestamp, 'reading': reading}
+        # Only the newest capacity records can survive one write
+        skip = max(count - self.capacity, 0)
+        position = (start + skip) % self.capacity
+        first = min(count - skip, self.capacity - position)
+        for name, values in columns.items():
+            values = np.broadcast_to(values, (count,))[skip:]
+            self.records[name][position:position + first] = values[:first]
+            self.records[name][:len(values) - first] = values[first:]
+        # Publish after the data is in place
+        self.header[WRITTEN] = start + count
+        return count
+
+    def finish(self):
+        self.header[CLOSED] = 1
+
+    def close(self):
+        # Views into the block must go before it can be closed
+        self.header = self.records = None
+        self.memory.close()
+
+    def unlink(self):
+        if self.owner:
+            self.memory.unlink()
+            created.discard(self.memory._name)
+
+
+class RingReader:
+    def __init__(self, ring, start='oldest'):
+        # start: 'oldest' for everything still in the ring, 'latest' for new readings only
+        self.ring = ring
+        written = ring.written
+        self.cursor = written if start == 'latest' else max(written - ring.capacity, 0)
+        self.start = self.cursor  # first record of the last read
+        self.lost = 0
+
+    @property
+    def available(self):
+        return self.ring.written - self.cursor
+
+    def read(self, max_records=None):
+        """Views of the records since the last read: a list of one or two
+        arrays (two when the data wraps around the end of the ring).
+
+        Use them before the writer laps the ring; valid() tells whether it
+        has not yet done so.
+        """
+        written = self.ring.written
+        if written - self.cursor > self.ring.capacity:
+            self.lost += written - self.ring.capacity - self.cursor
+            self.cursor = written - self.ring.capacity
+        count = written - self.cursor
+        if max_records is not None:
+            count = min(count, max_records)
+        position = self.cursor % self.ring.capacity
+        first = min(count, self.ring.capacity - position)
+        views = [self.ring.records[position:position + first]]
+        if count > first:
+            views.append(self.ring.records[:count - first])
+        self.start, self.cursor = self.cursor, self.cursor + count
+        return [view for view in views if len(view)]
+
+    def valid(self):
+        # True while the records returned by the last read have not been overwritten
+        return self.ring.written - self.start <= self.ring.capacity
+
+    def read_copy(self, max_records=None):
+        # One contiguous copy, for consumers that keep the data
+        views = self.read(max_records)
+        data = np.concatenate(views) if views else np.empty(0, dtype=READING_DTYPE)
+        if not self.valid():
+            raise BufferError("Ring buffer overwritten while reading; reader is too slow")
+        return data
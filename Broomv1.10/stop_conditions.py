@@ -0,0 +1,76 @@
+# stop_conditions.py
+#
+# Stop conditions for streaming sweeps. Each chunk of readings is checked as
+# it arrives; the first condition that fires ends the sweep with
+# SOUR:SWE:ABOR, so a sweep stops at the transition or breakdown it was
+# looking for instead of running on to the programmed end.
+#
+# A condition's check gets all readings so far and the index where the new
+# chunk starts, and returns the index of the first reading that meets it, or
+# None. Conditions that need the instrument (compliance) query it themselves.
+
+import numpy as np
+from config import *
+
+
+class StopCondition:
+    def __init__(self, name, check, description=''):
+        self.name = name
+        self.check = check  # (currents, voltages, first_new) -> index or None
+        self.description = description
+
+
+def first_index(mask, offset=0):
+    hits = np.flatnonzero(mask)
+    return int(hits[0]) + offset if len(hits) else None
+
+
+def voltage_threshold(limit):
+    def check(currents, voltages, first_new):
+        return first_index(np.abs(voltages[first_new:]) >= limit, first_new)
+    return StopCondition('voltage', check, f"|V| >= {limit:g} V")
+
+
+def slope_jump(factor, min_points=SLOPE_BASELINE_POINTS):
+    # dV/dI more than factor times the median slope of the readings before
+    # this chunk; a baseline needs min_points readings first
+    def check(currents, voltages, first_new):
+        slopes = np.abs(np.diff(voltages) / np.where(np.diff(currents) == 0, np.nan, np.diff(currents)))
+        start = max(first_new, min_points)
+        if start >= len(voltages):
+            return None
+        baseline = np.nanmedian(slopes[:start - 1])
+        if not np.isfinite(baseline) or baseline == 0:
+            return None
+        # slopes[k] is reached at reading k + 1
+        return first_index(slopes[start - 1:] > factor * baseline, start)
+    return StopCondition('slope_jump', check, f"dV/dI > {factor:g} x baseline")
+
+
+def compliance(test):
+    # The 6221 latches compliance in its measurement event register; the
+    # readings themselves carry no flag, so the whole chunk is blamed
+    def check(currents, voltages, first_new):
+        if int(float(test.robust_query('STAT:MEAS:EVEN?'))) & COMPLIANCE_BIT:
+            return first_new
+        return None
+    return StopCondition('compliance', check, "6221 in compliance")
+
+
+def build_conditions(test, spec):
+    # {"voltage": 0.05, "slope_jump": 5, "compliance": true} -> conditions
+    conditions = []
+    if spec.get('voltage') is not None:
+        conditions.append(voltage_threshold(spec['voltage']))
+    if spec.get('slope_jump') is not None:
+        conditions.append(slope_jump(spec['slope_jump']))
+    if spec.get('compliance'):
+        conditions.append(compliance(test))
+    return conditions
+
+
+def first_stop(conditions, currents, voltages, first_new):
+    # Earliest reading at which any condition fires: (index, condition) or None
+    hits = [(index, condition) for condition in conditions
+            for index in [condition.check(currents, voltages, first_new)] if index is not None]
+    return min(hits, key=lambda hit: hit[0]) if hits else None
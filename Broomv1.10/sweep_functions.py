@@ -4,11 +4,34 @@ import pyvisa
 import time
 import numpy as np
 from config import *
+from visa_io import InstrumentIOError
+from drivers import K2182A, K6221
+from parameters import (ADAPTIVE_SWEEP_RULES, ADAPTIVE_SWEEP_SCHEMA, DC_SWEEP_RULES, DC_SWEEP_SCHEMA,
+                        DELTA_RULES, DELTA_SCHEMA, DIFFERENTIAL_CONDUCTANCE_RULES,
+                        DIFFERENTIAL_CONDUCTANCE_SCHEMA, LOOP_SWEEP_RULES, LOOP_SWEEP_SCHEMA, ParameterError,
+                        derive_sweep_delay, validate)
+from timing import RunTrace, TimingModel
+from list_sweep import ListSweepUploader, build_sweep_list
+from hysteresis import LoopAnalyzer
+from acquisition import TraceAcquisition
+from trigger_timing import analyze_timestamps, expected_interval, minimum_interval
+from nplc_optimizer import apply_setting, load_profile, reading_time
+from safe_state import FAST_2182A, SafeState
+from pulse_delta import deinterleave, reduce_pulse_delta
+from noise_analysis import NoiseAnalyzer
+from adaptive_sweep import AdaptivePlan
+from stop_conditions import first_stop
+from range_planner import RangePlanner
+from broom_logging import get_logger, logging_active
+
+log = get_logger('sweep')
 
 class PulsedIVTest:
     def __init__(self):
-        self.rm = pyvisa.ResourceManager()
-        self.instrument = None
+        self.source = K6221(log_message=lambda message: self.log_message(message))
+        self.meter = K2182A(self.source)
+        self.trace = RunTrace()
+        self.timing = TimingModel().calibrate(self.trace.load())
         self.start = 0
         self.stop = 0
         self.step = 0
@@ -22,25 +45,44 @@ class PulsedIVTest:
         self.voltage_compliance = 0
         self.pulse_off_level = 0
         self.pulse_count = 0
-
-    def connect(self):
+        self.applied = None
+        self.list_uploader = ListSweepUploader(self)  # skips re-uploading an unchanged SOUR:LIST
+        self.loop_settings = None  # configuration of the last loop sweep, while still valid
+        self.timing_report = None  # trigger timing of the last timestamped run
+        self.pulse_delta = None  # per-step pulse-delta statistics of the last pulsed sweep
+        self.noise_report = None  # Allan deviation / PSD of the last delta run
+        self.range_planner = RangePlanner()  # predicts 2182A ranges from the last DC-type sweep
+        self.journal = None  # AcquisitionJournal receiving raw chunks as they are read, if set
+        self.ring = None  # SharedRing publishing readings to other processes, if set
+        self.identity = None  # *IDN? of both instruments, cached per connection
+        self.last_phases = None  # measured phase durations of the last pulsed sweep
+        self.nplc_profile = load_profile()  # fastest 2182A setting per range, from nplc_optimizer
+
+    @property
+    def instrument(self):
+        # The raw VISA session, for commands the drivers have no wrapper for
+        return self.source.instrument
+
+    @property
+    def io(self):
+        return self.source.io
+
+    def connect(self, address=INSTRUMENT_ADDRESS):
         try:
-            self.instrument = self.rm.open_resource(INSTRUMENT_ADDRESS)
-            self.instrument.timeout = TIMEOUT
-            self.instrument.write_termination = '\n'
-            self.instrument.read_termination = '\n'
+            self.source.open(address)
             self.verify_instrument_identity()
             self.log_message(CONNECTION_SUCCESS)
             return True
-        except pyvisa.errors.VisaIOError as e:
+        except (pyvisa.errors.VisaIOError, InstrumentIOError) as e:
             self.log_message(f"{CONNECTION_ERROR} {str(e)}")
             return False
 
     def disconnect(self):
-        if self.instrument:
-            self.instrument.close()
-            self.instrument = None
-        self.rm.close()
+        self.source.close()
+        self.applied = None
+        self.loop_settings = None
+        self.list_uploader.invalidate()
+        self.identity = None
         self.log_message(DISCONNECTION_MESSAGE)
 
     def set_long_timeout(self):
@@ -54,63 +96,37 @@ class PulsedIVTest:
         if '6221' not in idn:
             raise Exception("Connected to wrong instrument or communication error")
 
-    def robust_query(self, query, retries=3, timeout=5):
-        for attempt in range(retries):
-            try:
-                self.instrument.timeout = timeout * 1000  # timeout in milliseconds
-                response = self.instrument.query(query).strip()
-                time.sleep(QUERY_DELAY)
-                if response:
-                    return response
-            except pyvisa.errors.VisaIOError as e:
-                self.log_message(f"Timeout occurred for query '{query}'. Retrying... (Attempt {attempt + 1})")
-                self.log_message(f"Error details: {str(e)}")
-            time.sleep(0.5)
-        raise Exception(f"Failed to get response for query: {query}")
-
-    def robust_query_ascii_values(self, query, retries=3, timeout=10):
-        for attempt in range(retries):
-            try:
-                self.instrument.timeout = timeout * 1000  # timeout in milliseconds
-                response = self.instrument.query_ascii_values(query)
-                time.sleep(QUERY_DELAY)
-                if response:
-                    return response
-            except pyvisa.errors.VisaIOError as e:
-                self.log_message(f"Timeout occurred for query_ascii_values '{query}'. Retrying... (Attempt {attempt + 1})")
-                self.log_message(f"Error details: {str(e)}")
-            time.sleep(0.5)
-        raise Exception(f"Failed to get response for query_ascii_values: {query}")
+    def instrument_identity(self):
+        if self.identity is None:
+            self.identity = {'6221': self.source.identify(), '2182A': self.meter.identify()}
+        return self.identity
+
+    def robust_query(self, query, operation='query'):
+        return self.source.query(query, operation)
+
+    def robust_query_ascii_values(self, query, operation='bulk'):
+        return self.source.query_values(query, operation)
 
     def clear_buffers(self):
-        self.instrument.write('*CLS')  # Clear status registers and error queue
-        self.instrument.read()  # Read and discard any lingering output
-        time.sleep(SETUP_DELAY)
+        self.source.clear()
 
     def clear_buffers_2182A(self):
-        self.send_command_to_2182A('*CLS')
-        self.query_2182A('*OPC?')
-        time.sleep(SETUP_DELAY)
+        self.meter.clear()
 
     def wait_for_operation_complete(self):
-        self.instrument.query('*OPC?')
-        time.sleep(QUERY_DELAY)
+        self.source.wait_complete()
 
     def wait_for_operation_complete_2182A(self):
-        self.query_2182A('*OPC?')
-        time.sleep(QUERY_DELAY)
+        self.meter.wait_complete()
 
     def reset_communication(self):
-        self.instrument.close()
-        time.sleep(1)
-        self.instrument = self.rm.open_resource(INSTRUMENT_ADDRESS)
-        self.instrument.timeout = TIMEOUT
+        self.source.reopen()
 
     def reset_6221(self):
-        self.instrument.write('*RST')
-        time.sleep(LONG_COMMAND_DELAY)
-        self.wait_for_operation_complete()
-        self.clear_buffers()
+        self.source.reset()
+        self.applied = None
+        self.loop_settings = None
+        self.list_uploader.invalidate()
         self.log_message("6221 has been reset.")
 
     def query_6221(self):
@@ -119,10 +135,9 @@ class PulsedIVTest:
         return response
 
     def reset_2182a(self):
-        self.send_command_to_2182A('*RST')
-        time.sleep(LONG_COMMAND_DELAY)
-        self.wait_for_operation_complete_2182A()
-        self.clear_buffers_2182A()
+        self.meter.reset()
+        self.applied = None
+        self.loop_settings = None
         self.log_message("2182A has been reset.")
 
     def query_2182a(self):
@@ -131,79 +146,84 @@ class PulsedIVTest:
         return response
 
     def set_linear_staircase(self):
-        self.instrument.write('SOUR:SWE:SPAC LIN')
-        time.sleep(SETUP_DELAY)
+        self.source.write('SOUR:SWE:SPAC LIN')
+        self.source.pace()
 
     def set_logarithmic_staircase(self):
-        self.instrument.write('SOUR:SWE:SPAC LOG')
-        time.sleep(SETUP_DELAY)
+        self.source.write('SOUR:SWE:SPAC LOG')
+        self.source.pace()
+
+    def set_list_sweep(self, currents, delays):
+        self.source.write('SOUR:SWE:SPAC LIST')
+        self.source.pace()
+        self.list_uploader.upload(currents, delays)
 
     def set_start_current(self, start_current):
-        self.instrument.write(f'SOUR:CURR:STAR {start_current}')
+        self.source.write(f'SOUR:CURR:STAR {start_current}')
         self.start = float(start_current)
-        time.sleep(SETUP_DELAY)
+        self.source.pace()
 
     def set_stop_current(self, stop_current):
-        self.instrument.write(f'SOUR:CURR:STOP {stop_current}')
+        self.source.write(f'SOUR:CURR:STOP {stop_current}')
         self.stop = float(stop_current)
-        time.sleep(SETUP_DELAY)
+        self.source.pace()
 
     def set_step(self, step):
-        self.instrument.write(f'SOUR:CURR:STEP {step}')
+        self.source.write(f'SOUR:CURR:STEP {step}')
         self.step = float(step)
-        time.sleep(SETUP_DELAY)
+        self.source.pace()
 
     def set_delay(self, delay):
-        self.instrument.write(f'SOUR:DEL {delay}')
+        self.source.write(f'SOUR:DEL {delay}')
         self.delay = float(delay)
-        time.sleep(SETUP_DELAY)
+        self.source.pace()
 
     def set_span(self):
-        self.instrument.write('SOUR:PDEL:RANG BEST')
-        time.sleep(SETUP_DELAY)
+        self.source.write('SOUR:PDEL:RANG BEST')
+        self.source.pace()
 
     def set_current_compliance(self, compliance):
-        self.instrument.write(f'SOUR:CURR:COMP {compliance}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f'SOUR:CURR:COMP {compliance}')
+        self.source.pace()
 
     def set_pulse_width(self, width):
-        self.instrument.write(f'SOUR:PDEL:WIDT {width}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f'SOUR:PDEL:WIDT {width}')
+        self.source.pace()
 
     def set_pulse_delay(self, delay):
-        self.instrument.write(f'SOUR:PDEL:SDEL {delay}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f'SOUR:PDEL:SDEL {delay}')
+        self.source.pace()
 
     def set_pulse_interval(self, interval):
-        self.instrument.write(f'SOUR:PDEL:INT {interval}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f'SOUR:PDEL:INT {interval}')
+        self.source.pace()
 
     def set_sweep_mode(self, state='ON'):
-        self.instrument.write(f'SOUR:PDEL:SWE {state}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f'SOUR:PDEL:SWE {state}')
+        self.source.pace()
 
     def set_pulse_count(self, count):
-        self.instrument.write(f'SOUR:PDEL:COUN {count}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f'SOUR:PDEL:COUN {count}')
+        self.source.pace()
 
     def set_buffer_size(self, size=DEFAULT_BUFFER_SIZE):
-        self.instrument.write(f'TRAC:POIN {size}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f'TRAC:POIN {size}')
+        self.source.pace()
 
     def clean_buffer(self):
-        self.instrument.write('TRAC:CLE')
-        time.sleep(SETUP_DELAY)
+        self.source.write('TRAC:CLE')
+        self.source.pace()
 
     def set_pulse_low_level(self, level):
-        self.instrument.write(f'SOUR:PDEL:LOW {level}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f'SOUR:PDEL:LOW {level}')
+        self.source.pace()
 
     def set_low_measure_enable(self, count):
-        self.instrument.write(f'SOUR:PDEL:LME {count}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f'SOUR:PDEL:LME {count}')
+        self.source.pace()
 
     def set_2182a_voltage_range(self, voltage_range):
-        voltage_range_values = {'100 mV': 0.1, '1 V': 1, '10 V': 10, '100 V': 100, '10 mA': 'CURR:10mA'}
+        voltage_range_values = dict(VOLTAGE_RANGE_VALUES, **{'10 mA': 'CURR:10mA'})
         numerical_voltage_range = voltage_range_values[voltage_range]
         if voltage_range == '10 mA':
             self.send_command_to_2182A(f':SENS:FUNC "CURR"')
@@ -215,8 +235,9 @@ class PulsedIVTest:
         self.log_message(f"2182A range set to {voltage_range}")
 
     def configure_2182a(self):
-        commands = [
-            '*RST',
+        self.meter.write('*RST')
+        self.meter.wait_complete()
+        self.meter.write_batch([
             ':SENS:FUNC "VOLT"',
             ':SENS:CHAN 1',
             ':SENS:VOLT:NPLC 1',
@@ -224,65 +245,101 @@ class PulsedIVTest:
             ':TRIG:DEL 0',
             ':TRIG:COUN 1',
             ':SYST:AZER:STAT OFF',
-            ':SYST:LSYN:STAT OFF'
-        ]
-        for command in commands:
-            self.send_command_to_2182A(command)
-            time.sleep(SETUP_DELAY)
+            ':SYST:LSYN:STAT OFF',
+        ])
         self.log_message("2182A configured.")
 
     def configure_trigger_link(self):
-        # Configure 6221
-        self.instrument.write(':TRIG:SOUR TLINK')
-        self.instrument.write(':TRIG:DIR SOURCE')
-        self.instrument.write(':TRIG:OUTP SOUR')
-        self.instrument.write(':TRIG:INPU SENS')
-        self.instrument.write(':TRIG:OLIN 1')
-        self.instrument.write(':TRIG:ILIN 1')
-
-        # Configure 2182A
-        self.send_command_to_2182A(':TRIG:SOUR TLINK')
-        self.send_command_to_2182A(':TRIG:ILIN 1')
-        time.sleep(SETUP_DELAY)
+        self.source.write_batch([':TRIG:SOUR TLINK', ':TRIG:DIR SOURCE', ':TRIG:OUTP SOUR', ':TRIG:INPU SENS',
+                                 ':TRIG:OLIN 1', ':TRIG:ILIN 1'])
+        self.meter.write_batch([':TRIG:SOUR TLINK', ':TRIG:ILIN 1'])
         self.log_message("Trigger link configured.")
 
     def set_compliance_abort(self, state):
-        self.instrument.write(f':SOUR:CURR:PROT:MODE {"LATE" if state else "RSCD"}')
-        time.sleep(SETUP_DELAY)
+        self.source.write(f':SOUR:CURR:PROT:MODE {"LATE" if state else "RSCD"}')
+        self.source.pace()
         self.log_message(f"Compliance abort set to {'LATE' if state else 'RSCD'}")
 
     def setup_pulsed_sweep(self, start, stop, num_pulses, sweep_type, voltage_range, 
                        pulse_width, pulse_delay, pulse_interval, voltage_compliance,
-                       pulse_off_level, num_off_measurements):
+                       pulse_off_level, num_off_measurements, reset=True):
         self.log_message("Setting up pulsed sweep...")
+        self.loop_settings = None
         try:
             self.set_long_timeout()
 
-            self.reset_6221()
-            self.reset_2182a()
-            self.configure_2182a()
-            self.configure_trigger_link()
-
-            self.set_2182a_voltage_range(voltage_range)
-            self.set_start_current(start)
-            self.set_stop_current(stop)
-            self.set_step((stop-start)/(num_pulses-1))
-            self.set_sweep_type(sweep_type)
-            self.set_pulse_width(pulse_width)
-            self.set_pulse_delay(pulse_delay)
-            self.set_pulse_interval(pulse_interval)
-            self.set_current_compliance(voltage_compliance)
-            self.set_span()
-            self.set_pulse_low_level(pulse_off_level)
-            self.set_low_measure_enable(num_off_measurements)
-            self.set_pulse_count(num_pulses)
-            self.set_sweep_mode('ON')
-            self.clean_buffer()
-            self.set_buffer_size()
+            if reset:
+                self.reset_6221()
+                self.reset_2182a()
+                self.configure_2182a()
+                self.configure_trigger_link()
+            else:
+                # Warm session: trigger link and 2182A are already configured
+                self.abort()
+
+            settings = {
+                'voltage_range': voltage_range,
+                'start': start,
+                'stop': stop,
+                'step': (stop-start)/(num_pulses-1),
+                'sweep_type': sweep_type,
+                'pulse_width': pulse_width,
+                'pulse_delay': pulse_delay,
+                'pulse_interval': pulse_interval,
+                'voltage_compliance': voltage_compliance,
+                'pulse_off_level': pulse_off_level,
+                'num_off_measurements': num_off_measurements,
+                'num_pulses': num_pulses,
+            }
+            # 6221 settings go out as a few ';'-joined writes, not one write + pause each
+            with self.source.batch():
+                if reset or self.applied is None:
+                    self.set_2182a_voltage_range(voltage_range)
+                    self.set_start_current(start)
+                    self.set_stop_current(stop)
+                    self.set_step(settings['step'])
+                    self.set_sweep_type(sweep_type)
+                    self.set_pulse_width(pulse_width)
+                    self.set_pulse_delay(pulse_delay)
+                    self.set_pulse_interval(pulse_interval)
+                    self.set_current_compliance(voltage_compliance)
+                    self.set_span()
+                    self.set_pulse_low_level(pulse_off_level)
+                    self.set_low_measure_enable(num_off_measurements)
+                    self.set_pulse_count(num_pulses)
+                    self.set_sweep_mode('ON')
+                    self.clean_buffer()
+                    self.set_buffer_size()
+                else:
+                    # Only resend what differs from the last applied sweep
+                    setters = {
+                        'voltage_range': self.set_2182a_voltage_range,
+                        'start': self.set_start_current,
+                        'stop': self.set_stop_current,
+                        'step': self.set_step,
+                        'sweep_type': self.set_sweep_type,
+                        'pulse_width': self.set_pulse_width,
+                        'pulse_delay': self.set_pulse_delay,
+                        'pulse_interval': self.set_pulse_interval,
+                        'voltage_compliance': self.set_current_compliance,
+                        'pulse_off_level': self.set_pulse_low_level,
+                        'num_off_measurements': self.set_low_measure_enable,
+                        'num_pulses': self.set_pulse_count,
+                    }
+                    changed = [name for name in settings if self.applied.get(name) != settings[name]]
+                    self.log_message(f"Warm setup, changing: {', '.join(changed) or 'nothing'}")
+                    for name in changed:
+                        setters[name](settings[name])
+                    self.clean_buffer()
+                # Reading numbers let get_data tell highs from lows; timestamps
+                # check the pulse timing
+                self.source.write('FORM:ELEM READ,TST,RNUM,SOUR')
+            self.applied = settings
 
             self.log_message("Pulsed sweep setup complete.")
             self.verify_setup()
         except Exception as e:
+            self.applied = None  # instrument state is unknown now
             self.log_message(f"Error in setup_pulsed_sweep: {str(e)}")
             raise
         finally:
@@ -340,47 +397,72 @@ class PulsedIVTest:
         self.log_message("Sweep aborted.")
 
     def get_data(self):
+        # Buffer records are (reading, timestamp, reading number, source). With
+        # low measurements enabled they are reduced to pulse-delta voltages per
+        # step; a buffer of one record per pulse is taken as already reduced.
         self.log_message("Retrieving data...")
-        data = self.robust_query_ascii_values(':TRAC:DATA?')
-        self.U = data[::2]  # Odd indices are voltage readings
-        self.I = data[1::2]  # Even indices are current readings
+        num_readings = int(float(self.robust_query(':TRAC:POIN:ACT?')))
+        data = self.read_buffer(num_readings, 4)
+        num_low = self.applied['num_off_measurements'] if self.applied else 0
+        num_pulses = self.applied['num_pulses'] if self.applied else len(data)
+        if num_low and len(data) > num_pulses:
+            columns, noise = reduce_pulse_delta(data[:, 0], data[:, 2], data[:, 3], num_low)
+            self.pulse_delta = dict(columns, reading_noise=noise)
+            self.U, self.I = columns['voltage'], columns['current']
+            # One high per pulse triggers at the pulse interval; the lows follow it closely
+            placed, is_high = deinterleave(data[:, 1], data[:, 2], num_low)
+            timestamps = placed[is_high]
+        else:
+            self.pulse_delta = None
+            self.U, self.I = data[:, 0], data[:, 3]
+            timestamps = data[:, 1]
+        if self.applied:
+            self.check_timing('pulsed', self.applied, timestamps)
+        self.publish(self.U, self.I)
         self.log_message(f"Retrieved {len(self.U)} data points.")
-        return np.array(self.U), np.array(self.I)
+        return self.U, self.I
 
     def send_command_to_2182A(self, command):
-        self.instrument.write(f':SYST:COMM:SER:SEND "{command}"')
-        time.sleep(SETUP_DELAY)
+        self.meter.write(command)
 
     def query_2182A(self, query):
-        self.send_command_to_2182A(query)
-        time.sleep(QUERY_DELAY)
-        return self.robust_query(':SYST:COMM:SER:ENT?')
+        return self.meter.query(query)
 
     def log_message(self, message):
-        print(message)  # Default behavior is to print to console
+        # To the log listener when one runs (broom, the daemon, the GUI), else the console
+        if logging_active():
+            log.info(message)
+        else:
+            print(message)
 
     def read_errors(self):
-        errors = []
-        while True:
-            error = self.robust_query(':SYST:ERR?')
-            if error.startswith('0,'):  # No error
-                break
-            errors.append(error)
-        return errors
+        return self.source.errors()
 
     def run_pulsed_sweep(self, start, stop, num_pulses, sweep_type, voltage_range, 
                      pulse_width, pulse_delay, pulse_interval, voltage_compliance,
-                     pulse_off_level, num_off_measurements, enable_compliance_abort):
+                     pulse_off_level, num_off_measurements, enable_compliance_abort, reset=True):
+        spec = {'start': start, 'stop': stop, 'num_pulses': num_pulses, 'sweep_type': sweep_type,
+                'voltage_range': voltage_range, 'pulse_width': pulse_width, 'pulse_delay': pulse_delay,
+                'pulse_interval': pulse_interval, 'voltage_compliance': voltage_compliance,
+                'pulse_off_level': pulse_off_level, 'num_off_measurements': num_off_measurements,
+                'enable_compliance_abort': enable_compliance_abort}
+        # Reject bad jobs before any instrument time is spent; raises ParameterError
+        validate(spec)
+        spec['reset'] = reset
+        predicted = self.timing.predict(**spec)
         try:
             start_time = time.time()
             self.log_message("Starting pulsed sweep...")
+            self.log_message(f"Estimated run time: {predicted['total']:.2f} seconds")
 
+            self.trace.begin('setup')
             self.setup_pulsed_sweep(start, stop, num_pulses, sweep_type, voltage_range,
                                     pulse_width, pulse_delay, pulse_interval, voltage_compliance,
-                                    pulse_off_level, num_off_measurements)
+                                    pulse_off_level, num_off_measurements, reset)
             self.set_compliance_abort(enable_compliance_abort)
 
             self.log_message("Setup complete. Arming instruments...")
+            self.trace.begin('arm')
             self.arm()
 
             arm_status = self.check_arm_status()
@@ -390,14 +472,17 @@ class PulsedIVTest:
                 raise Exception(f"Instrument not armed properly. Arm status: {arm_status}")
 
             self.log_message("Initiating sweep...")
+            self.trace.begin('sweep')
             self.initiate()
 
             self.log_message("Sweep in progress...")
-            estimated_time = num_pulses * float(pulse_interval) + 1
-            self.log_message(f"Estimated sweep time: {estimated_time:.2f} seconds")
-            time.sleep(estimated_time)
+            self.log_message(f"Estimated sweep time: {predicted['sweep']:.2f} seconds")
+            self.wait_for_readings(num_pulses * (1 + num_off_measurements), predicted['sweep'])
 
+            self.trace.begin('readback')
             voltage, current = self.get_data()
+            self.last_phases = self.trace.end()
+            self.trace.record(spec, self.last_phases)
 
             end_time = time.time()
             elapsed_time = end_time - start_time
@@ -406,6 +491,7 @@ class PulsedIVTest:
             return voltage, current
 
         except Exception as e:
+            self.trace.end()
             self.log_message(f"An error occurred during the sweep: {str(e)}")
             self.abort()
             return None, None
@@ -418,6 +504,424 @@ class PulsedIVTest:
             else:
                 self.log_message("No errors detected during the sweep.")
 
+    def wait_for_readings(self, expected, predicted):
+        # Sleep through most of the predicted sweep, then poll the buffer fill
+        # so the measured sweep time reflects the instrument, not our guess.
+        time.sleep(predicted * SWEEP_WAIT_FRACTION)
+        deadline = time.time() + predicted * (1 - SWEEP_WAIT_FRACTION) + SWEEP_WAIT_MARGIN
+        while time.time() < deadline:
+            if int(float(self.robust_query(':TRAC:POIN:ACT?'))) >= expected:
+                return True
+            time.sleep(POLL_INTERVAL)
+        self.log_message("Warning: sweep did not finish within the predicted time.")
+        return False
+
+    def wait_for_sweep_done(self, timeout):
+        return self.source.wait_for_sweep_done(timeout)
+
+    def journal_chunk(self, name, values):
+        if self.journal is not None and self.journal.run is not None:
+            self.journal.chunk(name, values)
+
+    def publish(self, voltage, current=np.nan, timestamp=np.nan):
+        if self.ring is not None and len(voltage):
+            self.ring.write(voltage, current, timestamp)
+
+    def read_buffer(self, num_readings, elements, on_block=None):
+        def block_read(block):
+            self.journal_chunk('buffer', block)
+            if on_block is not None:
+                on_block(block)
+        return self.source.fetch_trace(num_readings, elements, on_block=block_read)
+
+    def speed_setting(self, voltage_range, nplc=None):
+        # An explicit NPLC wins; otherwise use the calibrated profile for the range
+        if nplc is None and voltage_range in self.nplc_profile:
+            setting = self.nplc_profile[voltage_range]
+            return {'nplc': setting['nplc'], 'filter_count': setting['filter_count'],
+                    'autozero': setting['autozero']}
+        return {'nplc': DEFAULT_NPLC if nplc is None else nplc, 'filter_count': None, 'autozero': None}
+
+    def setting_reading_time(self, setting):
+        return float(reading_time(setting['nplc'], setting['filter_count'] or 1, bool(setting['autozero'])))
+
+    def sweep_delay(self, delay, *settings):
+        # Source delay per step: None derives it from the slowest of the speed
+        # settings, an explicit one must be long enough for all of them
+        shortest = max(float(derive_sweep_delay(setting['nplc'], setting['filter_count'] or 1))
+                       for setting in settings)
+        if delay is None:
+            return shortest
+        if delay < shortest:
+            raise ParameterError([f"delay must be at least {shortest:.4g} s for the 2182A speed setting"])
+        return delay
+
+    def safe_state(self, fast=False):
+        # with self.safe_state(fast): ... switches the output off on the way
+        # out, also after errors and Ctrl-C; with fast it also snapshots the
+        # 2182A before the speed settings and restores it afterwards
+        return SafeState(self, FAST_2182A if fast else None)
+
+    def check_timing(self, mode, params, timestamps):
+        # Compares the TST column with the programmed trigger interval and
+        # the shortest one the programmed pulse allows
+        report, errors = analyze_timestamps(timestamps, expected_interval(mode, params),
+                                            minimum=minimum_interval(mode, params))
+        self.timing_report = {name: column[0].item() for name, column in report.items()}
+        for message in errors.get(0, []):
+            self.log_message(f"Timing check failed: {message}")
+        return self.timing_report
+
+    def configure_step_trigger_link(self):
+        # Each sweep step triggers one 2182A reading over the trigger link
+        self.instrument.write('TRIG:SOUR TLIN')
+        self.instrument.write('TRIG:DIR SOUR')
+        self.instrument.write('TRIG:OLIN 2')
+        self.instrument.write('TRIG:ILIN 1')
+        self.instrument.write('TRIG:OUTP DEL')
+
+    def set_output_shield(self, guarding_on, low_to_earth_on):
+        self.instrument.write('OUTP:ISH GUARD' if guarding_on else 'OUTP:ISH OLOW')
+        self.instrument.write('OUTP:LTE ON' if low_to_earth_on else 'OUTP:LTE OFF')
+        time.sleep(SETUP_DELAY)
+
+    def set_6221_filter(self, filter_type, filter_count):
+        # filter_type: 0 off, 1 moving, 2 repeating
+        self.instrument.write('SENS:AVER:WIND 0')
+        self.instrument.write('SENS:AVER:TCON REP' if filter_type == 2 else 'SENS:AVER:TCON MOV')
+        if filter_type:
+            self.instrument.write(f'SENS:AVER:COUN {filter_count}')
+        self.instrument.write(f'SENS:AVER:STAT {1 if filter_type else 0}')
+        time.sleep(SETUP_DELAY)
+
+    def run_dc_sweep(self, start, stop, num_points, delay, voltage_compliance, voltage_range, nplc=None,
+                     fast=False):
+        setting = self.speed_setting(voltage_range, nplc)
+        nplc = setting['nplc']
+        delay = self.sweep_delay(delay, setting)
+        validate({'start': start, 'stop': stop, 'num_points': num_points, 'delay': delay,
+                  'voltage_compliance': voltage_compliance, 'voltage_range': voltage_range, 'nplc': nplc},
+                 DC_SWEEP_SCHEMA, DC_SWEEP_RULES)
+        self.log_message("Setting up DC staircase sweep...")
+        acquisition = TraceAcquisition(self, np.linspace(start, stop, num_points))
+        self.configure_dc_sweep(acquisition, delay, voltage_compliance, voltage_range, setting)
+        with self.safe_state(fast):
+            self.instrument.write('SOUR:SWE:ARM')
+            time.sleep(SETUP_DELAY)
+            acquisition.arm()
+            self.instrument.write('INIT:IMM')
+            self.wait_for_sweep_done(num_points * (delay + self.setting_reading_time(setting)) + SWEEP_WAIT_MARGIN)
+            data = acquisition.fetch()
+        self.log_message(f"DC sweep returned {len(data['voltage'])} of {num_points} readings.")
+        self.range_planner.observe(data['current'], data['voltage'])
+        return data['voltage'], data['current']
+
+    def configure_dc_sweep(self, acquisition, delay, voltage_compliance, voltage_range, setting):
+        self.applied = None
+        self.instrument.write('SOUR:SWE:ABOR')
+        self.reset_6221()
+        self.reset_2182a()
+        self.set_2182a_voltage_range(voltage_range)
+        apply_setting(self, **setting)
+        self.set_linear_staircase()
+        self.set_start_current(acquisition.currents[0])
+        self.set_stop_current(acquisition.currents[-1])
+        self.instrument.write(f'SOUR:SWE:POIN {len(acquisition)}')
+        self.set_delay(delay)
+        self.set_current_compliance(voltage_compliance)
+        self.instrument.write('SOUR:SWE:RANG BEST')
+        self.instrument.write('SOUR:SWE:COUN 1')
+        self.instrument.write('SOUR:SWE:CAB OFF')
+        self.configure_step_trigger_link()
+        acquisition.configure()
+
+    def run_streaming_sweep(self, start, stop, num_points, delay, voltage_compliance, voltage_range,
+                            stop_conditions=(), nplc=None, chunk=TRACE_STREAM_CHUNK, fast=False):
+        # DC staircase read back in chunks while it runs. Every chunk is
+        # checked against stop_conditions (see stop_conditions.py); the first
+        # one met aborts the sweep at once. Returns (voltage, current, stop)
+        # where stop names the condition and the reading it fired at, or is
+        # None when the sweep ran to the end.
+        setting = self.speed_setting(voltage_range, nplc)
+        nplc = setting['nplc']
+        delay = self.sweep_delay(delay, setting)
+        validate({'start': start, 'stop': stop, 'num_points': num_points, 'delay': delay,
+                  'voltage_compliance': voltage_compliance, 'voltage_range': voltage_range, 'nplc': nplc},
+                 DC_SWEEP_SCHEMA, DC_SWEEP_RULES)
+        self.log_message("Setting up streaming DC sweep...")
+        acquisition = TraceAcquisition(self, np.linspace(start, stop, num_points))
+        self.configure_dc_sweep(acquisition, delay, voltage_compliance, voltage_range, setting)
+        self.source.clear()  # no compliance left latched from earlier runs
+        voltage, stopped = np.empty(0), None
+        with self.safe_state(fast):
+            self.instrument.write('SOUR:SWE:ARM')
+            time.sleep(SETUP_DELAY)
+            acquisition.arm()
+            self.instrument.write('INIT:IMM')
+            timeout = num_points * (delay + self.setting_reading_time(setting)) + SWEEP_WAIT_MARGIN
+            for data in acquisition.stream(timeout, chunk):
+                first_new = len(voltage)
+                voltage = np.concatenate([voltage, data['voltage']])
+                hit = first_stop(stop_conditions, acquisition.currents[:len(voltage)], voltage, first_new)
+                if hit is not None:
+                    self.source.abort()
+                    index, condition = hit
+                    stopped = {'condition': condition.name, 'description': condition.description,
+                               'index': index, 'current': float(acquisition.currents[index])}
+                    self.log_message(f"Stopped at {stopped['current']:.4g} A: {condition.description}.")
+                    break
+        self.log_message(f"Streaming sweep returned {len(voltage)} of {num_points} readings.")
+        self.range_planner.observe(acquisition.currents[:len(voltage)], voltage)
+        return voltage, acquisition.currents[:len(voltage)], stopped
+
+    def probe_voltage(self, current, voltage_compliance):
+        # One autoranged reading at a DC current, for range planning without history
+        self.source.write_batch(['SOUR:SWE:ABOR', f'SOUR:CURR:COMP {voltage_compliance}',
+                                 f'SOUR:CURR {current}', 'OUTP ON'])
+        try:
+            self.meter.write_batch([':SENS:VOLT:RANG:AUTO ON', ':TRIG:SOUR IMM', ':TRIG:COUN 1'])
+            time.sleep(SETUP_DELAY)
+            voltage = float(self.meter.query(':READ?'))
+        finally:
+            self.source.write_batch(['OUTP OFF', 'SOUR:CURR 0'])
+        self.log_message(f"Range probe: {voltage:.4g} V at {current:.4g} A")
+        return voltage
+
+    def plan_ranges(self, currents, voltage_compliance, split=False):
+        # Fixed 2182A range(s) for a sweep over currents; probes once if there
+        # is no previous sweep to predict from
+        if not self.range_planner.has_history:
+            peak = currents[np.argmax(np.abs(currents))]
+            self.range_planner.observe_probe(peak, self.probe_voltage(peak, voltage_compliance))
+        plan = self.range_planner.plan(currents, split)
+        self.log_message("Range plan: " + ", ".join(f"{stop - first} points on {name}" for first, stop, name in plan))
+        return plan
+
+    def run_planned_sweep(self, start, stop, num_points, delay, voltage_compliance, nplc=None, split=True,
+                          fast=False):
+        # DC sweep as SOUR:LIST segments, each on the fixed 2182A range the
+        # planner predicts for it (and that range's speed setting), instead of
+        # autorange. Returns (voltage, current, plan).
+        currents = np.linspace(start, stop, num_points)
+        self.log_message("Setting up range-planned sweep...")
+        self.instrument.write('SOUR:SWE:ABOR')
+        plan = self.plan_ranges(currents, voltage_compliance, split)
+        delay = self.sweep_delay(delay, *(self.speed_setting(name, nplc) for _, _, name in plan))
+        validate({'start': start, 'stop': stop, 'num_points': num_points, 'delay': delay,
+                  'voltage_compliance': voltage_compliance, 'voltage_range': plan[0][2],
+                  'nplc': self.speed_setting(plan[0][2], nplc)['nplc']}, DC_SWEEP_SCHEMA, DC_SWEEP_RULES)
+        voltage = np.empty(0)
+        self.loop_settings = None
+        with self.safe_state(fast):
+            for segment, (first, last, voltage_range) in enumerate(plan):
+                setting = self.speed_setting(voltage_range, nplc)
+                acquisition = TraceAcquisition(self, currents[first:last])
+                if segment == 0:
+                    self.configure_loop_sweep(acquisition, delay, voltage_compliance, voltage_range, setting)
+                else:
+                    self.set_2182a_voltage_range(voltage_range)
+                    apply_setting(self, **setting)
+                    self.set_list_sweep(acquisition.currents, delay)
+                    acquisition.configure()
+                self.instrument.write('SOUR:SWE:ARM')
+                time.sleep(SETUP_DELAY)
+                acquisition.arm()
+                self.instrument.write('INIT:IMM')
+                self.wait_for_sweep_done(len(acquisition) * (delay + self.setting_reading_time(setting))
+                                         + SWEEP_WAIT_MARGIN)
+                readings = acquisition.fetch()['voltage']
+                voltage = np.concatenate([voltage, readings])
+                if len(readings) < len(acquisition):
+                    break
+        self.range_planner.observe(currents[:len(voltage)], voltage)
+        return voltage, currents[:len(voltage)], plan
+
+    def configure_loop_sweep(self, acquisition, delay, voltage_compliance, voltage_range, setting):
+        self.reset_6221()
+        self.reset_2182a()
+        self.set_2182a_voltage_range(voltage_range)
+        apply_setting(self, **setting)
+        self.set_list_sweep(acquisition.currents, delay)
+        self.set_current_compliance(voltage_compliance)
+        self.instrument.write('SOUR:SWE:RANG BEST')
+        self.instrument.write('SOUR:SWE:COUN 1')
+        self.instrument.write('SOUR:SWE:CAB OFF')
+        self.configure_step_trigger_link()
+        acquisition.configure()
+
+    def run_loop_sweep(self, stop, points, num_loops, delay, voltage_compliance, voltage_range,
+                       nplc=None, shape='loop_bidir', start=0, switch_threshold=None,
+                       reset=True, on_loop=None, chunk=TRACE_STREAM_CHUNK, fast=False):
+        # Repeats the same SOUR:LIST loop num_loops times. The list is uploaded
+        # and the instruments configured only when the settings differ from the
+        # previous loop sweep (or reset is requested); between loops only the
+        # 2182A trace is cleared and the sweep re-armed. Each loop is read back
+        # in chunks while it runs, and the analyzer tags and integrates every
+        # chunk as it arrives. Returns the LoopAnalyzer holding the per-loop
+        # summaries; on_loop(summary, voltage) is called after every loop. fast
+        # runs the loops with the 2182A speed settings, restored afterwards.
+        setting = self.speed_setting(voltage_range, nplc)
+        nplc = setting['nplc']
+        delay = self.sweep_delay(delay, setting)
+        settings = {'start': start, 'stop': stop, 'points': points, 'num_loops': num_loops, 'shape': shape,
+                    'delay': delay, 'voltage_compliance': voltage_compliance, 'voltage_range': voltage_range,
+                    'nplc': nplc}
+        validate(settings, LOOP_SWEEP_SCHEMA, LOOP_SWEEP_RULES)
+        del settings['num_loops']
+        settings.update(setting)
+        currents = build_sweep_list(start, stop, points, shape)
+        acquisition = TraceAcquisition(self, currents)
+        analyzer = LoopAnalyzer(currents, switch_threshold)
+        loop_time = len(currents) * (delay + self.setting_reading_time(setting)) + SWEEP_WAIT_MARGIN
+        try:
+            if reset or self.loop_settings != settings:
+                self.log_message(f"Setting up loop sweep of {len(currents)} points...")
+                self.instrument.write('SOUR:SWE:ABOR')
+                self.configure_loop_sweep(acquisition, delay, voltage_compliance, voltage_range, setting)
+                self.loop_settings = settings
+            else:
+                self.log_message("Loop sweep already configured, reusing list and trigger setup.")
+            # ARM turns the output back on, so switching it off between calls keeps the list
+            with self.safe_state(fast):
+                for loop in range(num_loops):
+                    self.instrument.write('SOUR:SWE:ARM')
+                    time.sleep(SETUP_DELAY)
+                    acquisition.arm()
+                    self.instrument.write('INIT:IMM')
+                    voltage = np.empty(0)
+                    for data in acquisition.stream(loop_time, chunk):
+                        analyzer.add(data['voltage'])
+                        voltage = np.concatenate([voltage, data['voltage']])
+                    if len(voltage) < len(currents):
+                        raise RuntimeError(f"Loop {loop} returned {len(voltage)} of {len(currents)} readings")
+                    if self.journal is not None and self.journal.run is not None:
+                        self.journal.checkpoint(loop=loop, summary=analyzer.last)
+                    if on_loop is not None:
+                        on_loop(analyzer.last, voltage)
+            self.log_message(f"Completed {num_loops} loops.")
+        except Exception:
+            self.loop_settings = None
+            raise
+        return analyzer
+
+    def run_adaptive_sweep(self, start, stop, coarse_points, tolerance, delay, voltage_compliance, voltage_range,
+                           nplc=None, max_points=MAX_2182A_READINGS, max_passes=ADAPTIVE_MAX_PASSES, fast=False):
+        # Coarse uniform SOUR:LIST pass, then passes measuring only the
+        # midpoints of intervals whose interpolation error exceeds tolerance
+        # (volts). The instruments are configured once; each pass uploads its
+        # short list and re-arms. Returns (voltage, current, summary) over all
+        # measured points, ordered by current.
+        setting = self.speed_setting(voltage_range, nplc)
+        nplc = setting['nplc']
+        delay = self.sweep_delay(delay, setting)
+        validate({'start': start, 'stop': stop, 'coarse_points': coarse_points, 'tolerance': tolerance,
+                  'max_points': max_points, 'delay': delay, 'voltage_compliance': voltage_compliance,
+                  'voltage_range': voltage_range, 'nplc': nplc}, ADAPTIVE_SWEEP_SCHEMA, ADAPTIVE_SWEEP_RULES)
+        plan = AdaptivePlan(start, stop, coarse_points, tolerance, max_points, max_passes)
+        self.log_message(f"Setting up adaptive sweep, coarse pass of {coarse_points} points...")
+        self.instrument.write('SOUR:SWE:ABOR')
+        acquisition = TraceAcquisition(self, plan.next_pass())
+        self.configure_loop_sweep(acquisition, delay, voltage_compliance, voltage_range, setting)
+        self.loop_settings = None  # the list is replaced pass by pass
+        with self.safe_state(fast):
+            while not plan.done:
+                if plan.passes:
+                    acquisition = TraceAcquisition(self, plan.next_pass())
+                    self.set_list_sweep(acquisition.currents, delay)
+                    acquisition.configure()
+                    self.log_message(f"Refinement pass {plan.passes}: {len(acquisition)} new points.")
+                self.instrument.write('SOUR:SWE:ARM')
+                time.sleep(SETUP_DELAY)
+                acquisition.arm()
+                self.instrument.write('INIT:IMM')
+                self.wait_for_sweep_done(len(acquisition) * (delay + self.setting_reading_time(setting))
+                                         + SWEEP_WAIT_MARGIN)
+                plan.add(acquisition.fetch()['voltage'])
+        summary = plan.summary()
+        self.range_planner.observe(plan.currents, plan.voltages)
+        self.log_message(f"Adaptive sweep measured {summary['points']} points in {summary['passes']} passes "
+                         f"(max interpolation error {summary['max_interpolation_error']:.3g} V).")
+        return plan.voltages, plan.currents, summary
+
+    def run_delta(self, high_current, low_current, num_readings, filter_type, filter_count, voltage_range,
+                  delay, integration_NPLCs, volt_compliance, guarding_on=False, lowToEarth_on=False):
+        params = {'high_current': high_current, 'low_current': low_current, 'num_readings': num_readings,
+                  'filter_type': filter_type, 'filter_count': filter_count, 'voltage_range': voltage_range,
+                  'delay': delay, 'integration_NPLCs': integration_NPLCs, 'volt_compliance': volt_compliance}
+        validate(params, DELTA_SCHEMA, DELTA_RULES)
+        self.log_message("Setting up delta measurement...")
+        self.applied = None
+        self.instrument.write('SOUR:SWE:ABOR')
+        self.instrument.write('SOUR:WAVE:ABOR')
+        self.reset_6221()
+        self.set_output_shield(guarding_on, lowToEarth_on)
+        self.instrument.write('FORM:ELEM READ,TST,RNUM,SOUR')
+        self.instrument.write(f'SOUR:DELT:HIGH {high_current}')
+        self.instrument.write(f'SOUR:DELT:LOW {low_current}')
+        self.instrument.write(f'SOUR:DELT:COUNT {num_readings}')
+        self.instrument.write(f'SOUR:DELT:DEL {delay}')
+        self.set_current_compliance(volt_compliance)
+        self.instrument.write(f'SOUR:CURR:RANG {max(abs(high_current), abs(low_current))}')
+        self.reset_2182a()
+        self.send_command_to_2182A(f':SENS:VOLT:NPLC {integration_NPLCs}')
+        self.send_command_to_2182A(f':SENS:VOLT:RANG {voltage_range}')
+        self.set_6221_filter(filter_type, filter_count)
+        self.instrument.write('UNIT V')
+        try:
+            self.instrument.write('SOUR:DELT:ARM')
+            time.sleep(SETUP_DELAY)
+            self.instrument.write('INIT:IMM')
+            conversion = integration_NPLCs / POWER_LINE_FREQUENCY * max(filter_count if filter_type else 1, 1)
+            self.wait_for_sweep_done(num_readings * (delay + conversion) * 2 + SWEEP_WAIT_MARGIN)
+            # Noise statistics are accumulated block by block as the buffer is read
+            noise = NoiseAnalyzer(expected_interval('delta', params))
+            data = self.read_buffer(num_readings, 4, on_block=lambda block: noise.add(block[:, 0]))
+        finally:
+            self.instrument.write('SOUR:SWE:ABOR')
+        self.check_timing('delta', params, data[:, 1])
+        self.noise_report = noise.report()
+        return {'voltage': data[:, 0], 'timestamp': data[:, 1], 'reading': data[:, 2], 'current': data[:, 3]}
+
+    def run_differential_conductance(self, start_current, stop_current, step, delta, filter_on, filter_count,
+                                     voltage_range, delay, integration_NPLCs, volt_compliance,
+                                     guarding_on=False, lowToEarth_on=False):
+        params = {'start_current': start_current, 'stop_current': stop_current, 'step': step, 'delta': delta,
+                  'filter_on': filter_on, 'filter_count': filter_count, 'voltage_range': voltage_range,
+                  'delay': delay, 'integration_NPLCs': integration_NPLCs, 'volt_compliance': volt_compliance}
+        validate(params, DIFFERENTIAL_CONDUCTANCE_SCHEMA, DIFFERENTIAL_CONDUCTANCE_RULES)
+        self.log_message("Setting up differential conductance sweep...")
+        self.applied = None
+        self.instrument.write('SOUR:SWE:ABOR')
+        self.instrument.write('SOUR:WAVE:ABOR')
+        self.reset_6221()
+        self.set_output_shield(guarding_on, lowToEarth_on)
+        self.instrument.write('FORM:ELEM READ,SOUR,AVOL,TST')
+        self.instrument.write(f'SOUR:DCON:STAR {start_current}')
+        self.instrument.write(f'SOUR:DCON:STOP {stop_current}')
+        self.instrument.write(f'SOUR:DCON:STEP {step}')
+        self.instrument.write(f'SOUR:DCON:DEL {delay}')
+        self.instrument.write(f'SOUR:DCON:DELT {abs(delta)}')
+        self.set_current_compliance(volt_compliance)
+        self.reset_2182a()
+        self.send_command_to_2182A(f':SENS:VOLT:NPLC {integration_NPLCs}')
+        self.send_command_to_2182A(f':SENS:VOLT:RANG {voltage_range}')
+        # Only the repeating filter is valid in differential conductance
+        self.set_6221_filter(2 if filter_on else 0, filter_count)
+        self.instrument.write('UNIT SIEM')
+        num_readings = int(np.ceil(abs(stop_current - start_current) / step))
+        try:
+            self.instrument.write('SOUR:DCON:ARM')
+            time.sleep(SETUP_DELAY)
+            self.instrument.write('INIT:IMM')
+            conversion = integration_NPLCs / POWER_LINE_FREQUENCY * (filter_count if filter_on else 1)
+            self.wait_for_sweep_done(num_readings * (delay + conversion) * 2 + SWEEP_WAIT_MARGIN)
+            data = self.read_buffer(num_readings, 4)
+        finally:
+            self.instrument.write('SOUR:SWE:ABOR')
+        self.check_timing('dcon', params, data[:, 3])
+        return {'conductance': data[:, 0], 'current': data[:, 1], 'average_voltage': data[:, 2],
+                'timestamp': data[:, 3]}
+
     def calc_data_delay(self):
         return ((self.stop - self.start) / self.step) * self.delay
 
@@ -428,7 +932,6 @@ class PulsedIVTest:
         else:
             self.set_logarithmic_staircase()
             self.sweep_type = 'LOG'
-        time.sleep(SETUP_DELAY)
 
 # Usage example
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+# The Broom modules import each other (and config) as top-level modules
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
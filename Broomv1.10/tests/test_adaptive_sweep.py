@@ -0,0 +1,31 @@
+import numpy as np
+
+from adaptive_sweep import AdaptivePlan, interpolation_error, refine_points
+
+
+def test_linear_data_has_no_interpolation_error():
+    currents = np.linspace(0, 1, 11)
+    assert np.allclose(interpolation_error(currents, 3 * currents + 1), 0)
+
+
+def test_refinement_bisects_only_the_kink():
+    currents = np.linspace(-1, 1, 9)
+    voltages = np.abs(currents)
+    assert refine_points(currents, voltages, 0.01, 1e-3, budget=10).tolist() == [-0.125, 0.125]
+
+
+def test_refinement_respects_budget_and_min_step():
+    currents = np.linspace(0, 1, 5)
+    voltages = currents ** 3
+    assert len(refine_points(currents, voltages, 1e-6, 1e-3, budget=2)) == 2
+    assert len(refine_points(currents, voltages, 1e-6, 0.2, budget=10)) == 0
+
+
+def test_plan_converges_on_a_step():
+    plan = AdaptivePlan(-1, 1, 9, tolerance=0.01, max_points=200, max_passes=20)
+    while not plan.done:
+        plan.add(np.tanh(plan.next_pass() * 20))
+    summary = plan.summary()
+    assert summary['converged']
+    assert summary['points'] < 200
+    assert np.all(np.diff(plan.currents) > 0)
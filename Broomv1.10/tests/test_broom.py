@@ -0,0 +1,31 @@
+import json
+from argparse import Namespace
+from types import SimpleNamespace
+
+from broom import BroomRunner, json_safe
+
+
+def test_non_finite_results_print_as_null():
+    results = {'statistics': {'area': {'mean': float('nan'), 'std': float('inf'), 'count': 0}}, 'points': [1.0]}
+    assert json.loads(json.dumps(json_safe(results), allow_nan=False)) == {
+        'statistics': {'area': {'mean': None, 'std': None, 'count': 0}}, 'points': [1.0]}
+
+
+def test_failed_catalog_entry_does_not_hide_the_sweep_error(tmp_path):
+    spec = tmp_path / 'dc.json'
+    spec.write_text('{"start": 0, "stop": 0.001}')
+    runner = BroomRunner(catalog='')
+    runner.test = SimpleNamespace(instrument=object())
+
+    def sweep(args):
+        raise RuntimeError("DC sweep failed or was aborted.")
+
+    def catalog_run(args, spec, started, result, error=None):
+        raise OSError("catalog is locked")
+
+    runner.do_dc = sweep
+    runner.catalog_run = catalog_run
+    [result] = runner.run([Namespace(action='dc', spec=str(spec))])
+    assert not result['ok']
+    assert result['error'] == "DC sweep failed or was aborted."
+    assert result['catalog_error'] == "catalog is locked"
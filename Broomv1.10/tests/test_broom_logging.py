@@ -0,0 +1,39 @@
+import json
+import logging
+
+import pytest
+
+import timing
+from broom_logging import get_logger, logging_active, setup_logging
+
+
+def test_relative_log_file_is_next_to_the_modules(tmp_path, monkeypatch):
+    modules = tmp_path / 'modules'
+    modules.mkdir()
+    monkeypatch.setattr(timing, 'HERE', str(modules))
+    monkeypatch.chdir(tmp_path)
+    service = setup_logging('broom.log')
+    try:
+        get_logger('sweep').warning("compliance reached")
+    finally:
+        service.stop()
+    assert not (tmp_path / 'broom.log').exists()
+    [entry] = [json.loads(line) for line in (modules / 'broom.log').read_text().splitlines()]
+    assert (entry['logger'], entry['message']) == ('broom.sweep', "compliance reached")
+
+
+def test_messages_reach_the_console_without_the_listener(tmp_path, capsys, monkeypatch):
+    sweep_functions = pytest.importorskip("sweep_functions")
+    monkeypatch.setattr(logging.getLogger('broom'), 'propagate', True)  # as before any setup_logging
+    root = logging.getLogger()
+    handler = logging.StreamHandler()
+    root.addHandler(handler)  # what pytest or a notebook installs; it must not swallow the message
+    try:
+        sweep_functions.PulsedIVTest.log_message(None, "Sweep initiated.")
+        assert capsys.readouterr().out == "Sweep initiated.\n"
+        service = setup_logging(str(tmp_path / 'broom.log'))
+        assert logging_active()
+        service.stop()
+        assert not logging_active()
+    finally:
+        root.removeHandler(handler)
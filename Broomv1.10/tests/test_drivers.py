@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip("pyvisa")
+
+from drivers import command_batches
+
+
+def test_batched_commands_start_from_the_root():
+    commands = ['SOUR:CURR:STAR 0', 'SOUR:CURR:STOP 0.01', ':TRIG:COUN 5', '*CLS', 'FORM:ELEM READ,RNUM,SOUR']
+    assert list(command_batches(commands)) == [
+        ':SOUR:CURR:STAR 0;:SOUR:CURR:STOP 0.01;:TRIG:COUN 5;*CLS;:FORM:ELEM READ,RNUM,SOUR']
+
+
+def test_batches_split_at_the_byte_limit():
+    commands = [f'SOUR:LIST:CURR {i}' for i in range(10)]
+    batches = list(command_batches(commands, max_bytes=60))
+    assert all(len(batch) <= 60 for batch in batches)
+    assert ';'.join(batches).split(';') == [':' + command for command in commands]
+
+
+def test_single_command_is_rooted():
+    assert list(command_batches(['OUTP OFF'])) == [':OUTP OFF']
+
+
+def test_setup_writes_go_through_the_resilient_io():
+    from drivers import K6221
+    source = K6221(log_message=lambda message: None)
+    calls = []
+    source.instrument = type('Instrument', (), {'timeout': 1000, 'write': lambda self, command: calls.append(command)})()
+    source.io.write = lambda instrument, command, operation='setup': calls.append(('io', command))
+    with source.batch():
+        source.write('SOUR:CURR 0')
+        source.write('OUTP ON')
+    source.write('OUTP OFF')
+    assert calls == [('io', ':SOUR:CURR 0;:OUTP ON'), ('io', 'OUTP OFF')]
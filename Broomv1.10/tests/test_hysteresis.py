@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from hysteresis import LoopAnalyzer, branch_labels, loop_area
+from list_sweep import build_sweep_list
+
+
+def test_turning_points_belong_to_the_branch_they_end():
+    currents = build_sweep_list(0, 1e-3, 3, 'loop_bidir')
+    assert branch_labels(currents).tolist() == ['up+'] * 4 + ['down+'] * 3 + ['down-'] * 3 + ['up-'] * 2
+
+
+def test_loop_area_is_signed_by_the_direction_of_travel():
+    # Up at 0 V, down at 1 V: a unit square traversed clockwise
+    currents = np.array([0, 1, 1, 0, 0], dtype=float)
+    voltages = np.array([0, 0, 1, 1, 0], dtype=float)
+    assert loop_area(currents, voltages) == -1.0
+    assert loop_area(currents[::-1], voltages[::-1]) == 1.0
+
+
+def test_chunks_across_loop_boundaries_give_the_same_loops():
+    currents = build_sweep_list(0, 1e-3, 5, 'loop_bidir')
+    # Switches on between 0.25 and 0.5 mA going up, off between -0.25 and -0.5 mA going down
+    loop = np.array([0, 0, 1, 1, 1] + [1, 1, 1, 1, 1] + [1, 1, 0, 0, 0] + [0, 0, 0, 0, 0], dtype=float)
+    whole = LoopAnalyzer(currents)
+    whole.add(np.tile(loop, 2))
+    chunked = LoopAnalyzer(currents)
+    labels = np.concatenate([chunked.add(chunk) for chunk in np.array_split(np.tile(loop, 2), 7)])
+    assert labels.tolist() == np.tile(branch_labels(currents), 2).tolist()
+    assert len(chunked.summaries) == 2
+    np.testing.assert_equal(chunked.columns(), whole.columns())
+    assert chunked.last['area'] == pytest.approx(abs(loop_area(currents, loop)))
+    assert chunked.last['up+'] == pytest.approx(3.75e-4)
+    assert chunked.last['down-'] == pytest.approx(-3.75e-4)
+    assert chunked.statistics()['area']['std'] == 0
@@ -0,0 +1,50 @@
+import numpy as np
+
+from journal import AcquisitionJournal, read_journal, replay
+
+
+def test_replay_rebuilds_complete_and_interrupted_runs(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    with AcquisitionJournal(path, fsync=False) as journal:
+        with journal.recording('pulsed', {'start': 0}):
+            journal.chunk('voltage', [1.0, 2.0])
+            journal.chunk('voltage', [3.0, np.nan])
+        journal.begin('scan', run='point0')
+        journal.chunk('voltage', [5.0])
+        journal.checkpoint(point=0)
+    runs = replay(path)
+    complete = runs['run0']
+    assert complete['status'] == 'complete' and complete['mode'] == 'pulsed'
+    np.testing.assert_array_equal(complete['chunks']['voltage'], [1.0, 2.0, 3.0, np.nan])
+    assert runs['point0']['status'] is None
+    assert runs['point0']['checkpoint'] == {'point': 0}
+
+
+def test_torn_record_is_skipped_and_appending_continues(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    with AcquisitionJournal(path, fsync=False) as journal:
+        journal.begin('pulsed')
+        journal.chunk('voltage', [1.0])
+    with open(path, 'a', encoding="utf-8") as f:
+        f.write('{"seq": 2, "type": "chu')  # crash mid-write
+    with AcquisitionJournal(path, fsync=False) as journal:
+        with journal.recording('pulsed'):
+            journal.chunk('voltage', [2.0])
+    assert [record['seq'] for record in read_journal(path)] == [0, 1, 2, 3, 4]
+    runs = replay(path)
+    assert runs['run0']['status'] is None
+    np.testing.assert_array_equal(runs['run0']['chunks']['voltage'], [1.0])
+    assert runs['run2']['status'] == 'complete'
+    np.testing.assert_array_equal(runs['run2']['chunks']['voltage'], [2.0])
+
+
+def test_failed_block_ends_the_run_as_failed(tmp_path):
+    path = str(tmp_path / 'run.jsonl')
+    journal = AcquisitionJournal(path, fsync=False)
+    try:
+        with journal.recording('dc'):
+            raise KeyboardInterrupt
+    except KeyboardInterrupt:
+        pass
+    journal.close()
+    assert replay(path)['run0']['status'] == 'failed'
@@ -0,0 +1,51 @@
+import numpy as np
+
+from config import LIST_CHUNK_BYTES, LIST_CHUNK_POINTS
+from list_sweep import ListSweepUploader, build_sweep_list, list_blocks
+
+
+def test_bidirectional_loop_goes_out_and_back_on_both_sides():
+    currents = build_sweep_list(0, 1e-3, 3, 'loop_bidir')
+    assert currents.tolist() == [0, 5e-4, 1e-3, 1e-3, 5e-4, 0, 0, -5e-4, -1e-3, -1e-3, -5e-4, 0]
+    assert build_sweep_list(1e-3, 2e-3, 2, 'loop').tolist() == [1e-3, 2e-3, 2e-3, 1e-3]
+
+
+def test_blocks_fit_one_write_and_keep_every_value():
+    values = np.linspace(-0.1, 0.1, 1001)
+    blocks = list(list_blocks(values))
+    assert all(len(block) <= LIST_CHUNK_BYTES for block in blocks)
+    assert all(block.count(',') < LIST_CHUNK_POINTS for block in blocks)
+    assert [float(v) for v in ','.join(blocks).split(',')] == [float(f'{v:.6e}') for v in values]
+    # Every block but the last is filled up to the byte limit
+    assert all(len(block) > LIST_CHUNK_BYTES - len('-1.000000e-01,') for block in blocks[:-1])
+
+
+class FakeTest:
+    def __init__(self):
+        self.writes = []
+        self.instrument = self
+        self.points = 0
+
+    def write(self, command):
+        self.writes.append(command)
+        if command.startswith('SOUR:LIST:CURR'):
+            self.points = (self.points if ':APP' in command else 0) + command.count(',') + 1
+
+    def robust_query(self, command):
+        return str(self.points)
+
+    def log_message(self, message):
+        pass
+
+
+def test_same_list_is_not_uploaded_twice():
+    test = FakeTest()
+    uploader = ListSweepUploader(test)
+    currents = build_sweep_list(0, 1e-3, 200)
+    assert uploader.upload(currents, 1e-3)
+    writes = len(test.writes)
+    assert test.writes[1].startswith('SOUR:LIST:CURR:APP ')
+    assert not uploader.upload(currents, 1e-3)
+    assert len(test.writes) == writes
+    uploader.invalidate()
+    assert uploader.upload(currents, 1e-3)
@@ -0,0 +1,42 @@
+import numpy as np
+
+from noise_analysis import AllanAccumulator, NoiseAnalyzer, WelchAccumulator
+
+
+def allan_deviation(values, m):
+    # Non-overlapping Allan deviation at averaging factor m, computed directly
+    means = values[:len(values) // m * m].reshape(-1, m).mean(axis=1)
+    return np.sqrt(np.mean(np.diff(means) ** 2) / 2)
+
+
+def test_chunked_allan_matches_direct_computation():
+    values = np.random.default_rng(1).normal(size=4096)
+    allan = AllanAccumulator(0.1)
+    for chunk in np.array_split(values, 7):
+        allan.add(chunk)
+    result = allan.result()
+    np.testing.assert_allclose(result['tau'][:4], [0.1, 0.2, 0.4, 0.8])
+    for k in range(4):
+        assert np.isclose(result['adev'][k], allan_deviation(values, 2 ** k))
+
+
+def test_white_noise_psd_is_flat_at_the_variance_level():
+    rate = 100.0
+    values = np.random.default_rng(2).normal(size=64 * 256)
+    welch = WelchAccumulator(rate, segment=256)
+    for chunk in np.array_split(values, 10):
+        welch.add(chunk)
+    result = welch.result()
+    assert result['segments'] == 127
+    # One-sided density of unit white noise is 2 / rate
+    assert abs(np.median(result['psd'][1:-1]) * rate / 2 - 1) < 0.1
+
+
+def test_report_skips_nan_readings():
+    analyzer = NoiseAnalyzer(0.01, segment=64)
+    values = np.random.default_rng(3).normal(size=512)
+    values[::50] = np.nan
+    analyzer.add(values)
+    report = analyzer.report()
+    assert report['readings'] == 512 - 11
+    assert report['min_adev_tau'] is not None
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from nplc_optimizer import choose_setting, fit_noise
+
+# White noise averaging down onto a floor: noise^2 = A / t + B
+A, B = 1e-18, 1e-18
+
+
+def noise(times):
+    return np.sqrt(A / np.asarray(times) + B)
+
+
+def test_fit_recovers_the_white_noise_and_the_floor():
+    assert fit_noise([0.002, 0.02, 0.2], noise([0.002, 0.02, 0.2])) == pytest.approx((A, B))
+
+
+def test_fit_keeps_the_floor_non_negative():
+    # Noise falling faster than 1 / sqrt(t) would fit a negative floor
+    a, b = fit_noise([0.01, 0.1, 1], [1e-6, 1e-8, 1e-10])
+    assert b == 0 and a > 0
+
+
+def measurements(filter_count, autozero, nplcs=(0.1, 1, 10), line_frequency=50):
+    return [{'nplc': nplc, 'filter_count': filter_count, 'autozero': autozero,
+             'noise': float(noise(nplc / line_frequency * filter_count))} for nplc in nplcs]
+
+
+def test_fastest_setting_meeting_the_target_wins():
+    rows = measurements(1, False) + measurements(1, True) + measurements(10, False)
+    # Target 2e-9 V rms needs t = A / (target^2 - B) = 1/3 s of integration
+    setting = choose_setting(rows, 2e-9, line_frequency=50)
+    assert (setting['nplc'], setting['filter_count'], setting['autozero']) == (16.7, 1, False)
+    assert setting['reading_time'] == pytest.approx(16.7 / 50)
+    assert setting['predicted_noise'] <= 2e-9
+
+
+def test_target_below_the_floor_has_no_setting():
+    assert choose_setting(measurements(1, False), 1e-9, line_frequency=50) is None
+
+
+def test_relative_profile_path_is_next_to_the_modules(tmp_path, monkeypatch):
+    import timing
+    from nplc_optimizer import load_profile, save_profile
+    modules = tmp_path / 'modules'
+    modules.mkdir()
+    monkeypatch.setattr(timing, 'HERE', str(modules))
+    monkeypatch.chdir(tmp_path)
+    save_profile({'100 mV': {'nplc': 1}}, 'profile.json')
+    assert (modules / 'profile.json').exists() and not (tmp_path / 'profile.json').exists()
+    assert load_profile('profile.json') == {'100 mV': {'nplc': 1}}
@@ -0,0 +1,47 @@
+import pytest
+
+from config import MEASUREMENT_SETTLE_TIME, POWER_LINE_FREQUENCY
+from parameters import (DC_SWEEP_RULES, DC_SWEEP_SCHEMA, ParameterError, derive_sweep_delay, validate,
+                        validate_grid)
+
+PULSED = dict(start=0, stop=10e-3, num_pulses=11, sweep_type='Linear', voltage_range='100 mV',
+              pulse_width=0.0002, pulse_delay=0.0001, pulse_interval=5, voltage_compliance=10,
+              pulse_off_level=0, num_off_measurements=2, enable_compliance_abort=True)
+
+DC = dict(start=0, stop=10e-3, num_points=11, delay=0.1, voltage_compliance=10, voltage_range='100 mV', nplc=1)
+
+
+def test_sweep_type_is_case_insensitive():
+    assert validate(dict(PULSED, sweep_type='LINEAR'))
+    with pytest.raises(ParameterError, match='logarithmic sweeps'):
+        validate(dict(PULSED, sweep_type='logarithmic'))
+
+
+def test_unknown_sweep_type_is_rejected():
+    with pytest.raises(ParameterError, match='sweep_type must be one of'):
+        validate(dict(PULSED, sweep_type='Staircase'))
+
+
+def test_grid_reports_failing_rows():
+    valid, errors = validate_grid(dict(PULSED, num_pulses=[11, 1, 101]))
+    assert valid.tolist() == [True, False, True]
+    assert list(errors) == [1]
+
+
+def test_sweep_delay_covers_the_filtered_reading():
+    delays = derive_sweep_delay([1, 5], filter_count=[1, 10])
+    assert delays == pytest.approx([1 / POWER_LINE_FREQUENCY + MEASUREMENT_SETTLE_TIME,
+                                    50 / POWER_LINE_FREQUENCY + MEASUREMENT_SETTLE_TIME])
+
+
+def test_dc_delay_shorter_than_the_reading_is_rejected():
+    shortest = float(derive_sweep_delay(5))
+    assert validate(dict(DC, nplc=5, delay=shortest), DC_SWEEP_SCHEMA, DC_SWEEP_RULES)
+    with pytest.raises(ParameterError, match='delay must cover'):
+        validate(dict(DC, nplc=5, delay=shortest * 0.9), DC_SWEEP_SCHEMA, DC_SWEEP_RULES)
+
+
+def test_pulse_interval_below_the_reading_time_is_rejected():
+    with pytest.raises(ParameterError, match='pulse_interval must cover'):
+        validate(dict(PULSED, pulse_interval=0.01))
+    assert validate(dict(PULSED, pulse_interval=0.1))
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from pulse_delta import reduce_pulse_delta
+
+# One low per pulse: highs 1, 2, 3 V and lows 0.1, 0.3, 0.2 V, as high, low, high, low, ...
+READINGS = [1.0, 0.1, 2.0, 0.3, 3.0, 0.2]
+SOURCES = [1e-3, 0.0, 2e-3, 0.0, 3e-3, 0.0]
+# Low steps 0.2 and -0.1: std (ddof=1) 0.15 * sqrt(2), reading noise 0.15
+NOISE = 0.15
+
+
+def test_deltas_subtract_the_mean_of_the_adjacent_lows():
+    columns, noise = reduce_pulse_delta(READINGS, np.arange(6), SOURCES, num_low=1)
+    assert noise == pytest.approx(NOISE)
+    # The first pulse only has a low after it; the others average the lows on both sides
+    assert columns['voltage'] == pytest.approx([1.0 - 0.1, 2.0 - 0.2, 3.0 - 0.25])
+    assert columns['current'] == pytest.approx([1e-3, 2e-3, 3e-3])
+    assert columns['count'].tolist() == [1, 1, 1]
+    assert columns['uncertainty'] == pytest.approx(NOISE * np.sqrt([2, 1.5, 1.5]))
+
+
+def test_steps_average_their_pulses():
+    columns, _ = reduce_pulse_delta(READINGS, np.arange(6), num_low=1, pulses_per_step=3)
+    deltas = [0.9, 1.8, 2.75]
+    assert columns['voltage'] == pytest.approx([np.mean(deltas)])
+    assert columns['std'] == pytest.approx([np.std(deltas, ddof=1)])
+    assert columns['uncertainty'] == pytest.approx([np.std(deltas, ddof=1) / np.sqrt(3)])
+
+
+def test_missing_and_out_of_order_readings_are_placed_by_reading_number():
+    # Reading 3 (the 0.3 V low) is missing and the buffer came back shuffled
+    reading_numbers = [4, 0, 2, 5, 1]
+    readings = [3.0, 1.0, 2.0, 0.2, 0.1]
+    columns, noise = reduce_pulse_delta(readings, reading_numbers, num_low=1)
+    # The gap leaves one low on each side of it: no low-to-low step to estimate the noise from
+    assert np.isnan(noise)
+    assert columns['voltage'] == pytest.approx([1.0 - 0.1, 2.0 - 0.1, 3.0 - 0.2])
+
+
+def test_missing_high_gives_a_nan_step():
+    columns, _ = reduce_pulse_delta([1.0, 0.1, 0.3, 3.0, 0.2], [0, 1, 3, 4, 5], num_low=1)
+    assert np.isnan(columns['voltage'][1])
+    assert columns['count'].tolist() == [1, 0, 1]
+    assert columns['voltage'][[0, 2]] == pytest.approx([0.9, 2.75])
@@ -0,0 +1,30 @@
+import numpy as np
+
+from range_planner import RangePlanner, fit_resistance, range_index, segments
+
+
+def test_segments_follow_the_range_runs():
+    indices = [0] * 12 + [1] * 15 + [2] * 10
+    assert segments(indices, min_points=10) == [(0, 12, '100 mV'), (12, 27, '1 V'), (27, 37, '10 V')]
+
+
+def test_short_excursion_joins_the_larger_neighbour():
+    indices = [0] * 12 + [2] * 3 + [1] * 12
+    assert segments(indices, min_points=10) == [(0, 12, '100 mV'), (12, 27, '10 V')]
+
+
+def test_segments_merge_into_one_range():
+    assert segments([0, 0, 1, 0, 0], min_points=10) == [(0, 5, '1 V')]
+
+
+def test_range_index_keeps_headroom():
+    assert range_index([0.05, 0.07, 0.5, 200], headroom=1.5).tolist() == [0, 1, 1, 3]
+
+
+def test_plan_extrapolates_the_fitted_resistance():
+    planner = RangePlanner(headroom=1.5, min_segment=2)
+    currents = np.linspace(0, 1e-3, 11)
+    planner.observe(currents, 100 * currents)
+    assert abs(fit_resistance(currents, 100 * currents)[0] - 100) < 1e-9
+    predicted = planner.predict([2e-3, 5e-3])
+    np.testing.assert_allclose(predicted, [0.2, 0.5])
@@ -0,0 +1,42 @@
+from run_catalog import RunCatalog
+
+
+def test_find_filters_on_spec_ranges_and_text(tmp_path):
+    with RunCatalog(str(tmp_path / 'runs.sqlite')) as catalog:
+        for stop, voltage_range in ((1e-3, '100 mV'), (3e-3, '100 mV'), (6e-3, '1 V')):
+            catalog.record('pulsed', {'stop': stop, 'voltage_range': voltage_range, 'stop_on': {'voltage': 0.05}})
+        catalog.record('dc', {'stop': 2e-3, 'voltage_range': '100 mV'})
+        assert [run['spec']['stop'] for run in catalog.find(mode='pulsed', stop=(2e-3, 5e-3))] == [3e-3]
+        assert len(catalog.find(stop=(None, 4e-3), voltage_range='100 mV')) == 3
+        assert len(catalog.find(**{'stop_on.voltage': 0.05})) == 3
+
+
+def test_compare_lists_only_differing_parameters(tmp_path):
+    with RunCatalog(str(tmp_path / 'runs.sqlite')) as catalog:
+        first = catalog.record('pulsed', {'stop': 1e-3, 'pulse_width': 2e-4})
+        second = catalog.record('pulsed', {'stop': 2e-3, 'pulse_width': 2e-4})
+        assert catalog.compare([first, second]) == {'stop': [1e-3, 2e-3]}
+
+
+def test_numpy_scan_values_are_catalogued_as_numbers(tmp_path):
+    import numpy as np
+    from scan_runner import grid_design
+    with RunCatalog(str(tmp_path / 'runs.sqlite')) as catalog:
+        for point in grid_design(num_pulses=np.arange(10, 40, 10), stop=np.array([1e-3])):
+            catalog.record('pulsed', dict(point, flag=np.bool_(True), shape=np.array([1, 2])))
+        runs = catalog.find(num_pulses=(15, None))
+        assert sorted(run['spec']['num_pulses'] for run in runs) == [20, 30]
+        assert runs[0]['spec']['flag'] is True and runs[0]['spec']['shape'] == [1, 2]
+
+
+def test_relative_catalog_path_is_next_to_the_modules(tmp_path, monkeypatch):
+    import timing
+    modules = tmp_path / 'modules'
+    modules.mkdir()
+    monkeypatch.setattr(timing, 'HERE', str(modules))
+    monkeypatch.chdir(tmp_path)
+    with RunCatalog('runs.sqlite') as catalog:
+        catalog.record('dc', {'stop': 1e-3})
+    assert (modules / 'runs.sqlite').exists() and not (tmp_path / 'runs.sqlite').exists()
+    with RunCatalog(':memory:') as catalog:
+        assert catalog.find() == []
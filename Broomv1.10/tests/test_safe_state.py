@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("pyvisa")
+
+from safe_state import FAST_2182A, SNAPSHOT_2182A, SNAPSHOT_6221, SafeState
+from visa_io import InstrumentIOError
+
+
+class FakeTest:
+    def __init__(self, values_6221=len(SNAPSHOT_6221), values_2182a=len(SNAPSHOT_2182A)):
+        self.values_6221 = values_6221
+        self.values_2182a = values_2182a
+        self.calls = []
+        self.source = self.meter = self
+
+    def robust_query(self, command):
+        self.calls.append(('6221?', command))
+        return ';'.join(['1'] * self.values_6221)
+
+    def query_2182A(self, command):
+        self.calls.append(('2182A?', command))
+        return ';'.join(['0'] * self.values_2182a)
+
+    def write_batch(self, commands):
+        self.calls.append(('write', tuple(commands)))
+
+    def output_off(self):
+        self.calls.append(('output_off',))
+
+    def log_message(self, message):
+        pass
+
+
+def test_without_fast_settings_only_the_output_is_switched_off(monkeypatch):
+    monkeypatch.setattr('safe_state.time.sleep', lambda seconds: None)
+    test = FakeTest()
+    with SafeState(test):
+        pass
+    assert test.calls == [('output_off',)]
+
+
+def test_fast_settings_are_undone_from_the_snapshot(monkeypatch):
+    monkeypatch.setattr('safe_state.time.sleep', lambda seconds: None)
+    test = FakeTest()
+    with pytest.raises(KeyboardInterrupt):
+        with SafeState(test, FAST_2182A):
+            raise KeyboardInterrupt
+    kinds = [call[0] for call in test.calls]
+    assert kinds == ['6221?', '2182A?', 'write', 'output_off', 'write', 'write']
+    assert test.calls[2][1] == tuple(f'{header} {value}' for header, value in FAST_2182A.items())
+    assert test.calls[-1][1] == tuple(f'{header} 0' for header in SNAPSHOT_2182A)
+
+
+def test_short_snapshot_reply_is_an_error():
+    test = FakeTest(values_2182a=len(SNAPSHOT_2182A) - 1)
+    with pytest.raises(InstrumentIOError, match='2182A snapshot returned'):
+        with SafeState(test, FAST_2182A):
+            pass
+    assert not any(call[0] == 'write' for call in test.calls)
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pytest
+
+from shared_ring import RingReader, SharedRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing(f'broom_test_{os.getpid()}', capacity=8)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def test_write_wraps_around_the_end(ring):
+    reader = RingReader(ring)
+    ring.write(np.arange(6.0))
+    reader.read_copy()
+    ring.write(np.arange(6.0, 10.0))
+    views = reader.read()
+    assert [len(view) for view in views] == [2, 2]
+    assert np.concatenate(views)['voltage'].tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert np.concatenate(views)['reading'].tolist() == [6, 7, 8, 9]
+    assert reader.valid()
+
+
+def test_slow_reader_counts_lost_records(ring):
+    reader = RingReader(ring)
+    ring.write(np.arange(5.0))
+    ring.write(np.arange(5.0, 20.0))
+    data = reader.read_copy()
+    assert reader.lost == 12
+    assert data['voltage'].tolist() == list(np.arange(12.0, 20.0))
+
+
+def test_oversized_write_keeps_the_newest_records(ring):
+    ring.write(np.arange(20.0), current=1e-3)
+    data = RingReader(ring).read_copy()
+    assert data['voltage'].tolist() == list(np.arange(12.0, 20.0))
+    assert np.all(data['current'] == 1e-3)
+
+
+def test_attached_reader_sees_published_records(ring):
+    ring.write([1.0, 2.0])
+    ring.finish()
+    other = SharedRing.attach(ring.name)
+    try:
+        assert other.closed
+        assert RingReader(other).read_copy()['voltage'].tolist() == [1.0, 2.0]
+    finally:
+        other.close()
+
+
+def test_reader_notices_being_lapped(ring):
+    reader = RingReader(ring)
+    ring.write(np.arange(4.0))
+    reader.read()
+    ring.write(np.arange(8.0))
+    assert not reader.valid()
@@ -0,0 +1,31 @@
+import numpy as np
+
+from stop_conditions import first_stop, slope_jump, voltage_threshold
+
+# 1 V/A up to reading 6, then 10 V/A
+CURRENTS = np.arange(11, dtype=float)
+VOLTAGES = np.array([0, 1, 2, 3, 4, 5, 6, 16, 26, 36, 46], dtype=float)
+
+
+def test_slope_jump_fires_at_the_first_steep_reading():
+    assert slope_jump(5, min_points=3).check(CURRENTS, VOLTAGES, 5) == 7
+    assert slope_jump(20, min_points=3).check(CURRENTS, VOLTAGES, 5) is None
+
+
+def test_slope_jump_waits_for_a_baseline():
+    assert slope_jump(5, min_points=3).check(CURRENTS[:3], VOLTAGES[:3], 1) is None
+
+
+def test_repeated_current_levels_do_not_fire():
+    currents = np.array([0, 1, 2, 3, 3, 4], dtype=float)
+    voltages = np.array([0, 1, 2, 3, 3.5, 4], dtype=float)
+    assert slope_jump(5, min_points=3).check(currents, voltages, 3) is None
+
+
+def test_earliest_condition_wins():
+    conditions = [voltage_threshold(20), slope_jump(5, min_points=3)]
+    index, condition = first_stop(conditions, CURRENTS, VOLTAGES, 5)
+    assert (index, condition.name) == (7, 'slope_jump')
+    index, condition = first_stop(conditions[:1], CURRENTS, VOLTAGES, 5)
+    assert (index, condition.name) == (8, 'voltage')
+    assert first_stop(conditions, CURRENTS[:6], VOLTAGES[:6], 3) is None
@@ -0,0 +1,28 @@
+import os
+
+from timing import RunTrace, SweepScheduler, TimingModel
+
+SPEC = dict(num_pulses=11, pulse_width=0.0002, pulse_delay=0.0001, pulse_interval=0.1, num_off_measurements=2)
+
+
+def test_relative_trace_path_is_next_to_the_module():
+    import timing
+    assert RunTrace('trace.jsonl').path == os.path.join(os.path.dirname(os.path.abspath(timing.__file__)),
+                                                        'trace.jsonl')
+
+
+def test_scheduler_balances_benches_longest_first():
+    scheduler = SweepScheduler(['a', 'b'], TimingModel())
+    for name, num_pulses in (('short', 11), ('long', 1001), ('medium', 101)):
+        scheduler.submit(name, dict(SPEC, num_pulses=num_pulses))
+    plan = scheduler.plan()
+    assert [job['name'] for job in plan['a']] == ['long']
+    assert [job['name'] for job in plan['b']] == ['medium', 'short']
+    assert scheduler.makespan() == plan['a'][0]['eta']
+
+
+def test_calibration_fits_the_measured_offset():
+    model = TimingModel()
+    base = model.base(**SPEC)['sweep']
+    model.calibrate([{'params': SPEC, 'phases': {'sweep': base + 0.5}}])
+    assert abs(model.predict(**SPEC)['sweep'] - (base + 0.5)) < 1e-9
@@ -0,0 +1,33 @@
+from trace_buffer import TraceAccumulator, parse_readings
+
+
+def test_plain_and_suffixed_responses_parse_alike():
+    assert parse_readings('+1.5E-03,-2.0E-03,3\n').tolist() == [1.5e-3, -2e-3, 3]
+    assert parse_readings('+1.5E-03VDC,-2.0E-03VDC,+3VDC').tolist() == [1.5e-3, -2e-3, 3]
+    assert len(parse_readings('  ')) == 0
+
+
+def test_accumulator_grows_past_the_expected_count():
+    trace = TraceAccumulator(3)
+    trace.add_response('1,2')
+    assert not trace.full
+    trace.add_response('3,4,5')
+    assert trace.full
+    assert trace.data.tolist() == [1, 2, 3, 4, 5]
+    assert len(trace.buffer) == 6  # doubled, not resized to fit exactly
+    trace.clear()
+    assert len(trace) == 0
+
+
+def test_poll_stops_once_the_expected_readings_arrived():
+    responses = iter(['1,2', '', '3', '4'])
+    trace = TraceAccumulator(3)
+    assert trace.poll(lambda: next(responses), timeout=5, interval=0).tolist() == [1, 2, 3]
+    assert next(responses) == '4'
+
+
+def test_poll_gives_up_at_the_timeout(monkeypatch):
+    ticks = iter(range(100))
+    monkeypatch.setattr('trace_buffer.time.sleep', lambda seconds: None)
+    monkeypatch.setattr('trace_buffer.time.monotonic', lambda: next(ticks))
+    assert TraceAccumulator(3).poll(lambda: '', timeout=3).tolist() == []
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from pulse_delta import deinterleave
+from config import MEASUREMENT_SETTLE_TIME, POWER_LINE_FREQUENCY
+from trigger_timing import analyze_timestamps, expected_interval, min_interval, minimum_interval
+
+
+def pulsed_timestamps(num_pulses, interval, num_low=2, conversion=0.002):
+    # High reading at each pulse, lows a conversion apart after it
+    starts = np.arange(num_pulses) * interval
+    return (starts[:, None] + np.arange(1 + num_low) * conversion).ravel()
+
+
+def test_pulsed_highs_follow_the_pulse_interval():
+    timestamps = pulsed_timestamps(20, 0.1)
+    placed, is_high = deinterleave(timestamps, np.arange(len(timestamps)), 2)
+    report, errors = analyze_timestamps(placed[is_high], expected_interval('pulsed', {'pulse_interval': 0.1}))
+    assert not errors
+    assert report['missed_triggers'][0] == 0
+    assert abs(report['mean_interval'][0] - 0.1) < 1e-12
+
+
+def test_missed_pulse_is_reported():
+    timestamps = np.delete(np.arange(20) * 0.1, 7)
+    report, errors = analyze_timestamps(timestamps, 0.1)
+    assert report['missed_triggers'][0] == 1
+    assert errors[0][0].startswith("1 missed triggers")
+
+
+def test_min_interval_counts_every_conversion_of_a_pulse():
+    conversion = 1 / POWER_LINE_FREQUENCY
+    assert min_interval(1, 1, 0.0002, 0.0001, 3) == pytest.approx(0.0003 + 3 * conversion + MEASUREMENT_SETTLE_TIME)
+    params = {'pulse_width': 0.0002, 'pulse_delay': 0.0001, 'pulse_interval': 0.1, 'num_off_measurements': 2}
+    assert minimum_interval('pulsed', params) == pytest.approx(min_interval(1, 1, 0.0002, 0.0001, 3))
+    assert minimum_interval('dc', {'delay': 0.1}) is None
+
+
+def test_interval_below_the_minimum_is_reported():
+    timestamps = np.arange(20) * 0.01
+    report, errors = analyze_timestamps(timestamps, 0.01, minimum=min_interval(1, readings_per_trigger=3))
+    assert report['failed'][0]
+    assert errors[0] == [f"programmed interval is below the minimum achievable {report['min_interval'][0]:.3g} s"]
@@ -0,0 +1,64 @@
+import pytest
+
+pyvisa = pytest.importorskip("pyvisa")
+
+from visa_io import CircuitBreaker, CircuitOpenError, InstrumentIOError, ResilientIO
+
+TIMEOUT = pyvisa.constants.StatusCode.error_timeout
+
+
+class FlakyInstrument:
+    # Fails the first `failures` writes with a VISA timeout
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.timeout = 1000
+        self.writes = []
+        self.clears = 0
+
+    def write(self, command):
+        if self.failures:
+            self.failures -= 1
+            raise pyvisa.errors.VisaIOError(TIMEOUT)
+        self.writes.append(command)
+
+    def clear(self):
+        self.clears += 1
+
+
+def test_breaker_opens_at_threshold_and_half_opens(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('visa_io.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(threshold=2, reset_after=10)
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    now[0] = 10.0
+    assert not breaker.is_open  # half-open probe
+    breaker.record_success()
+    assert breaker.failures == 0 and breaker.opened_at is None
+
+
+def test_timed_out_write_is_recovered_and_retried():
+    instrument = FlakyInstrument(failures=1)
+    io = ResilientIO(log_message=lambda message: None, retries=3, breaker=CircuitBreaker(threshold=5))
+    io.write(instrument, ':OUTP ON')
+    # The retry went through after a device clear and *CLS; the budget is restored
+    assert instrument.writes == ['*CLS', ':OUTP ON']
+    assert instrument.clears == 1
+    assert instrument.timeout == 1000
+
+
+def test_exhausted_retries_raise():
+    io = ResilientIO(log_message=lambda message: None, retries=2, breaker=CircuitBreaker(threshold=5))
+    with pytest.raises(InstrumentIOError, match='Failed to complete'):
+        io.write(FlakyInstrument(failures=10), ':OUTP ON')
+
+
+def test_open_breaker_refuses_without_touching_the_instrument():
+    breaker = CircuitBreaker(threshold=1, reset_after=60)
+    breaker.record_failure()
+    instrument = FlakyInstrument()
+    with pytest.raises(CircuitOpenError):
+        ResilientIO(log_message=lambda message: None, breaker=breaker).write(instrument, ':OUTP ON')
+    assert instrument.writes == []
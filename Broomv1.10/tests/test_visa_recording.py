@@ -0,0 +1,90 @@
+import pytest
+
+pyvisa = pytest.importorskip("pyvisa")
+
+from visa_recording import ReplayMismatch, SessionPlayer, SessionRecorder
+
+
+class FakeResource:
+    interface_type = 1
+
+    def __init__(self):
+        self.polls = iter(['0', '0', '2'])
+        self.timeout = 1000
+
+    def write(self, command):
+        return len(command)
+
+    def query(self, command):
+        if command == 'STAT:OPER:EVEN?':
+            return next(self.polls)
+        if command == ':SYST:ERR?':
+            raise pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+        return 'KEITHLEY INSTRUMENTS INC.,MODEL 6221'
+
+    def query_binary_values(self, command, *args, **kwargs):
+        return [0.5, -1.25, 3e-3]
+
+    def close(self):
+        pass
+
+
+class FakeResourceManager:
+    def open_resource(self, address):
+        return FakeResource()
+
+    def close(self):
+        pass
+
+
+def session(instrument):
+    instrument.write('*CLS')
+    identity = instrument.query('*IDN?')
+    while instrument.query('STAT:OPER:EVEN?') == '0':
+        pass
+    return identity, list(instrument.query_binary_values('TRAC:DATA? 1,3'))
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    monkeypatch.setattr(pyvisa, 'ResourceManager', FakeResourceManager)
+    path = str(tmp_path / 'session.jsonl.gz')
+    recorder = SessionRecorder(path)
+    instrument = recorder.open('GPIB0::12::INSTR')
+    recorded = session(instrument)
+    with pytest.raises(pyvisa.errors.VisaIOError):
+        instrument.query(':SYST:ERR?')
+    instrument.close()
+    recorder.close()
+    return path, recorded
+
+
+def test_replay_serves_the_recorded_session(recording):
+    path, (identity, data) = recording
+    player = SessionPlayer(path, speed=None)
+    instrument = player.open('GPIB0::12::INSTR')
+    assert instrument.interface_type == 1
+    replayed_identity, replayed_data = session(instrument)
+    assert replayed_identity == identity
+    # Trace blocks are stored as float32
+    assert replayed_data == pytest.approx(data, rel=1e-6)
+    with pytest.raises(pyvisa.errors.VisaIOError):
+        instrument.query(':SYST:ERR?')
+    assert player.finished
+
+
+def test_fewer_polls_skip_the_recorded_extra_ones(recording):
+    path, _ = recording
+    instrument = SessionPlayer(path, speed=None).open('GPIB0::12::INSTR')
+    instrument.write('*CLS')
+    instrument.query('*IDN?')
+    assert instrument.query('STAT:OPER:EVEN?') == '0'
+    # The driver goes straight on to the readback: the two recorded polls after it are skipped
+    assert list(instrument.query_binary_values('TRAC:DATA? 1,3')) == pytest.approx([0.5, -1.25, 3e-3], rel=1e-6)
+
+
+def test_diverging_driver_raises_replay_mismatch(recording):
+    path, _ = recording
+    instrument = SessionPlayer(path, speed=None).open('GPIB0::12::INSTR')
+    with pytest.raises(ReplayMismatch, match="driver sent write '\\*RST', recording has write '\\*CLS'"):
+        instrument.write('*RST')
@@ -0,0 +1,126 @@
+# timing.py
+#
+# Sweep runtime model. A run is split into phases (setup, arm, sweep,
+# readback); each phase has a physical base estimate computed from the sweep
+# spec, and a linear correction (scale, offset) fitted from measured runs in
+# the run trace. The scheduler uses the same predictions to spread queued jobs
+# across benches; ScanRunner uses it for the ETA of the points still to run.
+
+import json
+import os
+import time
+import numpy as np
+from config import *
+
+PHASES = ('setup', 'arm', 'sweep', 'readback')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def anchored(path):
+    # Relative trace paths live next to the Broom modules, not in whatever
+    # directory a script happens to be started from
+    return path if os.path.isabs(path) else os.path.join(HERE, path)
+
+
+class RunTrace:
+    # Append-only JSON-lines record of measured phase durations
+    def __init__(self, path=RUN_TRACE_FILE):
+        self.path = anchored(path)
+        self.marks = {}
+        self.phase = None
+        self.phase_start = None
+
+    def begin(self, phase):
+        now = time.perf_counter()
+        if self.phase is not None:
+            self.marks[self.phase] = now - self.phase_start
+        self.phase = phase
+        self.phase_start = now
+
+    def end(self):
+        self.begin(None)
+        marks, self.marks = self.marks, {}
+        return marks
+
+    def record(self, params, durations):
+        with open(self.path, 'a', encoding="utf-8") as f:
+            f.write(json.dumps({'time': time.time(), 'params': params, 'phases': durations}) + "\n")
+
+    def load(self, limit=TIMING_HISTORY):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return records[-limit:]
+
+
+class TimingModel:
+    def __init__(self, line_frequency=POWER_LINE_FREQUENCY):
+        self.line_frequency = line_frequency
+        # Per-phase (scale, offset) applied to the base estimate
+        self.correction = {phase: (1.0, 0.0) for phase in PHASES}
+
+    def base(self, num_pulses, pulse_width, pulse_delay, pulse_interval, num_off_measurements=2,
+             nplc=DEFAULT_NPLC, filter_count=1, reset=True, **unused):
+        # One 2182A conversion for the pulse high plus one per low measurement
+        conversion = nplc / self.line_frequency * max(filter_count, 1)
+        cycle = pulse_delay + pulse_width + (1 + num_off_measurements) * conversion
+        readings = num_pulses * (1 + num_off_measurements)
+        return {
+            'setup': (SETUP_RESET_TIME if reset else 0.0) + SETUP_COMMANDS * SETUP_DELAY,
+            'arm': SETUP_DELAY + QUERY_DELAY,
+            'sweep': num_pulses * max(pulse_interval, cycle),
+            'readback': readings * READBACK_TIME_PER_READING,
+        }
+
+    def predict(self, **spec):
+        base = self.base(**spec)
+        phases = {}
+        for phase in PHASES:
+            scale, offset = self.correction[phase]
+            phases[phase] = max(0.0, scale * base[phase] + offset)
+        phases['total'] = sum(phases[phase] for phase in PHASES)
+        return phases
+
+    def calibrate(self, records):
+        # Least-squares fit of measured = scale * base + offset, per phase
+        for phase in PHASES:
+            base, measured = [], []
+            for record in records:
+                if phase in record['phases']:
+                    base.append(self.base(**record['params'])[phase])
+                    measured.append(record['phases'][phase])
+            if len(measured) >= 3 and np.ptp(base) > 0:
+                scale, offset = np.polyfit(base, measured, 1)
+                self.correction[phase] = (float(scale), float(offset))
+            elif measured:
+                # Not enough spread to fit a slope: keep scale, fix the offset
+                self.correction[phase] = (1.0, float(np.mean(np.subtract(measured, base))))
+        return self
+
+    @classmethod
+    def from_trace(cls, trace=None):
+        return cls().calibrate((trace or RunTrace()).load())
+
+
+class SweepScheduler:
+    # Longest-predicted-job-first assignment to the least loaded bench
+    def __init__(self, benches, model=None):
+        self.benches = list(benches)
+        self.model = model or TimingModel.from_trace()
+        self.jobs = []
+
+    def submit(self, name, spec):
+        self.jobs.append((name, spec, self.model.predict(**spec)['total']))
+
+    def plan(self):
+        load = {bench: 0.0 for bench in self.benches}
+        queues = {bench: [] for bench in self.benches}
+        for name, spec, duration in sorted(self.jobs, key=lambda job: job[2], reverse=True):
+            bench = min(load, key=load.get)
+            queues[bench].append({'name': name, 'spec': spec, 'start': load[bench], 'eta': load[bench] + duration})
+            load[bench] += duration
+        return queues
+
+    def makespan(self):
+        return max((queue[-1]['eta'] for queue in self.plan().values() if queue), default=0.0)
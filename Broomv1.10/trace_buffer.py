@@ -0,0 +1,79 @@
+# trace_buffer.py
+#
+# Preallocated accumulator for trace readbacks. Readers used to grow their
+# result with np.append on every response (a full copy each time) and scan
+# each response with a regex; this keeps one array sized from the expected
+# point count, parses responses with NumPy's C parser, and tracks the fill
+# level without copying.
+
+import re
+import time
+import warnings
+import numpy as np
+
+READING_PATTERN = re.compile(r'[+-]?[0-9.]+(?:[Ee][+-]?[0-9]+)?')
+
+
+def parse_readings(response):
+    # Fast path for clean comma-separated numbers; fall back to a regex when
+    # the instrument adds units or status suffixes (e.g. "+1.2E-03VDC").
+    response = response.strip()
+    if not response:
+        return np.empty(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', DeprecationWarning)
+            return np.fromstring(response, sep=',')
+    except (ValueError, DeprecationWarning):
+        return np.array(READING_PATTERN.findall(response), dtype=float)
+
+
+class TraceAccumulator:
+    def __init__(self, expected):
+        self.expected = int(expected)
+        self.buffer = np.empty(max(self.expected, 1))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def full(self):
+        return self.count >= self.expected
+
+    @property
+    def data(self):
+        # A view, not a copy; take .copy() if the accumulator will be reused
+        return self.buffer[:self.count]
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        end = self.count + len(values)
+        if end > len(self.buffer):
+            # More than announced (e.g. extra status readings): grow geometrically
+            grown = np.empty(max(end, 2 * len(self.buffer)))
+            grown[:self.count] = self.buffer[:self.count]
+            self.buffer = grown
+        self.buffer[self.count:end] = values
+        self.count = end
+        return len(values)
+
+    def add_response(self, response):
+        return self.extend(parse_readings(response))
+
+    def clear(self):
+        self.count = 0
+
+    def poll(self, fetch, timeout, interval=0.02, max_interval=0.5):
+        # Calls fetch() until the expected number of readings has arrived or
+        # timeout seconds have passed. Re-polls immediately while data keeps
+        # coming and backs off only when a response was empty.
+        deadline = time.monotonic() + timeout
+        wait = interval
+        while not self.full and time.monotonic() < deadline:
+            if self.add_response(fetch()):
+                wait = interval
+            else:
+                time.sleep(wait)
+                wait = min(2 * wait, max_interval)
+        return self.data
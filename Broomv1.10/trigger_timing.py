@@ -0,0 +1,116 @@
+# trigger_timing.py
+#
+# Checks the TST timestamps of a run against the interval the 6221 was
+# programmed to trigger at. Intervals are compared with the programmed one to
+# find missed triggers and gaps, and the timestamps are fitted to the
+# programmed trigger grid to measure jitter and drift between the 6221 output
+# trigger and the readings. Everything is computed over a (runs x points)
+# array at once, so a whole scan is checked in one call. min_interval gives the
+# shortest interval the trigger link can keep up with for a 2182A setting, so
+# programmed intervals below it are rejected up front (see parameters.py).
+
+import warnings
+import numpy as np
+from config import *
+
+
+def conversion_time(nplc, filter_count=1, line_frequency=POWER_LINE_FREQUENCY):
+    return np.asarray(nplc, dtype=float) / line_frequency * np.maximum(filter_count, 1)
+
+
+def min_interval(nplc, filter_count=1, pulse_width=0.0, source_delay=0.0, readings_per_trigger=1,
+                 line_frequency=POWER_LINE_FREQUENCY):
+    # Source delay and pulse, then every conversion of one trigger (the pulse
+    # high plus its lows), plus the settling margin
+    conversions = np.asarray(readings_per_trigger) * conversion_time(nplc, filter_count, line_frequency)
+    return source_delay + pulse_width + conversions + MEASUREMENT_SETTLE_TIME
+
+
+def expected_interval(mode, params, line_frequency=POWER_LINE_FREQUENCY):
+    # Programmed time between consecutive stored readings for each mode
+    if mode == 'pulsed':
+        return params['pulse_interval']
+    if mode == 'dc':
+        return params['delay'] + conversion_time(params.get('nplc', DEFAULT_NPLC), 1, line_frequency)
+    if mode in ('delta', 'dcon'):
+        # Each delta reading is a high and a low conversion, each after the source delay;
+        # the repeating filter stores one averaged reading per filter_count of them
+        conversion = conversion_time(params['integration_NPLCs'], 1, line_frequency)
+        repeating = params.get('filter_type') == 2 or params.get('filter_on', False)
+        return 2 * (params['delay'] + conversion) * (params['filter_count'] if repeating else 1)
+    raise ValueError(f"Unknown measurement mode: {mode}")
+
+
+def minimum_interval(mode, params, line_frequency=POWER_LINE_FREQUENCY):
+    # Shortest interval the programmed pulse allows; None for the modes whose
+    # interval already follows from the delay and NPLC
+    if mode != 'pulsed':
+        return None
+    return min_interval(params.get('nplc', DEFAULT_NPLC), 1, params['pulse_width'], params['pulse_delay'],
+                        1 + params.get('num_off_measurements', 0), line_frequency)
+
+
+def as_runs(timestamps):
+    # One run (1-D) or several runs of possibly different lengths -> nan-padded 2-D array
+    if len(timestamps) and np.ndim(timestamps[0]) == 0:
+        return np.asarray(timestamps, dtype=float)[np.newaxis, :]
+    length = max(len(run) for run in timestamps)
+    runs = np.full((len(timestamps), length), np.nan)
+    for i, run in enumerate(timestamps):
+        runs[i, :len(run)] = run
+    return runs
+
+
+def analyze_timestamps(timestamps, expected, tolerance=TIMING_TOLERANCE, minimum=None):
+    """Check the timestamps of one or more runs against the programmed interval.
+
+    expected is the programmed interval, one value or one per run; minimum,
+    if given, is the shortest achievable one (min_interval) and runs
+    programmed below it fail. Returns (report, errors): report holds per-run
+    arrays, errors maps the index of each run whose timing budget failed to
+    its list of messages.
+    """
+    runs = as_runs(timestamps)
+    expected = np.broadcast_to(np.asarray(expected, dtype=float), (len(runs),))[:, np.newaxis]
+    intervals = np.diff(runs, axis=1)
+    with warnings.catch_warnings():
+        # Short or all-nan runs give empty means; they show up as nan
+        warnings.simplefilter('ignore', RuntimeWarning)
+        # Number of programmed periods each interval spans; >1 means missed triggers
+        periods = np.maximum(np.round(intervals / expected), 1)
+        missed = np.where(intervals >= MISSED_TRIGGER_FACTOR * expected, periods - 1, 0)
+        regular = np.where(missed == 0, intervals, np.nan)
+        # Fit the readings to the programmed trigger grid t0 + k * expected,
+        # counting missed triggers so one gap does not shift every later point
+        index = np.concatenate([np.zeros((len(runs), 1)), np.nancumsum(periods, axis=1)], axis=1)
+        residual = runs - index * expected
+        residual -= np.nanmedian(residual, axis=1, keepdims=True)
+        report = {
+            'points': np.count_nonzero(~np.isnan(runs), axis=1),
+            'mean_interval': np.nanmean(regular, axis=1),
+            'interval_jitter': np.nanstd(regular, axis=1),
+            'trigger_jitter': np.sqrt(np.nanmean(residual ** 2, axis=1)),
+            'max_deviation': np.nanmax(np.abs(residual), axis=1),
+            'missed_triggers': np.nansum(missed, axis=1).astype(int),
+            'gaps': np.count_nonzero(missed > 0, axis=1),
+        }
+    report['drift'] = report['mean_interval'] / expected[:, 0] - 1
+    report['min_interval'] = np.broadcast_to(np.asarray(np.nan if minimum is None else minimum, dtype=float),
+                                             (len(runs),)).copy()
+
+    errors = {}
+    checks = [
+        (report['missed_triggers'] > 0, "{missed_triggers} missed triggers in {gaps} gap(s)"),
+        (report['max_deviation'] > tolerance * expected[:, 0],
+         "readings deviate up to {max_deviation:.3g} s from the programmed trigger grid"),
+        (np.abs(report['drift']) > tolerance, "mean interval is off by {drift:+.1%}"),
+        (expected[:, 0] < report['min_interval'],
+         "programmed interval is below the minimum achievable {min_interval:.3g} s"),
+    ]
+    for failed, message in checks:
+        for run in np.flatnonzero(failed):
+            values = {name: column[run] for name, column in report.items()}
+            errors.setdefault(int(run), []).append(message.format(**values))
+    report['failed'] = np.zeros(len(runs), dtype=bool)
+    report['failed'][list(errors)] = True
+    return report, errors
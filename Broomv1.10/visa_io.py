@@ -0,0 +1,116 @@
+# visa_io.py
+#
+# Shared I/O resilience layer for the VISA transport. Every operation runs
+# under a timeout budget for its class (setup, query, bulk transfer) and the
+# instrument's own timeout is restored afterwards. Failed attempts back off
+# exponentially with jitter, timeouts trigger a device clear + *CLS so the
+# next attempt does not read a stale response, and a circuit breaker fails
+# fast once the instrument has stopped answering altogether.
+
+import random
+import time
+from contextlib import contextmanager
+import pyvisa
+from config import *
+
+
+class InstrumentIOError(Exception):
+    pass
+
+
+class CircuitOpenError(InstrumentIOError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, reset_after=BREAKER_RESET_TIME):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        if self.opened_at is None:
+            return False
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            # Half-open: let one attempt through to probe the link
+            return False
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def reset(self):
+        self.record_success()
+
+
+class ResilientIO:
+    def __init__(self, log_message=print, retries=IO_RETRIES, breaker=None):
+        self.log_message = log_message
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+
+    @contextmanager
+    def timeout_budget(self, instrument, operation):
+        previous = instrument.timeout
+        instrument.timeout = TIMEOUT_BUDGETS[operation]
+        try:
+            yield
+        finally:
+            instrument.timeout = previous
+
+    def backoff(self, attempt):
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+        time.sleep(random.uniform(0, delay))
+
+    def recover(self, instrument):
+        # Flush whatever is left in the I/O buffers and clear the status
+        # registers, otherwise the next read returns the stale reply.
+        try:
+            instrument.clear()
+            instrument.write('*CLS')
+        except pyvisa.errors.VisaIOError as e:
+            self.log_message(f"Recovery after timeout failed: {str(e)}")
+
+    def call(self, instrument, operation, description, function, *args):
+        if self.breaker.is_open:
+            raise CircuitOpenError(f"Instrument not responding, refusing '{description}'")
+        last_error = None
+        for attempt in range(self.retries):
+            try:
+                with self.timeout_budget(instrument, operation):
+                    result = function(*args)
+                self.breaker.record_success()
+                return result
+            except pyvisa.errors.VisaIOError as e:
+                last_error = e
+                self.breaker.record_failure()
+                self.log_message(f"I/O error on '{description}' (attempt {attempt + 1}/{self.retries}): {str(e)}")
+                if e.error_code == pyvisa.constants.StatusCode.error_timeout:
+                    self.recover(instrument)
+                if self.breaker.is_open:
+                    raise CircuitOpenError(f"Instrument not responding, giving up on '{description}'") from e
+                self.backoff(attempt)
+        raise InstrumentIOError(f"Failed to complete '{description}': {str(last_error)}") from last_error
+
+    def write(self, instrument, command, operation='setup'):
+        return self.call(instrument, operation, command, instrument.write, command)
+
+    def query(self, instrument, command, operation='query'):
+        response = self.call(instrument, operation, command, instrument.query, command).strip()
+        if not response:
+            raise InstrumentIOError(f"Empty response for query: {command}")
+        return response
+
+    def query_ascii_values(self, instrument, command, operation='bulk'):
+        response = self.call(instrument, operation, command, instrument.query_ascii_values, command)
+        if not response:
+            raise InstrumentIOError(f"Empty response for query: {command}")
+        return response
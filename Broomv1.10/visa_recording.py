@@ -0,0 +1,223 @@
+# visa_recording.py
+#
+# Record/replay of instrument sessions. A SessionRecorder wraps the VISA
+# resources K6221 opens and logs every write, query, response payload and
+# call duration to a gzipped JSON-lines file; binary trace blocks are kept
+# as base64 float32. A SessionPlayer serves the recorded responses back to
+# the same driver code at the original speed, faster, or with no delay, so
+# driver changes can be benchmarked and regression-tested offline against
+# real instrument behaviour.
+#
+#   source.opener = SessionRecorder(path).open      # live bench, recording
+#   source.opener = SessionPlayer(path, speed).open  # no bench needed
+#
+# Replay checks each call against the recording and raises ReplayMismatch
+# when the driver diverges. Status polls are the one exception: a driver
+# that polls more often than the recorded session gets the last answer
+# again, and one that polls less often skips the extra recorded polls.
+
+import base64
+import gzip
+import json
+import time
+import numpy as np
+import pyvisa
+from config import *
+
+RECORDING_VERSION = 1
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+def encode_binary(values):
+    return base64.b64encode(np.asarray(values, dtype='<f4').tobytes()).decode('ascii')
+
+
+def decode_binary(text):
+    return np.frombuffer(base64.b64decode(text), dtype='<f4').astype(float)
+
+
+class SessionRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.started = None
+        self.events = 0
+
+    def open(self, address):
+        # K6221.opener: a real resource, wrapped
+        if self.file is None:
+            self.file = gzip.open(self.path, 'wt', encoding="utf-8")
+            self.started = time.perf_counter()
+            self.rm = pyvisa.ResourceManager()
+        resource = self.rm.open_resource(address)
+        self.log({'op': 'open', 'address': address,
+                  'interface_type': int(getattr(resource, 'interface_type', 0) or 0), 'version': RECORDING_VERSION})
+        return RecordingInstrument(resource, self)
+
+    def log(self, event):
+        event['t'] = round(time.perf_counter() - self.started, 6)
+        self.file.write(json.dumps(event) + "\n")
+        self.events += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.rm.close()
+
+
+class RecordingInstrument:
+    # Forwards to the real resource; calls that talk to the instrument are logged
+    def __init__(self, resource, recorder):
+        object.__setattr__(self, 'resource', resource)
+        object.__setattr__(self, 'recorder', recorder)
+
+    def __getattr__(self, name):
+        return getattr(self.resource, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resource, name, value)
+
+    def call(self, op, command, function, *args, binary=False):
+        started = time.perf_counter()
+        event = {'op': op, 'cmd': command}
+        try:
+            result = function(*args)
+        except pyvisa.errors.VisaIOError as e:
+            event.update(dt=round(time.perf_counter() - started, 6), error=int(e.error_code))
+            self.recorder.log(event)
+            raise
+        event['dt'] = round(time.perf_counter() - started, 6)
+        if binary:
+            event['bin'] = encode_binary(result)
+        elif result is not None and op != 'write':
+            event['resp'] = result if isinstance(result, str) else list(result)
+        self.recorder.log(event)
+        return result
+
+    def write(self, command):
+        return self.call('write', command, self.resource.write, command)
+
+    def query(self, command):
+        return self.call('query', command, self.resource.query, command)
+
+    def query_ascii_values(self, command, *args, **kwargs):
+        return self.call('query_ascii', command, lambda: self.resource.query_ascii_values(command, *args, **kwargs))
+
+    def query_binary_values(self, command, *args, **kwargs):
+        return self.call('query_binary', command, lambda: self.resource.query_binary_values(command, *args, **kwargs),
+                         binary=True)
+
+    def wait_for_srq(self, timeout=None):
+        return self.call('srq', None, self.resource.wait_for_srq, timeout)
+
+    def clear(self):
+        return self.call('clear', None, self.resource.clear)
+
+    def close(self):
+        self.recorder.log({'op': 'close'})
+        self.resource.close()
+
+
+def load_recording(path):
+    with gzip.open(path, 'rt', encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class SessionPlayer:
+    def __init__(self, path, speed=1.0):
+        # speed: 1 replays instrument time as recorded, 10 ten times faster,
+        # None without any delay
+        self.events = load_recording(path)
+        self.speed = speed
+        self.position = 0
+        self.last = None
+        self.waited = 0.0
+
+    def open(self, address):
+        # K6221.opener
+        event = self.next_event('open', None)
+        return ReplayInstrument(self, event.get('interface_type', 0))
+
+    def peek(self):
+        # Recorded closes carry no response; the driver need not repeat them
+        while self.position < len(self.events) and self.events[self.position]['op'] == 'close':
+            self.position += 1
+        return self.events[self.position] if self.position < len(self.events) else None
+
+    @staticmethod
+    def matches(event, op, command):
+        return event is not None and event['op'] == op and (op == 'open' or event.get('cmd') == command)
+
+    def repeats_last(self, op, command):
+        return op in ('query', 'query_ascii') and self.matches(self.last, op, command)
+
+    def next_event(self, op, command):
+        event = self.peek()
+        if not self.matches(event, op, command):
+            if self.repeats_last(op, command):
+                # The driver polls more often than the recording did
+                event = self.last
+            else:
+                # ... or less often: drop the recorded extra polls
+                while event is not None and self.repeats_last(event['op'], event.get('cmd')):
+                    self.position += 1
+                    event = self.peek()
+                if not self.matches(event, op, command):
+                    expected = f"{event['op']} {event.get('cmd')!r}" if event else "the end of the recording"
+                    raise ReplayMismatch(f"Replay diverged at event {self.position}: driver sent {op} "
+                                         f"{command!r}, recording has {expected}")
+                self.position += 1
+        else:
+            self.position += 1
+        self.last = event
+        if self.speed and event.get('dt'):
+            time.sleep(event['dt'] / self.speed)
+            self.waited += event['dt'] / self.speed
+        return event
+
+    def respond(self, op, command):
+        event = self.next_event(op, command)
+        if 'error' in event:
+            raise pyvisa.errors.VisaIOError(event['error'])
+        if 'bin' in event:
+            return decode_binary(event['bin'])
+        return event.get('resp')
+
+    @property
+    def finished(self):
+        return self.peek() is None
+
+
+class ReplayInstrument:
+    def __init__(self, player, interface_type=0):
+        self.player = player
+        self.interface_type = interface_type
+        self.timeout = TIMEOUT
+        self.write_termination = '\n'
+        self.read_termination = '\n'
+
+    def write(self, command):
+        self.player.respond('write', command)
+        return len(command)
+
+    def query(self, command):
+        return self.player.respond('query', command)
+
+    def query_ascii_values(self, command, *args, **kwargs):
+        return self.player.respond('query_ascii', command)
+
+    def query_binary_values(self, command, *args, **kwargs):
+        return self.player.respond('query_binary', command)
+
+    def wait_for_srq(self, timeout=None):
+        return self.player.respond('srq', None)
+
+    def clear(self):
+        return self.player.respond('clear', None)
+
+    def close(self):
+        pass
@@ -4,7 +4,6 @@ import pyvisa
 import time
 import numpy as np
 from config import *
-from sweep_functions import *
 import csv
 import datetime
 import re
@@ -257,7 +256,8 @@ class PulsedIVTest:
 
     def abort_sweep(self):
         self.instrument.write(':SOUR:SWE:ABOR')
-        time.sleep(4)
+        self.instrument.write(':OUTP OFF')
+        time.sleep(0.1)
     
     def arm_sweep(self):
         self.instrument.write(':SOUR:PDEL:ARM')
@@ -395,9 +395,10 @@ class PulsedIVTest:
         time.sleep(0.1)
 
     def undo_tryfast(self):
-        self.instrument.write(':SYST:COMM:SERIal:SEND ":DISP:ENAB ON"')
-        time.sleep(0.1)
-        self.instrument.write(':SYST:COMM:SERIal:SEND ":SYST:AZER:STAT ON"') # auto zero on
+        # Put back everything tryfast changed (2182A *RST values), in one batch
+        self.instrument.write(':SYST:COMM:SERIal:SEND ":DISP:ENAB ON;:SYST:AZER:STAT ON;'
+                              ':SENS:VOLT:CHAN1:DFIL:STAT ON;:SENS:VOLT:CHAN1:LPAS:STAT OFF;'
+                              ':TRIG:DEL:AUTO ON;:SENS:VOLT:DC:DIG 8"')
         time.sleep(0.1)
 
     def runDCSweep(self):
@@ -477,7 +478,11 @@ class PulsedIVTest:
         print(f'Data 2182A: {qdata}')
 
     def getDCData(self):
-        current = [0,0.001,0.002,0.003,0.004,0.005,0.006,0.007,0.008,0.009,0.01]
+        # Pair the readings with the staircase the 6221 is actually programmed with
+        start = float(self.instrument.query('sour:curr:star?'))
+        stop = float(self.instrument.query('sour:curr:stop?'))
+        points = int(float(self.instrument.query('sour:swe:poin?')))
+        current = np.linspace(start, stop, points)
         self.instrument.write(':SYST:COMM:SERIal:SEND ":trac:data?"')
         time.sleep(0.2)
         data = str(self.instrument.query(':SYST:COMM:SERIal:ENT?'))
@@ -490,6 +495,7 @@ class PulsedIVTest:
         #print(f'Newdata: {newdata}')
         voltage = newdata[0::2]
         timestamp = newdata[1::2]
+        current = current[:len(voltage)]
 
         for v, t, c in zip(voltage, timestamp, current):
             print(f'Voltage: {v}, Timestamp: {t}, Current: {c}')
@@ -563,15 +569,20 @@ class PulsedIVTest:
         self.setupDCSweep()
         time.sleep(1)
         self.tryfast()
-        #self.verifyDCSweepSetup()
-        self.armDCSweep()
-        time.sleep(2)
-        self.runDCSweep()
-        time.sleep(2)
-        #self.getDCData()
-        #self.printDCData()
+        try:
+            #self.verifyDCSweepSetup()
+            self.armDCSweep()
+            time.sleep(2)
+            self.runDCSweep()
+            time.sleep(2)
+            #self.getDCData()
+            #self.printDCData()
+        finally:
+            # Also on errors and Ctrl-C, and before the blocking plot window
+            self.abortDCSweep()
+            self.instrument.write(':OUTP OFF')
+            self.undo_tryfast()
         self.graphDCData()
-        self.undo_tryfast()
         self.close()
 
     def runPulsedIVProgram(self):
@@ -53,7 +53,7 @@ def experiment_setup(instrument, parameters, start_time):
     if (filter_count < 2 or filter_count > 300) and filter_type != 0:
         print("If filter is enabled, filter count must be in range [2, 300]")
         invalid_parameters = True
-    if voltage_range not in [0.01, 0.1, 1, 10 or 100]:
+    if voltage_range not in [0.01, 0.1, 1, 10, 100]:
         print("Voltage range must be 0.01, 0.1, 1, 10, or 100")
         invalid_parameters = True
     if delay < 1e-3 or delay > 9999.999:
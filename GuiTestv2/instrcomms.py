@@ -202,13 +202,18 @@ class Communications:
         Returns:
             (str): The requested information returned from the target
             instrument.
+
+        Raises:
+            visa.VisaIOError: The query failed or timed out. An empty string\
+                is indistinguishable from a real reply, so the error is \
+                    re-raised after being printed.
         """
-        response = ""
         try:
             if self._echo_cmds is True:
                 print(command)
             response = self._instrument_object.query(command).rstrip()
         except visa.VisaIOError as visaerr:
             print(f"{visaerr}")
+            raise
 
         return response
@@ -18,6 +18,7 @@ import re
 import logging
 import pyvisa as visa
 from keithley2600 import Keithley2600
+from trace_buffer import TraceAccumulator
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import (
     FigureCanvasTkAgg,
@@ -32,6 +33,7 @@ SAVED_PARAMETERS_FILENAME = ("sweep_parameters.txt")
 class K6221():
     def __init__(self):
         self.K6221Address=INSTRUMENT_RESOURCE_STRING_6221
+        self.listHash = None ## hash of the sweep list currently loaded in the 6221
         self.connected = self.connect()
         self.sm.write_termination='\n'
         self.sm.read_termination='\n'
@@ -146,11 +148,7 @@ class K6221():
         self.sm.write(':TRAC:FEED:CONT NEXT') ### reset 2182
         self.sm.write(':TRAC:POIN ' + str(tPoints)) 
         if pulse:
-            self.sm.write('SOUR:LIST:CURR ' + str(start)) ## clears the list and adds 0
-            self.sm.write('SOUR:LIST:DEL ' + str(pPeriod)) ## clears the list and adds 0
-            for i in range(1,tPoints):
-                self.sm.write('SOUR:LIST:CURR:APP ' + str(sweepList[i]))
-                self.sm.write('SOUR:LIST:DEL:APP ' + str(pPeriod))
+            self.uploadList(sweepList,pPeriod)
             self.sm.write(':SOUR:SWE:RANG BEST') # limit set to the highest sweep value
            
             self.sm.write(':SOUR:PDEL:WIDT ' + str(pWidth)) 
@@ -165,11 +163,7 @@ class K6221():
             self.sm.write('SOUR:SWE:ABOR')
             values=self.getTraceData('1','I',tPoints)
         else: ### normal sweeping
-            self.sm.write('SOUR:LIST:CURR ' + str(start)) ## clears the list and adds 0
-            self.sm.write('SOUR:LIST:DEL ' + str(stepPeriod)) ## clears the list and adds 0
-            for i in range(1,tPoints):
-                self.sm.write('SOUR:LIST:CURR:APP ' + str(sweepList[i]))
-                self.sm.write('SOUR:LIST:DEL:APP ' + str(stepPeriod))
+            self.uploadList(sweepList,stepPeriod)
             self.sm.write(':SOUR:SWE:RANG BEST') # limit set to the highest sweep value
             self.sm.write(':TRIG:SOUR TLINK')
             self.sm.write(':TRIG:DIR SOUR')
@@ -214,6 +208,22 @@ class K6221():
 
         return measuredValues
 
+    def uploadList(self,sweepList,delay):
+        ### send the lists in comma-joined blocks instead of two writes per point
+        delays = np.full(len(sweepList),float(delay))
+        if self.listHash == hash((sweepList.tobytes(),delays.tobytes())):
+            logging.info('sweep list already loaded, skipping upload')
+            return
+        for comm,values in (('SOUR:LIST:CURR',sweepList),('SOUR:LIST:DEL',delays)):
+            for i in range(0,len(values),100): ## 100 values keeps each write inside the input buffer
+                block = ','.join('%.6e' % v for v in values[i:i+100])
+                self.sm.write((comm if i == 0 else comm + ':APP') + ' ' + block) ## first block replaces the list
+        loaded = int(float(self.sm.query('SOUR:LIST:CURR:POIN?')))
+        if loaded != len(sweepList):
+            self.listHash = None
+            raise RuntimeError('sweep list upload failed: sent ' + str(len(sweepList)) + ' points, 6221 has ' + str(loaded))
+        self.listHash = hash((sweepList.tobytes(),delays.tobytes()))
+
     def getErrors(self):
         err = self.sm.query(":syst:err?")
         logging.info(err)
@@ -222,32 +232,19 @@ class K6221():
     def preset(self):
         self.sm.write(':SYST:COMM:SER:SEND ":SYST:PRES"') ### reset 2182
         self.sm.write(':SYST:PRES') ### reset 6221
+        self.listHash = None
     def turnOffOutputs(self):
         self.sm.write(':OUTP OFF')
 
     def doMeasure(self,smu,param,aver):
-        mData = []
         self.sm.write(':SYST:COMM:SER:SEND ":READ?"') ## do one read into trace buffers 
-        waitingForData=True
-        timeSlept=0
-        while waitingForData:
-            if len(mData) >= aver:
-                logging.info('got all Data')
-                waitingForData=False
-            elif timeSlept > 30:
-                logging.warning('timed out')
-                waitingForData=False
-            else: 
-                try:
-                    time.sleep(0.2)
-                    resp = self.sm.query(':SYST:COMM:SER:ENT?')
-                    mData=np.append(mData,np.asarray(re.findall('[+-][0-9\.]+E[+-][0-9]+',resp),dtype=float))
-                    logging.info('Adding data' + resp)
-                except Exception as err:
-                    logging.warning('Unable to add the data' + resp)
-                timeSlept +=0.5
-                time.sleep(0.3)
-        return np.mean(mData)
+        trace = TraceAccumulator(aver)
+        trace.poll(lambda: self.sm.query(':SYST:COMM:SER:ENT?'),30)
+        if trace.full:
+            logging.info('got all Data')
+        else:
+            logging.warning('timed out with ' + str(len(trace)) + ' of ' + str(aver) + ' readings')
+        return np.mean(trace.data)
 
     def doSource(self,smu,param,value): ## no use for other values. It can only output current
         self.sm.write(':CURR ' + str(value))
@@ -260,54 +257,30 @@ class K6221():
         return(self.sm.query(':SYST:COMM:SER:ENT?'))
 
     def get2182TraceData(self,smu,param,tPoints):
-        mData = []
         time.sleep(5)
         self.sm.write(':SYST:COMM:SER:SEND ":TRAC:DATA?"')
-        time.sleep(1)
-        waitingForData=True
-        timeSlept=0
-        while waitingForData:
-            if len(mData) >= tPoints:
-                logging.info('got all Data')
-                waitingForData=False
-            elif timeSlept > 10:
-                logging.warning('timed out')
-                waitingForData=False
-            else: 
-                try:
-                    time.sleep(0.2)
-                    resp = self.sm.query(':SYST:COMM:SER:ENT?')
-                    logging.info('Read from instrument: ' + resp)
-                    mData=np.append(mData,np.asarray(re.findall('[+-][0-9\.]+E[+-][0-9]+',resp),dtype=float))
-                    logging.info('Adding data' + resp)
-                except ValueError:
-                    logging.warning('Unable to add the data' + resp)
-                timeSlept +=0.5
-                time.sleep(0.3)
-        return mData
+        trace = TraceAccumulator(tPoints) ## the reply arrives over several ENT? reads
+        trace.poll(lambda: self.sm.query(':SYST:COMM:SER:ENT?'),10)
+        if trace.full:
+            logging.info('got all Data')
+        else:
+            logging.warning('timed out with ' + str(len(trace)) + ' of ' + str(tPoints) + ' readings')
+        return trace.data
     
     ################ get data from 6221 ##############
     def getTraceData(self,smu,param,tPoints):
-        mData = []
-        waitingForData=True
-        timeSlept=0
-        while waitingForData:
-            if len(mData) >= tPoints:
-                logging.info('got all Data')
-                waitingForData=False
-            elif timeSlept > 30:
-                logging.warning('timed out. Leaving with either empty or partial data of length ' + str(len(mData)))
-                waitingForData=False
-            else:
-                try:
-                    resp = self.sm.query(':TRAC:DATA?')
-                    mData=np.append(mData,np.asarray(re.findall('[+-][0-9\.]+E[+-][0-9]+',resp),dtype=float))
-                    logging.info('Adding data' + resp)
-                except Exception as e:
-                    logging.warning('Unable to add the data. Got this  ' + resp)
-                timeSlept +=0.5
-                time.sleep(0.5)
-        return mData
+        trace = TraceAccumulator(tPoints)
+        deadline = time.monotonic() + 30
+        while not trace.full and time.monotonic() < deadline:
+            trace.clear() ## :TRAC:DATA? returns the whole buffer every time
+            trace.add_response(self.sm.query(':TRAC:DATA?'))
+            if not trace.full:
+                time.sleep(0.1)
+        if trace.full:
+            logging.info('got all Data')
+        else:
+            logging.warning('timed out. Leaving with either empty or partial data of length ' + str(len(trace)))
+        return trace.data
 
 class resultBook:
     def __init__(self):
@@ -14,6 +14,7 @@ import queue
 import logging
 import re
 from keithley2600 import Keithley2600
+from trace_buffer import TraceAccumulator
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 
@@ -187,53 +188,29 @@ class K6221:
         return measuredValues
 
     def getTraceData(self, smu, param, tPoints):
-        mData = []
-        waitingForData = True
-        timeSlept = 0
-        while waitingForData:
-            if len(mData) >= tPoints:
-                logging.info('got all Data')
-                waitingForData = False
-            elif timeSlept > 30:
-                logging.warning('timed out. Leaving with either empty or partial data of length ' + str(len(mData)))
-                waitingForData = False
-            else:
-                try:
-                    resp = self.sm.query(':TRAC:DATA?')
-                    mData = np.append(mData, np.asarray(re.findall('[+-][0-9\.]+E[+-][0-9]+', resp), dtype=float))
-                    logging.info('Adding data' + resp)
-                except Exception as e:
-                    logging.warning('Unable to add the data. Got this  ' + resp)
-                timeSlept += 0.5
-                time.sleep(0.5)
-        return mData
+        trace = TraceAccumulator(tPoints)
+        deadline = time.monotonic() + 30
+        while not trace.full and time.monotonic() < deadline:
+            trace.clear()  # :TRAC:DATA? returns the whole buffer every time
+            trace.add_response(self.sm.query(':TRAC:DATA?'))
+            if not trace.full:
+                time.sleep(0.1)
+        if trace.full:
+            logging.info('got all Data')
+        else:
+            logging.warning('timed out. Leaving with either empty or partial data of length ' + str(len(trace)))
+        return trace.data
 
     def get2182TraceData(self, smu, param, tPoints):
-        mData = []
         time.sleep(5)
         self.sm.write(':SYST:COMM:SER:SEND ":TRAC:DATA?"')
-        time.sleep(1)
-        waitingForData = True
-        timeSlept = 0
-        while waitingForData:
-            if len(mData) >= tPoints:
-                logging.info('got all Data')
-                waitingForData = False
-            elif timeSlept > 10:
-                logging.warning('timed out')
-                waitingForData = False
-            else:
-                try:
-                    time.sleep(0.2)
-                    resp = self.sm.query(':SYST:COMM:SER:ENT?')
-                    logging.info('Read from instrument: ' + resp)
-                    mData = np.append(mData, np.asarray(re.findall('[+-][0-9\.]+E[+-][0-9]+', resp), dtype=float))
-                    logging.info('Adding data' + resp)
-                except ValueError:
-                    logging.warning('Unable to add the data' + resp)
-                timeSlept += 0.5
-                time.sleep(0.3)
-        return mData
+        trace = TraceAccumulator(tPoints)  # the reply arrives over several ENT? reads
+        trace.poll(lambda: self.sm.query(':SYST:COMM:SER:ENT?'), 10)
+        if trace.full:
+            logging.info('got all Data')
+        else:
+            logging.warning('timed out with ' + str(len(trace)) + ' of ' + str(tPoints) + ' readings')
+        return trace.data
 
     def turnOffOutputs(self):
         self.sm.write(':OUTP OFF')